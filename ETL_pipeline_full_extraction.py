@@ -1,80 +1,69 @@
 from prefect import flow, task
+from prefect.task_runners import ThreadPoolTaskRunner
+import argparse
 import sqlite3
 import duckdb
 import pandas as pd
 from datetime import datetime
 
+from etl_common import (ETL_TARGETS, SOURCE_TABLES, STAGING_TABLE, add_composite_key, bump_load_version, extract_all,
+                        extract_table, extraction_shards, join_in_duckdb, load_batch, load_staged, prune_change_log,
+                        source_high_marks, stage_chunk, stream_extraction, write_watermarks)
+from etl_aggregates import drop_aggregate_tables
+from etl_parquet_export import PARQUET_DIR, export_experiments
+from etl_star_schema import drop_star_tables
+
 # Config
 SQLITE_DB_PATH = "MLED_transactions.db"
 DUCKDB_PATH = "MLED_analytics.duckdb"
 TABLE_NAME = "experiments"
+EXTRACT_WORKERS = 8
 
 @task
-def extract_all_data() -> pd.DataFrame:
+def extract_all_data() -> tuple[pd.DataFrame, dict]:
     conn = sqlite3.connect(SQLITE_DB_PATH)
-    
-    query = """
-    SELECT
-        e.Experiment_ID,
-        e.Name AS Experiment_Name,
-        e.Description AS Experiment_Description,
-        e.Status AS Experiment_Status,
-        e.StartTimeStamp,
-        e.EndTimeStamp,
-        u.First_Name || ' ' || u.Last_Name AS Author_Name,
-        
-        d.DataSet_ID,
-        d.Name AS Dataset_Name,
-        d.Version AS Dataset_Version,
-        d.Size AS Dataset_Size,
-        d.Description AS Dataset_Description,
-        
-        m.Model_ID,
-        m.Name AS Model_Name,
-        m.Type AS Model_Type,
-        m.Version AS Model_Version,
-        m.Hyperparameters AS Model_Hyperparameters,
-
-        t.Trial_ID,
-        t.Status AS Trial_Status,
-        t.StartTime AS Trial_Start,
-        t.EndTime AS Trial_End,
-        t.Seed AS Trial_Seed,
-
-        hp.Hyperparameter_ID,
-        hp.Type AS Hyperparameter_Type,
-        hp.Epochs,
-        hp.Value AS Hyperparameter_Value,
-
-        mt.Metric_ID,
-        mt.Name AS Metric_Name,
-        mt.Value AS Metric_Value,
-        mt.TimeStamp AS Metric_Timestamp
-
-    FROM Experiment e
-    LEFT JOIN User u ON e.Author_ID = u.User_ID
-    LEFT JOIN Dataset d ON e.DataSet_ID = d.DataSet_ID
-    LEFT JOIN Model m ON e.Model_ID = m.Model_ID
-    LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
-    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
-    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
-    """
-
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    try:
+        df, high_marks = extract_all(conn)
+    finally:
+        conn.close()
+    return df, high_marks
+
+@task
+def read_high_marks() -> dict:
+    #the snapshot every shard is bounded by
+    conn = sqlite3.connect(SQLITE_DB_PATH)
+    try:
+        return source_high_marks(conn)
+    finally:
+        conn.close()
+
+@task
+def extract_table_shard(table: str, low: int | None = None, high: int | None = None) -> pd.DataFrame:
+    #each shard reads on its own connection, so the shards run concurrently
+    conn = sqlite3.connect(SQLITE_DB_PATH)
+    try:
+        return extract_table(conn, table, low, high)
+    finally:
+        conn.close()
+
+@task
+def join_shards(frames: dict) -> pd.DataFrame:
+    #flatten in duckdb instead of in sqlite
+    return join_in_duckdb(frames)
+
+def extract_sharded(shards: int) -> tuple[pd.DataFrame, dict]:
+    high_marks = read_high_marks()
+    futures = [(table, extract_table_shard.submit(table, low, high))
+               for table, low, high in extraction_shards(high_marks, shards)]
+    frames = {table: [] for table in SOURCE_TABLES}
+    for table, future in futures:
+        frames[table].append(future.result())
+    return join_shards(frames), high_marks
 
 @task
 def create_composite_key(df: pd.DataFrame) -> pd.DataFrame:
-    df["Composite_ID"] = (
-        df["Experiment_ID"].astype(str) + "_" +
-        df["Trial_ID"].astype(str) + "_" +
-        df["Model_ID"].astype(str) + "_" +
-        df["DataSet_ID"].astype(str) + "_" +
-        df["Metric_ID"].fillna("NULL").astype(str) + "_" +
-        df["Hyperparameter_ID"].fillna("NULL").astype(str)
-    )
-    return df
+    # 16-byte hash of the Experiment/Trial/Model/DataSet/Metric/Hyperparameter IDs
+    return add_composite_key(df)
 
 @task
 def count_unique_extracted_composite_keys(df: pd.DataFrame) -> int:
@@ -98,52 +87,92 @@ def count_composite_keys_in_duckdb() -> int:
         conn.close()
         return 0
 
-    # Count unique Composite_IDs
-    result = conn.execute("SELECT COUNT(DISTINCT Composite_ID) FROM experiment_flat").fetchone()[0]
+    # Composite_ID is the primary key, so every row is a unique Composite_ID
+    result = conn.execute("SELECT COUNT(*) FROM experiment_flat").fetchone()[0]
     conn.close()
     print(f"Unique Composite_IDs in DuckDB: {result}")
     return result
 
 
+def _reset_targets(conn, target):
+    # We choose to drop any existing data as this flow should be done once at the beginning
+    #   of the MLED pipeline. The hourly flow picks up from the watermarks stored here.
+    if target in ("flat", "both"):
+        conn.execute("DROP TABLE IF EXISTS experiment_flat")
+        drop_aggregate_tables(conn)
+    if target in ("star", "both"):
+        drop_star_tables(conn)
+
 @task
-def load_to_duckdb(df: pd.DataFrame):
+def load_to_duckdb(df: pd.DataFrame, high_marks: dict, target: str = "flat"):
     conn = duckdb.connect(DUCKDB_PATH)
 
-    # We choose to drop any existing data as this flow should be done once at the beginning
-    #   of the MLED pipeline.
-    conn.execute("DROP TABLE IF EXISTS experiment_flat")
-    conn.execute("CREATE TABLE experiment_flat AS SELECT * FROM df")
-
-    conn.close()
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        _reset_targets(conn, target)
+        load_batch(conn, df, target)
+        write_watermarks(conn, high_marks)
+        bump_load_version(conn, len(df))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
     print(f"Inserted {len(df)} rows into DuckDB table 'experiment_flat'.")
 
 @task
-def deduplicate_duckdb():
+def stream_to_duckdb(chunk_size: int, target: str = "flat") -> int:
+    #extract chunk by chunk into a staging table, so memory is bounded by chunk_size rather than the database size
+    sqlite_conn = sqlite3.connect(SQLITE_DB_PATH)
     conn = duckdb.connect(DUCKDB_PATH)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        rows, high_marks = stream_extraction(sqlite_conn, lambda chunk: stage_chunk(conn, chunk), chunk_size)
+
+        #swap the staged rows in atomically with the watermarks
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            _reset_targets(conn, target)
+            load_staged(conn, target)
+            write_watermarks(conn, high_marks)
+            bump_load_version(conn, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        prune_change_log(sqlite_conn, high_marks)
+    finally:
+        conn.close()
+        sqlite_conn.close()
+    print(f"Streamed {rows} rows into DuckDB in chunks of {chunk_size}.")
+    return rows
 
-    conn.execute("""
-        CREATE OR REPLACE TABLE experiment_flat AS
-        SELECT * FROM (
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY Composite_ID ORDER BY Trial_ID) AS rn
-            FROM experiment_flat
-        )
-        WHERE rn = 1
-    """)
-    
-    # Drop rn after filtering
-    conn.execute("""
-        ALTER TABLE experiment_flat DROP COLUMN rn
-    """)
+@task
+def prune_loaded_changes(high_marks: dict):
+    #the committed watermarks cover these ChangeLog rows, so no later load reads them again
+    conn = sqlite3.connect(SQLITE_DB_PATH)
+    try:
+        deleted = prune_change_log(conn, high_marks)
+    finally:
+        conn.close()
+    print(f"Pruned {deleted} loaded rows from the ChangeLog.")
 
-    conn.close()
-    print("Deduplication complete: only one row per Composite_ID retained.")
+@task
+def export_to_parquet(experiment_ids: list | None = None):
+    #rewrite the touched experiments' partitions of the parquet lake (all of them when experiment_ids is None)
+    conn = duckdb.connect(DUCKDB_PATH, read_only=True)
+    try:
+        written = export_experiments(conn, PARQUET_DIR, experiment_ids)
+    finally:
+        conn.close()
+    print(f"Exported {written} experiments to the parquet lake at '{PARQUET_DIR}'.")
 
 @task
 def log_etl_run(
     extracted_count: int,
     pre_load_count: int,
-    post_dedup_count: int,
+    post_load_count: int,
     etl_type: str = "FULL",
     log_path: str = "etl_log.txt"
 ):
@@ -152,7 +181,7 @@ def log_etl_run(
         f"{timestamp} | Type: {etl_type.upper()} | "
         f"Extracted: {extracted_count} | "
         f"Pre-Load: {pre_load_count} | "
-        f"Post-Dedup: {post_dedup_count}\n"
+        f"Post-Load: {post_load_count}\n"
     )
 
     with open(log_path, "a") as log_file:
@@ -160,33 +189,56 @@ def log_etl_run(
 
     print(f"ETL summary logged as '{etl_type.upper()}' to text file.")
 
-@flow
-def ml_experiment_etl():
-    #extract the full database
-    extracted_data = extract_all_data()
+@flow(task_runner=ThreadPoolTaskRunner(max_workers=EXTRACT_WORKERS))
+def ml_experiment_etl(target: str = "flat", chunk_size: int | None = None, parquet: bool = False,
+                      shards: int | None = None):
+    #count the unique number of rows in duckdb pre-load
+    pre_load_count = count_composite_keys_in_duckdb()
 
-    #create the unique composite keys
-    extracted_data = create_composite_key(extracted_data)
+    if chunk_size:
+        #stream the full database into duckdb without materializing it
+        num_unique_extracted = stream_to_duckdb(chunk_size, target)
+    else:
+        #extract the full database, as one query or as concurrent per-table shards joined in duckdb
+        if shards:
+            extracted_data, high_marks = extract_sharded(shards)
+        else:
+            extracted_data, high_marks = extract_all_data()
 
-    #count the unique extracted rows
-    num_unique_extracted = count_unique_extracted_composite_keys(extracted_data)
+        #create the unique composite keys
+        extracted_data = create_composite_key(extracted_data)
 
-    #count the unique number of rows in duckdb pre-load
-    pre_load_count = count_composite_keys_in_duckdb()
+        #count the unique extracted rows
+        num_unique_extracted = count_unique_extracted_composite_keys(extracted_data)
 
-    #load data into duckdb
-    load_to_duckdb(extracted_data)
+        #load data into duckdb and reset the hourly watermarks
+        load_to_duckdb(extracted_data, high_marks, target)
 
-    #delete duplicate rows from duckdb
-    deduplicate_duckdb()
+        #drop the change records the full load has made redundant
+        prune_loaded_changes(high_marks)
 
     #count the unique number of rows in duckdb post-load
     post_load_count = count_composite_keys_in_duckdb()
 
+    #rewrite the whole parquet lake from the flat table
+    if parquet and target in ("flat", "both"):
+        export_to_parquet()
+
     #log ETL run
     log_etl_run(num_unique_extracted, pre_load_count, post_load_count)
 
 # Run the flow manually
 if __name__ == "__main__":
-    ml_experiment_etl()
+    parser = argparse.ArgumentParser(description="Full MLED ETL from SQLite into DuckDB.")
+    parser.add_argument("--target", choices=ETL_TARGETS, default="flat",
+                        help="Load the flat table, the star schema, or both.")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Stream the extraction in chunks of this many rows instead of loading it all at once.")
+    parser.add_argument("--parquet", action="store_true",
+                        help=f"Also write experiment_flat as hive-partitioned parquet under {PARQUET_DIR}/.")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="Read the source tables concurrently, splitting Trial/Hyperparameter/Metric into this "
+                             "many rowid ranges, and join them in DuckDB.")
+    args = parser.parse_args()
+    ml_experiment_etl(args.target, args.chunk_size, args.parquet, args.shards)
 
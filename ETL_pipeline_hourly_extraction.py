@@ -1,83 +1,41 @@
 from prefect import flow, task
+import argparse
 import sqlite3
 import duckdb
 import pandas as pd
 from datetime import datetime
 
+from etl_common import (ETL_TARGETS, add_composite_key, bump_load_version, deleted_experiments, extract_changes, load_batch,
+                        prune_change_log, read_watermarks, write_watermarks)
+from etl_parquet_export import PARQUET_DIR, export_experiments
+
 # Config
 SQLITE_DB_PATH = "MLED_transactions.db"
 DUCKDB_PATH = "MLED_analytics.duckdb"
 TABLE_NAME = "experiments"
 
 @task
-def extract_hourly_data() -> pd.DataFrame:
+def extract_hourly_data() -> tuple[pd.DataFrame, dict, list]:
+    #rows inserted, updated or deleted since the last successful load, by change watermark
+    duck_conn = duckdb.connect(DUCKDB_PATH)
+    low_marks = read_watermarks(duck_conn)
+    duck_conn.close()
+
     conn = sqlite3.connect(SQLITE_DB_PATH)
-    
-    query = """
-    SELECT
-        e.Experiment_ID,
-        e.Name AS Experiment_Name,
-        e.Description AS Experiment_Description,
-        e.Status AS Experiment_Status,
-        e.StartTimeStamp,
-        e.EndTimeStamp,
-        u.First_Name || ' ' || u.Last_Name AS Author_Name,
-
-        d.DataSet_ID,
-        d.Name AS Dataset_Name,
-        d.Version AS Dataset_Version,
-        d.Size AS Dataset_Size,
-        d.Description AS Dataset_Description,
-
-        m.Model_ID,
-        m.Name AS Model_Name,
-        m.Type AS Model_Type,
-        m.Version AS Model_Version,
-        m.Hyperparameters AS Model_Hyperparameters,
-
-        t.Trial_ID,
-        t.Status AS Trial_Status,
-        t.StartTime AS Trial_Start,
-        t.EndTime AS Trial_End,
-        t.Seed AS Trial_Seed,
-
-        hp.Hyperparameter_ID,
-        hp.Type AS Hyperparameter_Type,
-        hp.Epochs,
-        hp.Value AS Hyperparameter_Value,
-
-        mt.Metric_ID,
-        mt.Name AS Metric_Name,
-        mt.Value AS Metric_Value,
-        mt.TimeStamp AS Metric_Timestamp
-
-    FROM Experiment e
-    LEFT JOIN User u ON e.Author_ID = u.User_ID
-    LEFT JOIN Dataset d ON e.DataSet_ID = d.DataSet_ID
-    LEFT JOIN Model m ON e.Model_ID = m.Model_ID
-    LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
-    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
-    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
-
-    WHERE e.StartTimeStamp >= datetime('now', 'localtime', '-1 hour')
-    """
-
-
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    try:
+        df, high_marks = extract_changes(conn, low_marks)
+        #experiments that lost rows are in df whole, and replace their stored rows
+        replaced = deleted_experiments(conn, low_marks, high_marks)
+    finally:
+        conn.close()
+    print(f"Extracted {len(df)} changed rows, replacing {len(replaced)} experiments with deleted rows "
+          f"(watermarks {low_marks} -> {high_marks}).")
+    return df, high_marks, replaced
 
 @task
 def create_composite_key(df: pd.DataFrame) -> pd.DataFrame:
-    df["Composite_ID"] = (
-        df["Experiment_ID"].astype(str) + "_" +
-        df["Trial_ID"].astype(str) + "_" +
-        df["Model_ID"].astype(str) + "_" +
-        df["DataSet_ID"].astype(str) + "_" +
-        df["Metric_ID"].fillna("NULL").astype(str) + "_" +
-        df["Hyperparameter_ID"].fillna("NULL").astype(str)
-    )
-    return df
+    # 16-byte hash of the Experiment/Trial/Model/DataSet/Metric/Hyperparameter IDs
+    return add_composite_key(df)
 
 @task
 def count_unique_extracted_composite_keys(df: pd.DataFrame) -> int:
@@ -101,64 +59,59 @@ def count_composite_keys_in_duckdb() -> int:
         conn.close()
         return 0
 
-    # Count unique Composite_IDs
-    result = conn.execute("SELECT COUNT(DISTINCT Composite_ID) FROM experiment_flat").fetchone()[0]
+    # Composite_ID is the primary key, so every row is a unique Composite_ID
+    result = conn.execute("SELECT COUNT(*) FROM experiment_flat").fetchone()[0]
     conn.close()
     print(f"Unique Composite_IDs in DuckDB: {result}")
     return result
 
 
 @task
-def load_to_duckdb(df: pd.DataFrame):
+def load_to_duckdb(df: pd.DataFrame, high_marks: dict, target: str = "flat", replaced_experiments: list = ()):
     conn = duckdb.connect(DUCKDB_PATH)
 
-    schema_df = conn.execute("PRAGMA table_info('experiment_flat')").fetchdf()
-
-    # Register the DataFrame as a DuckDB relation
-    conn.register("df_view", df)
-
-    # Create the table if it doesn't exist yet
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS experiment_flat AS 
-        SELECT * FROM df_view LIMIT 0
-    """)
-
-    # Append the new rows
-    conn.execute("""
-        INSERT INTO experiment_flat SELECT * FROM df_view
-    """)
-
-    conn.close()
-    print(f"Inserted {len(df)} rows into DuckDB table 'experiment_flat'.")
+    # The rows and the new watermarks commit together, so a failed load is simply re-extracted next run
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        # Upsert on the primary keys: updated source rows replace their earlier version
+        load_batch(conn, df, target, replaced_experiments=replaced_experiments)
+        write_watermarks(conn, high_marks)
+        # Dashboards keep serving their cached results until a run actually changes data
+        if not df.empty or replaced_experiments:
+            bump_load_version(conn, len(df))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    print(f"Upserted {len(df)} rows into DuckDB table 'experiment_flat'.")
 
 @task
-def deduplicate_duckdb():
-    conn = duckdb.connect(DUCKDB_PATH)
-
-    conn.execute("""
-        CREATE OR REPLACE TABLE experiment_flat AS
-        SELECT * FROM (
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY Composite_ID ORDER BY Trial_ID) AS rn
-            FROM experiment_flat
-        )
-        WHERE rn = 1
-    """)
-    
-    # Drop rn after filtering
-    conn.execute("""
-        ALTER TABLE experiment_flat DROP COLUMN rn
-    """)
-
-    conn.close()
-    print("Deduplication complete: only one row per Composite_ID retained.")
+def prune_loaded_changes(high_marks: dict):
+    #the committed watermarks cover these ChangeLog rows, so no later load reads them again
+    conn = sqlite3.connect(SQLITE_DB_PATH)
+    try:
+        deleted = prune_change_log(conn, high_marks)
+    finally:
+        conn.close()
+    print(f"Pruned {deleted} loaded rows from the ChangeLog.")
 
+@task
+def export_to_parquet(experiment_ids: list | None = None):
+    #rewrite the touched experiments' partitions of the parquet lake (all of them when experiment_ids is None)
+    conn = duckdb.connect(DUCKDB_PATH, read_only=True)
+    try:
+        written = export_experiments(conn, PARQUET_DIR, experiment_ids)
+    finally:
+        conn.close()
+    print(f"Exported {written} experiments to the parquet lake at '{PARQUET_DIR}'.")
 
 @task
 def log_etl_run(
     extracted_count: int,
     pre_load_count: int,
-    post_dedup_count: int,
+    post_load_count: int,
     etl_type: str = "FULL",
     log_path: str = "etl_log.txt"
 ):
@@ -167,7 +120,7 @@ def log_etl_run(
         f"{timestamp} | Type: {etl_type.upper()} | "
         f"Extracted: {extracted_count} | "
         f"Pre-Load: {pre_load_count} | "
-        f"Post-Dedup: {post_dedup_count}\n"
+        f"Post-Load: {post_load_count}\n"
     )
 
     with open(log_path, "a") as log_file:
@@ -176,9 +129,9 @@ def log_etl_run(
     print(f"ETL summary logged as '{etl_type.upper()}' to text file.")
 
 @flow
-def ml_experiment_hourly_etl():
-    #extract the full database
-    extracted_data = extract_hourly_data()
+def ml_experiment_hourly_etl(target: str = "flat", parquet: bool = False):
+    #extract the rows changed since the last load
+    extracted_data, high_marks, replaced_experiments = extract_hourly_data()
 
     #create the unique composite keys
     extracted_data = create_composite_key(extracted_data)
@@ -189,21 +142,31 @@ def ml_experiment_hourly_etl():
     #count the unique number of rows in duckdb pre-load
     pre_load_count = count_composite_keys_in_duckdb()
 
-    #load data into duckdb
-    load_to_duckdb(extracted_data)
+    #load data into duckdb and advance the watermarks
+    load_to_duckdb(extracted_data, high_marks, target, replaced_experiments)
 
-    #delete duplicate rows from duckdb
-    deduplicate_duckdb()
+    #drop the change records this load consumed
+    prune_loaded_changes(high_marks)
 
     #count the unique number of rows in duckdb post-load
     post_load_count = count_composite_keys_in_duckdb()
 
+    #rewrite only the parquet partitions of experiments this batch touched
+    if parquet and target in ("flat", "both"):
+        export_to_parquet(sorted(set(extracted_data["Experiment_ID"]) | set(replaced_experiments)))
+
     #log ETL run
     log_etl_run(num_unique_extracted, pre_load_count, post_load_count, etl_type='HOURLY')
 
 # Run the flow manually
 if __name__ == "__main__":
-    ml_experiment_hourly_etl()
+    parser = argparse.ArgumentParser(description="Incremental MLED ETL from SQLite into DuckDB.")
+    parser.add_argument("--target", choices=ETL_TARGETS, default="flat",
+                        help="Load the flat table, the star schema, or both (use the same target as the full load).")
+    parser.add_argument("--parquet", action="store_true",
+                        help=f"Also update the hive-partitioned parquet copy under {PARQUET_DIR}/.")
+    args = parser.parse_args()
+    ml_experiment_hourly_etl(args.target, args.parquet)
 
 
 """
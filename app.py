@@ -1,9 +1,46 @@
 import streamlit as st
+import altair as alt
 import duckdb
-import pandas as pd
 
-# Connect to your DuckDB database
-conn = duckdb.connect('mled_analytics.duckdb', read_only=True)
+import dashboard_queries as queries
+from etl_common import read_load_version
+from etl_parquet_export import PARQUET_DIR, parquet_source, read_lake_version
+
+DUCKDB_PATH = 'mled_analytics.duckdb'
+VERSION_CHECK_SECONDS = 10
+# Metric Over Time: the chart's width in pixels, the pixels per downsampled bucket and the trials drawn
+CHART_WIDTH = 700
+PIXELS_PER_BUCKET = 4
+MAX_TRIALS = 20
+
+@st.cache_resource
+def lake_connection():
+    # One in-memory database over the parquet lake shared by every session; each query takes its own cursor
+    conn = duckdb.connect()
+    conn.execute(f"CREATE VIEW experiment_flat AS SELECT * FROM {parquet_source(PARQUET_DIR)}")
+    return conn
+
+def connect(use_lake=False):
+    # Read the parquet lake when it is current (so the dashboard never holds the ETL's DuckDB file open),
+    # otherwise open your DuckDB database only while a query runs, so the ETL can still write it in between
+    if use_lake:
+        return lake_connection().cursor()
+    return duckdb.connect(DUCKDB_PATH, read_only=True)
+
+@st.cache_data(ttl=VERSION_CHECK_SECONDS, show_spinner=False)
+def load_version():
+    # Bumped by the ETL whenever a load lands rows, paired with whether the lake was exported at that version;
+    # a partial or stale lake is not read. Checked at most every VERSION_CHECK_SECONDS, so reruns in between
+    # touch neither the file nor the lake
+    with connect() as conn:
+        version = read_load_version(conn)
+    return version, read_lake_version(PARQUET_DIR) == version
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def query(name, version, *args):
+    # version is only part of the cache key: results are reused by every session until new data lands
+    with connect(use_lake=version[1]) as conn:
+        return getattr(queries, name)(conn, *args)
 
 st.title("Experiment Analytics Dashboard")
 
@@ -11,10 +48,11 @@ st.markdown("""
 Welcome to the Experiment Analytics Dashboard. Use the sidebar to filter experiments and explore results, metrics, and dataset information.
 """)
 
-# Load full data (adjust table name as needed)
+# Load the experiment list (adjust table name as needed)
 TABLE_NAME = "experiment_flat" 
 try:
-    df = conn.execute(f"SELECT * FROM {TABLE_NAME}").fetchdf()
+    version = load_version()
+    experiments = query("list_experiments", version, TABLE_NAME)
 except Exception as e:
     st.error(f"Error loading table `{TABLE_NAME}`: {e}")
     st.stop()
@@ -22,35 +60,54 @@ except Exception as e:
 # Sidebar filters
 st.sidebar.header("Filter Experiments")
 st.sidebar.markdown("Use these filters to select and view data for specific experiments.")
-experiment_names = df['Experiment_Name'].dropna().unique()
+experiment_names = experiments['Experiment_Name'].dropna().unique()
 selected_experiment = st.sidebar.selectbox("Select Experiment", ["All"] + sorted(experiment_names))
 
+# Every query below filters on Experiment_ID inside DuckDB (the partition column of the parquet lake), reads the
+# summary tables the ETL maintains and returns only the selected slice
 if selected_experiment != "All":
-    df = df[df['Experiment_Name'] == selected_experiment]
+    experiment_ids = experiments.loc[experiments['Experiment_Name'] == selected_experiment, 'Experiment_ID'].tolist()
+else:
+    experiment_ids = None
 
 # Basic stats
 st.header("Experiment Summary")
 st.markdown("""
 This section provides a summary of the selected experiment, including the number of trials, models, and types of metrics collected.
 """)
-st.write("Number of Trials:", df['Trial_ID'].nunique())
-st.write("Number of Models:", df['Model_ID'].nunique())
-st.write("Metric Types Collected:", df['Metric_Name'].unique())
+trial_count, model_count = query("experiment_counts", version, experiment_ids, TABLE_NAME)
+metric_options = query("metric_names", version, experiment_ids, TABLE_NAME)
+st.write("Number of Trials:", trial_count)
+st.write("Number of Models:", model_count)
+st.write("Metric Types Collected:", metric_options)
 
 # Metric plot
 st.subheader("Metric Over Time")
 st.markdown("""
 Visualize how a selected metric changes over time during the experiment trials.
 """)
-metric_options = df['Metric_Name'].dropna().unique()
 if len(metric_options) > 0:
     metric_to_plot = st.selectbox("Select Metric", metric_options)
-    metric_df = df[df['Metric_Name'] == metric_to_plot].copy()
+    per_trial = st.radio("Show", ["Per trial", "Mean across trials"], horizontal=True) == "Per trial"
 
-    if not metric_df.empty:
-        metric_df['Metric_Timestamp'] = pd.to_datetime(metric_df['Metric_Timestamp'], errors='coerce')
-        metric_df = metric_df.dropna(subset=['Metric_Timestamp']).sort_values('Metric_Timestamp')
-        st.line_chart(metric_df[['Metric_Timestamp', 'Metric_Value']].set_index('Metric_Timestamp'))
+    if per_trial:
+        # Downsampled in DuckDB to one bucket per few pixels of the chart, so the payload is bounded by the
+        # chart size and MAX_TRIALS rather than by how often the metric was logged
+        metric_df = query("trial_metric_series", version, metric_to_plot, CHART_WIDTH // PIXELS_PER_BUCKET,
+                          experiment_ids, MAX_TRIALS, TABLE_NAME)
+        if not metric_df.empty:
+            metric_df['Trial'] = metric_df['Trial_ID'].str[:8]
+            base = alt.Chart(metric_df).encode(x=alt.X('Metric_Timestamp:T', title=None), color='Trial:N')
+            band = base.mark_area(opacity=0.2).encode(y=alt.Y('Min_Value:Q', title=metric_to_plot), y2='Max_Value:Q')
+            line = base.mark_line(point=True).encode(y='Mean_Value:Q', tooltip=['Trial_ID', 'Mean_Value', 'Points'])
+            st.altair_chart(band + line, width=CHART_WIDTH)
+            if metric_df['Trial_ID'].nunique() == MAX_TRIALS:
+                st.caption(f"Showing the {MAX_TRIALS} trials with the most points.")
+    else:
+        metric_df = query("metric_series", version, metric_to_plot, CHART_WIDTH // PIXELS_PER_BUCKET,
+                          experiment_ids, TABLE_NAME)
+        if not metric_df.empty:
+            st.line_chart(metric_df.set_index('Metric_Timestamp'))
 else:
     st.warning("No metrics found to plot.")
 
@@ -59,26 +116,33 @@ st.subheader("Hyperparameter Distribution")
 st.markdown("""
 Analyze the distribution of metric values for different hyperparameter settings.
 """)
-hyperparam_options = df['Hyperparameter_Type'].dropna().unique()
+hyperparam_options = query("hyperparameter_types", version, experiment_ids, TABLE_NAME)
 if len(hyperparam_options) > 0:
     hyperparam_to_plot = st.selectbox("Select Hyperparameter", hyperparam_options)
-    hyper_df = df[df['Hyperparameter_Type'] == hyperparam_to_plot]
+    hyper_df = query("hyperparameter_means", version, hyperparam_to_plot, experiment_ids, TABLE_NAME)
 
     if not hyper_df.empty:
-        bar_data = hyper_df.groupby('Hyperparameter_Value')['Metric_Value'].mean().sort_index()
-        st.bar_chart(bar_data)
+        st.bar_chart(hyper_df.set_index('Hyperparameter_Value')['Metric_Value'])
 else:
     st.warning("No hyperparameter data available.")
 
+# Trial table (present when the ETL loads the star schema)
+trial_df = query("trials", version, experiment_ids)
+if trial_df is not None:
+    st.subheader("Trials")
+    st.markdown("""
+One row per trial with its hyperparameters (`hp_` columns) and latest metric values (`metric_` columns).
+""")
+    st.dataframe(trial_df.dropna(axis=1, how='all'))
+
 # Dataset summary
 st.subheader("Datasets Used")
 st.markdown("""
 See which datasets were used in the experiments, along with their versions and sizes.
 """)
-dataset_cols = ['Dataset_Name', 'Dataset_Version', 'Dataset_Size']
-available_cols = [col for col in dataset_cols if col in df.columns]
+dataset_df = query("datasets", version, ['Dataset_Name', 'Dataset_Version', 'Dataset_Size'], experiment_ids, TABLE_NAME)
 
-if available_cols:
-    st.dataframe(df[available_cols].drop_duplicates())
+if dataset_df is not None:
+    st.dataframe(dataset_df)
 else:
     st.info("Dataset columns not found in table.")
@@ -0,0 +1,78 @@
+#awaitable versions of the database_operations helpers for the justpy/Starlette event loop
+#each call runs the synchronous helper on a thread pool sized like the connection pool, so the event loop keeps
+#serving other users while SQLite works, and concurrent reads proceed in parallel under WAL
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database_operations as db_ops
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared executor, creating it on first use with one thread per pooled connection."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=db_ops.POOL_SIZE, thread_name_prefix="database")
+        return _executor
+
+
+def shutdown():
+    """Stop the executor's threads; the next call creates a new one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+async def run(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` run on the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _awaitable(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+execute_query = _awaitable(db_ops.execute_query)
+fetch_data = _awaitable(db_ops.fetch_data)
+
+insert_user = _awaitable(db_ops.insert_user)
+insert_dataset = _awaitable(db_ops.insert_dataset)
+insert_model = _awaitable(db_ops.insert_model)
+insert_experiment = _awaitable(db_ops.insert_experiment)
+insert_trial = _awaitable(db_ops.insert_trial)
+insert_metric = _awaitable(db_ops.insert_metric)
+insert_hyperparameter = _awaitable(db_ops.insert_hyperparameter)
+insert_error_log = _awaitable(db_ops.insert_error_log)
+insert_trials_many = _awaitable(db_ops.insert_trials_many)
+insert_metrics_many = _awaitable(db_ops.insert_metrics_many)
+insert_hyperparameters_many = _awaitable(db_ops.insert_hyperparameters_many)
+insert_trial_bundle = _awaitable(db_ops.insert_trial_bundle)
+
+update_value = _awaitable(db_ops.update_value)
+update_many = _awaitable(db_ops.update_many)
+delete_row = _awaitable(db_ops.delete_row)
+delete_many = _awaitable(db_ops.delete_many)
+delete_table = _awaitable(db_ops.delete_table)
+
+fetch_table = _awaitable(db_ops.fetch_table)
+search_options = _awaitable(db_ops.search_options)
+get_table_columns = _awaitable(db_ops.get_table_columns)
+get_sort_columns = _awaitable(db_ops.get_sort_columns)
+fetch_page = _awaitable(db_ops.fetch_page)
+estimate_row_count = _awaitable(db_ops.estimate_row_count)
+fetch_experiments_by_author = _awaitable(db_ops.fetch_experiments_by_author)
+count_records = _awaitable(db_ops.count_records)
+get_latest_experiment = _awaitable(db_ops.get_latest_experiment)
+get_active_experiments = _awaitable(db_ops.get_active_experiments)
@@ -0,0 +1,372 @@
+#benchmarks for the MLED database helpers
+#run with: python benchmarks.py <benchmark> [options]
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import database_operations as db_ops
+from create_database2 import create_database2
+
+
+def _fresh_database(directory):
+    """Create an empty MLED schema in a temporary directory and return its path."""
+    path = os.path.join(directory, "bench.db")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        create_database2(path)
+    return path
+
+
+def _report(label, count, seconds):
+    print(f"{label:<32} {count:>10} ops in {seconds:8.3f}s  ->  {count / seconds:12.1f} ops/sec")
+
+
+def bench_single_row_inserts(count=10000):
+    """Compare connect-per-call inserts against the pooled insert_metric helper."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    query = "INSERT INTO Metric (Metric_ID, Trial_ID, Name, Value, TimeStamp) VALUES (?, ?, ?, ?, ?)"
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = _fresh_database(directory)
+
+        # Before: a brand-new connection for every statement
+        start = time.perf_counter()
+        for i in range(count):
+            conn = sqlite3.connect(path)
+            conn.execute(query, (str(uuid.uuid4()), "trial-uuid", "accuracy", i, timestamp))
+            conn.commit()
+            conn.close()
+        _report("connect per insert", count, time.perf_counter() - start)
+
+        # After: the pooled database_operations helper
+        previous_path = db_ops.DATABASE_PATH
+        db_ops.configure_database(path)
+        try:
+            start = time.perf_counter()
+            for i in range(count):
+                db_ops.insert_metric("trial-uuid", "accuracy", i, timestamp)
+            _report("pooled insert_metric", count, time.perf_counter() - start)
+        finally:
+            db_ops.configure_database(previous_path)
+
+
+def bench_bulk_metric_inserts(count=100000):
+    """Compare per-row insert_metric calls against a single insert_metrics_many batch."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [("trial-uuid", "loss", i / count, timestamp) for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        previous_path = db_ops.DATABASE_PATH
+        db_ops.configure_database(_fresh_database(directory))
+        try:
+            # Per-row commits are slow, so time a slice and report the rate
+            sample = rows[:min(count, 10000)]
+            start = time.perf_counter()
+            for row in sample:
+                db_ops.insert_metric(*row)
+            _report("insert_metric per row", len(sample), time.perf_counter() - start)
+
+            start = time.perf_counter()
+            db_ops.insert_metrics_many(rows)
+            _report("insert_metrics_many", count, time.perf_counter() - start)
+        finally:
+            db_ops.configure_database(previous_path)
+
+
+def bench_bulk_delete(count=10000):
+    """Compare per-row delete_row calls against a single delete_many of the same Trial_IDs."""
+    rows = [("bench-experiment", "completed", "2024-02-12 12:00:00", "2024-02-12 14:00:00", seed) for seed in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        previous_path = db_ops.DATABASE_PATH
+        db_ops.configure_database(_fresh_database(directory))
+        try:
+            ids, _ = db_ops.insert_trials_many(rows)
+            start = time.perf_counter()
+            for trial_id in ids:
+                db_ops.delete_row("Trial", "Trial_ID", trial_id)
+            _report("delete_row per id", count, time.perf_counter() - start)
+
+            ids, _ = db_ops.insert_trials_many(rows)
+            start = time.perf_counter()
+            db_ops.delete_many("Trial", "Trial_ID", ids)
+            _report("delete_many", count, time.perf_counter() - start)
+        finally:
+            db_ops.configure_database(previous_path)
+
+
+def _touch_arrays(X_train, X_test, y_train, y_test):
+    return float(X_train[0, 0]) + float(X_test[0, 0])
+
+
+def _touch_staged(staged):
+    return _touch_arrays(*staged.load())
+
+
+def bench_dataset_handoff(count=12):
+    """Compare dispatch time of passing Fashion-MNIST sized arrays to every trial against a staged handle."""
+    import numpy as np
+    from joblib import Parallel, delayed
+    from dataset_staging import stage_dataset
+
+    rng = np.random.default_rng(42)
+    X_train, X_test = rng.random((56000, 784)), rng.random((14000, 784))
+    y_train, y_test = rng.integers(0, 10, 56000).astype(str).astype(object), rng.integers(0, 10, 14000).astype(str).astype(object)
+
+    # max_nbytes=None disables joblib's own automatic memmapping, which is what pickled labels/frames hit
+    start = time.perf_counter()
+    Parallel(n_jobs=4, max_nbytes=None)(delayed(_touch_arrays)(X_train, X_test, y_train, y_test) for _ in range(count))
+    _report("arrays pickled per trial", count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with stage_dataset(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test, downcast=True) as staged:
+        Parallel(n_jobs=4)(delayed(_touch_staged)(staged) for _ in range(count))
+    _report("staged memory maps (incl. staging)", count, time.perf_counter() - start)
+
+
+def _flat_rows(first, last):
+    """SQL for synthetic flat rows with UUID-length IDs, 1000 trials per experiment."""
+    return f"""
+        SELECT md5((i // 1000)::VARCHAR) AS Experiment_ID, md5(i::VARCHAR) AS Trial_ID, md5('model') AS Model_ID,
+               md5('dataset') AS DataSet_ID, md5('metric' || i) AS Metric_ID, NULL::VARCHAR AS Hyperparameter_ID,
+               'accuracy' AS Metric_Name, i::DOUBLE AS Metric_Value
+        FROM range({first}, {last}) t(i)
+    """
+
+
+def bench_flat_upsert(count=1000000, batch_size=10000):
+    """Time one hourly load into a flat table of ``count`` rows: append + full dedup rebuild vs primary key upsert.
+
+    Run with --count 1000000 and --count 10000000 to see how each strategy scales with table size.
+    """
+    import duckdb
+    from etl_common import COMPOSITE_KEY, FLAT_TABLE, RAW_COMPOSITE_KEY, add_composite_key, ensure_flat_table, upsert_flat_rows
+
+    # An hourly-sized batch: half updates of existing rows, half new rows
+    batch_rows = _flat_rows(count - batch_size // 2, count + batch_size - batch_size // 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = duckdb.connect(os.path.join(directory, "bench.duckdb"))
+        try:
+            # Before: append the batch, then rebuild the whole table keeping one row per key
+            conn.execute(f"CREATE TABLE {FLAT_TABLE} AS SELECT *, {RAW_COMPOSITE_KEY} AS Composite_ID FROM ({_flat_rows(0, count)})")
+            batch = conn.execute(f"SELECT *, {RAW_COMPOSITE_KEY} AS Composite_ID FROM ({batch_rows})").fetchdf()
+            start = time.perf_counter()
+            conn.register("df_view", batch)
+            conn.execute(f"INSERT INTO {FLAT_TABLE} BY NAME SELECT * FROM df_view")
+            conn.execute(f"""
+                CREATE OR REPLACE TABLE {FLAT_TABLE} AS
+                SELECT * EXCLUDE (rn) FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY Composite_ID ORDER BY Trial_ID) AS rn
+                    FROM {FLAT_TABLE}
+                )
+                WHERE rn = 1
+            """)
+            _report(f"append + dedup ({count} rows)", batch_size, time.perf_counter() - start)
+
+            # After: upsert against the Composite_ID primary key
+            conn.execute(f"DROP TABLE {FLAT_TABLE}")
+            ensure_flat_table(conn)
+            conn.execute(f"INSERT INTO {FLAT_TABLE} BY NAME SELECT *, {COMPOSITE_KEY} AS Composite_ID FROM ({_flat_rows(0, count)})")
+            batch = conn.execute(batch_rows).fetchdf()
+            start = time.perf_counter()
+            upsert_flat_rows(conn, add_composite_key(batch))
+            _report(f"primary key upsert ({count} rows)", batch_size, time.perf_counter() - start)
+        finally:
+            conn.close()
+
+
+def bench_composite_keys(count=1000000):
+    """Compare the concatenated string Composite_ID against the 16-byte hash: storage and COUNT(DISTINCT)."""
+    import duckdb
+    from etl_common import COMPOSITE_KEY, RAW_COMPOSITE_KEY
+
+    for label, key in (("string key", RAW_COMPOSITE_KEY), ("md5 blob key", COMPOSITE_KEY)):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.duckdb")
+            conn = duckdb.connect(path)
+            try:
+                conn.execute(f"CREATE TABLE keys AS SELECT {key} AS Composite_ID FROM ({_flat_rows(0, count)})")
+                conn.execute("CHECKPOINT")
+                start = time.perf_counter()
+                conn.execute("SELECT COUNT(DISTINCT Composite_ID) FROM keys").fetchone()
+                _report(f"COUNT(DISTINCT) {label}", count, time.perf_counter() - start)
+            finally:
+                conn.close()
+            print(f"{'':<32} key column on disk: {os.path.getsize(path) / 1024 ** 2:.1f} MB")
+
+
+def bench_dashboard_queries(count=10000000):
+    """Time the dashboard panels for one experiment and for all of them over a flat table of ``count`` rows,
+    first scanning the fact rows and then reading the ETL's summary tables."""
+    import duckdb
+    import dashboard_queries as queries
+    from etl_aggregates import AGGREGATE_QUERIES
+
+    def panels(conn, experiment_ids):
+        queries.experiment_counts(conn, experiment_ids)
+        queries.metric_names(conn, experiment_ids)
+        queries.metric_series(conn, "accuracy", 175, experiment_ids)
+        queries.hyperparameter_types(conn, experiment_ids)
+        queries.hyperparameter_means(conn, "alpha", experiment_ids)
+        queries.datasets(conn, ["Dataset_Name", "Dataset_Version", "Dataset_Size"], experiment_ids)
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = duckdb.connect(os.path.join(directory, "bench.duckdb"))
+        try:
+            # 10 flat rows per trial and 100,000 per experiment, each metric point repeated for 2 hyperparameters
+            conn.execute(f"""
+                CREATE TABLE experiment_flat AS
+                SELECT 'e' || (i // 100000) AS Experiment_ID, 'experiment ' || (i // 100000 % 50) AS Experiment_Name,
+                       'm' || (i // 100000 % 7) AS Model_ID, 'dataset ' || (i // 100000 % 3) AS Dataset_Name,
+                       1 AS Dataset_Version, 1000 AS Dataset_Size, 't' || (i // 10) AS Trial_ID,
+                       ['alpha', 'max_iter'][i % 2 + 1] AS Hyperparameter_Type, (i // 10 % 5)::VARCHAR AS Hyperparameter_Value,
+                       'mt' || (i // 2) AS Metric_ID, ['accuracy', 'loss', 'f1', 'precision', 'recall'][i // 2 % 5 + 1] AS Metric_Name,
+                       (i // 2 % 97) / 97 AS Metric_Value,
+                       (TIMESTAMP '2025-01-01' + to_seconds(i // 2))::VARCHAR AS Metric_Timestamp
+                FROM range({count}) t(i)
+            """)
+            for label in ("flat table", "summary tables"):
+                if label == "summary tables":
+                    for table in ("agg_experiment", "agg_metric_series", "agg_hyperparameter_metric"):
+                        conn.execute(f"CREATE TABLE {table} AS {AGGREGATE_QUERIES[table].format(flat_table='experiment_flat')}")
+                for selection, experiment_ids in (("one experiment", ["e42"]), ("all experiments", None)):
+                    start = time.perf_counter()
+                    panels(conn, experiment_ids)
+                    print(f"{label + ', ' + selection:<40} {count:>10} rows in {time.perf_counter() - start:8.3f}s")
+
+            # 2M per-step points of 100 trials, downsampled for the per-trial chart
+            conn.execute("""
+                CREATE TABLE fact_metric AS
+                SELECT 'mt' || i AS Metric_ID, 't' || (i // 20000) AS Trial_ID, 'e0' AS Experiment_ID, 'loss' AS Metric_Name,
+                       1 / (1 + i % 20000) AS Metric_Value, (TIMESTAMP '2025-01-01' + to_seconds(i % 20000))::VARCHAR AS Metric_Timestamp
+                FROM range(2000000) t(i)
+            """)
+            start = time.perf_counter()
+            series = queries.trial_metric_series(conn, "loss", 175, ["e0"], max_trials=20)
+            _report(f"downsample to {len(series)} rows", 2000000, time.perf_counter() - start)
+        finally:
+            conn.close()
+
+
+def _synthetic_source(path, trials):
+    """Fill an MLED database with ``trials`` trials of 2 hyperparameters x 2 metrics (4 flat rows each)."""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        create_database2(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO User VALUES ('u', 'Bench', 'User', 'bench@example.com', 'admin')")
+    conn.execute("INSERT INTO Dataset VALUES ('d', 'Synthetic', 1, 'synthetic', '/dev/null', 0)")
+    conn.execute("INSERT INTO Model VALUES ('m', 'MLP', 'NN', 1, '{}', NULL)")
+    conn.execute("INSERT INTO Experiment VALUES ('e', 'bench', 'u', 'benchmark', '2024-01-01', '2024-01-02', 'completed', 'm', 'd')")
+    trial_ids = [str(uuid.uuid4()) for _ in range(trials)]
+    conn.executemany("INSERT INTO Trial VALUES (?, 'e', 'completed', '2024-01-01', '2024-01-01', 42)", ((t,) for t in trial_ids))
+    conn.executemany("INSERT INTO Hyperparameter VALUES (?, ?, ?, 0, 1)",
+                     ((str(uuid.uuid4()), t, name) for t in trial_ids for name in ("alpha", "max_iter")))
+    conn.executemany("INSERT INTO Metric VALUES (?, ?, ?, 0.5, '2024-01-01')",
+                     ((str(uuid.uuid4()), t, name) for t in trial_ids for name in ("accuracy", "loss")))
+    conn.commit()
+    conn.close()
+
+
+def _full_load_peak_rss(source, target_path, chunk_size, result_queue):
+    """Run one full ETL load in a fresh process and report its peak resident set size in MB."""
+    import resource
+    import ETL_pipeline_full_extraction as full
+
+    full.SQLITE_DB_PATH, full.DUCKDB_PATH = source, target_path
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        if chunk_size:
+            full.stream_to_duckdb.fn(chunk_size)
+        else:
+            df, high_marks = full.extract_all_data.fn()
+            full.load_to_duckdb.fn(full.create_composite_key.fn(df), high_marks)
+    result_queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def bench_streaming_extraction(count=1000000, chunk_size=50000):
+    """Peak RSS of the full ETL load of ``count`` flat rows: one DataFrame vs. streamed chunks."""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.db")
+        _synthetic_source(source, count // 4)
+        for label, size in (("single DataFrame", None), (f"chunks of {chunk_size}", chunk_size)):
+            result_queue = context.Queue()
+            target_path = os.path.join(directory, f"{size}.duckdb")
+            start = time.perf_counter()
+            process = context.Process(target=_full_load_peak_rss, args=(source, target_path, size, result_queue))
+            process.start()
+            peak = result_queue.get()
+            process.join()
+            print(f"{label:<32} {count:>10} rows in {time.perf_counter() - start:8.3f}s  ->  peak RSS {peak:8.1f} MB")
+
+
+def _sharded_extract(source, shards):
+    """The sharded full extraction of ETL_pipeline_full_extraction, on a plain thread pool."""
+    from concurrent.futures import ThreadPoolExecutor
+    from etl_common import SOURCE_TABLES, extract_table, extraction_shards, join_in_duckdb, source_high_marks
+
+    def read(table, low, high):
+        conn = sqlite3.connect(source)
+        try:
+            return table, extract_table(conn, table, low, high)
+        finally:
+            conn.close()
+
+    conn = sqlite3.connect(source)
+    high_marks = source_high_marks(conn)
+    conn.close()
+    frames = {table: [] for table in SOURCE_TABLES}
+    with ThreadPoolExecutor(max_workers=shards) as pool:
+        for table, frame in pool.map(lambda read_args: read(*read_args), extraction_shards(high_marks, shards)):
+            frames[table].append(frame)
+    return join_in_duckdb(frames)
+
+
+def bench_sharded_extraction(count=1000000, shard_counts=(1, 2, 4, 8)):
+    """Full extraction of ``count`` flat rows: one SQLite join vs. concurrent table shards joined in DuckDB."""
+    from etl_common import extract_all
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.db")
+        _synthetic_source(source, count // 4)
+        conn = sqlite3.connect(source)
+        start = time.perf_counter()
+        rows = len(extract_all(conn)[0])
+        _report("single SQLite join", rows, time.perf_counter() - start)
+        conn.close()
+        for shards in shard_counts:
+            start = time.perf_counter()
+            rows = len(_sharded_extract(source, shards))
+            _report(f"{shards} shards, DuckDB join", rows, time.perf_counter() - start)
+
+
+BENCHMARKS = {
+    "inserts": bench_single_row_inserts,
+    "bulk": bench_bulk_metric_inserts,
+    "delete": bench_bulk_delete,
+    "handoff": bench_dataset_handoff,
+    "upsert": bench_flat_upsert,
+    "keys": bench_composite_keys,
+    "dashboard": bench_dashboard_queries,
+    "streaming": bench_streaming_extraction,
+    "sharded": bench_sharded_extraction,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run MLED performance benchmarks.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--count", type=int, help="Number of operations to time.")
+    args = parser.parse_args()
+
+    if args.count is None:
+        BENCHMARKS[args.benchmark]()
+    else:
+        BENCHMARKS[args.benchmark](args.count)
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+import queue
+import logging
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of SQLite connections.
+
+    Each thread borrows one connection at a time; nested ``connection()`` calls
+    on the same thread reuse the connection already checked out, so helpers can
+    call each other without deadlocking on the pool. Idle connections are health
+    checked before being handed out again and replaced if they are broken.
+    """
+
+    def __init__(self, database_name, size=5, timeout=30.0, health_check_interval=60.0, on_connect=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.database_name = database_name
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.on_connect = on_connect
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._closed = False
+
+    def _create_connection(self):
+        """Open a new connection that may be handed between threads."""
+        conn = sqlite3.connect(self.database_name, timeout=self.timeout, check_same_thread=False)
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def _discard(self, conn):
+        """Close a connection and forget about it."""
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_healthy(self, conn):
+        """Run a trivial query to make sure the connection still works."""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Discarding unhealthy pooled connection: {e}")
+            return False
+
+    def _checkout(self):
+        """Take an idle connection (or open a new one) for the calling thread."""
+        if self._closed:
+            raise PoolTimeout("Connection pool has been closed.")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No connection available for {self.database_name} after {self.timeout} seconds.")
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create_connection()
+                if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn):
+        """Return a connection to the idle queue, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the ``with`` block."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._checkin(conn)
+
+    def close(self):
+        """Close every connection owned by the pool."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        with self._lock:
+            remaining = list(self._connections)
+        for conn in remaining:
+            self._discard(conn)
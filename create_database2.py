@@ -1,7 +1,106 @@
 import sqlite3
+import argparse
 from datetime import datetime
 import uuid
 
+# Page cache per connection, in KiB (negative values are KiB for PRAGMA cache_size)
+CACHE_SIZE_KIB = 64000
+
+INDEXES = {
+    "idx_experiment_author": ("Experiment", "Author_ID"),
+    "idx_experiment_model": ("Experiment", "Model_ID"),
+    "idx_experiment_dataset": ("Experiment", "DataSet_ID"),
+    "idx_experiment_status": ("Experiment", "Status"),
+    "idx_experiment_start": ("Experiment", "StartTimeStamp"),
+    "idx_trial_experiment": ("Trial", "Experiment_ID"),
+    "idx_metric_trial": ("Metric", "Trial_ID"),
+    "idx_hyperparameter_trial": ("Hyperparameter", "Trial_ID"),
+    "idx_errorlog_experiment": ("ErrorLog", "Experiment_ID"),
+    "idx_errorlog_trial": ("ErrorLog", "Trial_ID"),
+}
+
+# Tables whose updates are recorded in ChangeLog for the incremental ETL;
+# User, Dataset and Model are denormalized into every flat row of the experiments that reference them
+CHANGE_TRACKED_TABLES = ["Experiment", "Trial", "Metric", "Hyperparameter", "User", "Dataset", "Model"]
+# Tables whose inserts and deletes are recorded too, with the experiment a deleted row belonged to.
+# Rowids of deleted rows are reused, so the ChangeLog sequence rather than MAX(rowid) finds new rows
+CHANGE_LOGGED_ROWS = {
+    "Experiment": "OLD.Experiment_ID",
+    "Trial": "OLD.Experiment_ID",
+    "Metric": "(SELECT Experiment_ID FROM Trial WHERE Trial_ID = OLD.Trial_ID)",
+    "Hyperparameter": "(SELECT Experiment_ID FROM Trial WHERE Trial_ID = OLD.Trial_ID)",
+}
+
+def apply_connection_pragmas(conn):
+    """Apply the per-connection tuning PRAGMAs (page cache, and relaxed fsyncs when running in WAL mode)."""
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+    journal_mode = conn.execute("PRAGMA journal_mode;").fetchone()[0]
+    if journal_mode.lower() == "wal":
+        conn.execute("PRAGMA synchronous = NORMAL;")
+
+def apply_database_pragmas(conn):
+    """Switch the database file to WAL journaling (persistent) and tune the current connection."""
+    conn.execute("PRAGMA journal_mode = WAL;")
+    apply_connection_pragmas(conn)
+
+def create_indexes(conn):
+    """Create the secondary indexes on foreign key and filter columns if they are missing."""
+    cursor = conn.cursor()
+    for index_name, (table, column) in INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column});")
+    conn.commit()
+
+def create_change_log(conn):
+    """Create the ChangeLog table and the AFTER UPDATE, INSERT and DELETE triggers that feed it."""
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        Change_Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        Table_Name TEXT NOT NULL,
+        Row_ID INTEGER NOT NULL,
+        ChangedAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+        Operation TEXT NOT NULL DEFAULT 'UPDATE',
+        Experiment_ID TEXT
+    );""")
+    # Change logs created before inserts and deletes were tracked
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(ChangeLog)")}
+    if "Operation" not in existing:
+        cursor.execute("ALTER TABLE ChangeLog ADD COLUMN Operation TEXT NOT NULL DEFAULT 'UPDATE'")
+    if "Experiment_ID" not in existing:
+        cursor.execute("ALTER TABLE ChangeLog ADD COLUMN Experiment_ID TEXT")
+    for table in CHANGE_TRACKED_TABLES:
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_changelog AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO ChangeLog (Table_Name, Row_ID) VALUES ('{table}', NEW.rowid);
+        END;""")
+    for table, experiment_id in CHANGE_LOGGED_ROWS.items():
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_changelog_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO ChangeLog (Table_Name, Row_ID, Operation) VALUES ('{table}', NEW.rowid, 'INSERT');
+        END;""")
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_changelog_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO ChangeLog (Table_Name, Row_ID, Operation, Experiment_ID)
+            VALUES ('{table}', OLD.rowid, 'DELETE', {experiment_id});
+        END;""")
+    conn.commit()
+
+def migrate_database(database_name="MLED_transactions.db"):
+    """Bring an existing database up to the current schema: PRAGMAs, indexes and fresh planner statistics."""
+    conn = sqlite3.connect(database_name)
+    try:
+        apply_database_pragmas(conn)
+        create_indexes(conn)
+        create_change_log(conn)
+        conn.execute("ANALYZE;")
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Database {database_name} migrated successfully.")
+
 def create_database2(database_name="test.db", conn=None):
     """Create SQLite database tables in the specified database."""
     is_test_db = conn is not None  # Track if we're using a test database
@@ -108,6 +207,12 @@ def create_database2(database_name="test.db", conn=None):
     """)
 
     conn.commit()
+
+    # Secondary indexes for the foreign key joins and experiment lookups
+    create_indexes(conn)
+    create_change_log(conn)
+    apply_database_pragmas(conn)
+
     #if database_name != ":memory:":  # Only close if it's not an in-memory test
         #conn.close()
 
@@ -118,6 +223,12 @@ def create_database2(database_name="test.db", conn=None):
 
 if __name__ == '__main__':
 
-    database = "MLED_transactions.db"
+    parser = argparse.ArgumentParser(description="Create or migrate the MLED transactional database.")
+    parser.add_argument("database", nargs="?", default="MLED_transactions.db")
+    parser.add_argument("--migrate", action="store_true", help="Add indexes, PRAGMAs and change tracking to an existing database.")
+    args = parser.parse_args()
 
-    create_database2(database)
\ No newline at end of file
+    if args.migrate:
+        migrate_database(args.database)
+    else:
+        create_database2(args.database)
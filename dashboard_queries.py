@@ -0,0 +1,141 @@
+#parameterized DuckDB queries behind the Streamlit dashboard
+#each one selects only the columns it shows and filters/groups inside DuckDB, so the result is the size of
+#the selected slice; experiment_ids of None means every experiment
+
+from etl_aggregates import aggregate_source
+
+FLAT_TABLE = "experiment_flat"
+
+
+def _where(experiment_ids, *conditions):
+    """WHERE clause restricting to ``experiment_ids`` plus ``conditions``, and its experiment parameters."""
+    if experiment_ids is not None:
+        conditions = (f"Experiment_ID IN ({', '.join('?' for _ in experiment_ids) or 'NULL'})",) + conditions
+    return ("WHERE " + " AND ".join(conditions) if conditions else ""), list(experiment_ids or [])
+
+
+def list_experiments(conn, flat_table=FLAT_TABLE):
+    """Experiment_Name and Experiment_ID of every experiment."""
+    return conn.execute(
+        f"SELECT Experiment_Name, Experiment_ID FROM {aggregate_source(conn, 'agg_experiment', flat_table)}").fetchdf()
+
+
+def experiment_counts(conn, experiment_ids=None, flat_table=FLAT_TABLE):
+    """(number of trials, number of models) of the selected experiments."""
+    where, params = _where(experiment_ids)
+    trials, models = conn.execute(f"""
+        SELECT COALESCE(SUM(Trial_Count), 0), COUNT(DISTINCT Model_ID)
+        FROM {aggregate_source(conn, 'agg_experiment', flat_table)} {where}
+    """, params).fetchone()
+    return int(trials), int(models)
+
+
+def metric_names(conn, experiment_ids=None, flat_table=FLAT_TABLE):
+    where, params = _where(experiment_ids)
+    rows = conn.execute(f"""
+        SELECT DISTINCT Metric_Name FROM {aggregate_source(conn, 'agg_metric_series', flat_table)} {where}
+        ORDER BY Metric_Name
+    """, params).fetchall()
+    return [row[0] for row in rows]
+
+
+def metric_series(conn, metric_name, buckets, experiment_ids=None, flat_table=FLAT_TABLE):
+    """Mean of ``metric_name`` downsampled in DuckDB to at most ``buckets`` time buckets: columns
+    Metric_Timestamp and Metric_Value.
+
+    The stored per-minute sums are regrouped into buckets that split the time range of the selection evenly,
+    so the result stays bounded however long the experiments ran.
+    """
+    where, params = _where(experiment_ids, "Metric_Name = ?")
+    return conn.execute(f"""
+        WITH stored AS (
+            SELECT epoch(Bucket) AS seconds, Value_Sum, Value_Count
+            FROM {aggregate_source(conn, 'agg_metric_series', flat_table)} {where}
+        ),
+        bounds AS (SELECT min(seconds) AS low, greatest(max(seconds) - min(seconds), 1) / ? AS width FROM stored)
+        SELECT to_timestamp(low + bucket * width)::TIMESTAMP AS Metric_Timestamp,
+               SUM(Value_Sum) / SUM(Value_Count) AS Metric_Value
+        FROM (
+            SELECT Value_Sum, Value_Count, low, width, least(floor((seconds - low) / width), ? - 1) AS bucket
+            FROM stored, bounds
+        )
+        GROUP BY bucket, low, width
+        ORDER BY Metric_Timestamp
+    """, params + [metric_name, buckets, buckets]).fetchdf()
+
+
+def _metric_points(conn, flat_table):
+    """One row per metric point: fact_metric when the star schema is loaded, else the flat table's Metric_IDs."""
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'fact_metric'").fetchone()[0]
+    if exists:
+        return "fact_metric"
+    return f"(SELECT DISTINCT ON (Metric_ID) * FROM {flat_table} WHERE Metric_ID IS NOT NULL)"
+
+
+def trial_metric_series(conn, metric_name, buckets, experiment_ids=None, max_trials=20, flat_table=FLAT_TABLE):
+    """``metric_name`` per trial, downsampled in DuckDB to at most ``buckets`` time buckets per trial.
+
+    Each row is a (trial, bucket) with Min_Value, Max_Value, Mean_Value and Points, so the result has at most
+    ``buckets * max_trials`` rows however often the metric was logged. Buckets split the time range of the
+    selection evenly; the ``max_trials`` trials with the most points are kept.
+    """
+    where, params = _where(experiment_ids, "Metric_Name = ?", "ts IS NOT NULL")
+    return conn.execute(f"""
+        WITH points AS (
+            SELECT Trial_ID, TRY_CAST(Metric_Timestamp AS TIMESTAMP) AS ts, Metric_Value, Experiment_ID, Metric_Name
+            FROM {_metric_points(conn, flat_table)}
+        ),
+        selected AS (SELECT Trial_ID, epoch(ts) AS seconds, Metric_Value FROM points {where}),
+        bounds AS (SELECT min(seconds) AS low, greatest(max(seconds) - min(seconds), 1) / ? AS width FROM selected),
+        top_trials AS (SELECT Trial_ID FROM selected GROUP BY Trial_ID ORDER BY COUNT(*) DESC, Trial_ID LIMIT ?)
+        SELECT Trial_ID, to_timestamp(low + bucket * width)::TIMESTAMP AS Metric_Timestamp,
+               min(Metric_Value) AS Min_Value, max(Metric_Value) AS Max_Value, avg(Metric_Value) AS Mean_Value,
+               COUNT(*) AS Points
+        FROM (
+            SELECT Trial_ID, Metric_Value, low, width, least(floor((seconds - low) / width), ? - 1) AS bucket
+            FROM selected, bounds WHERE Trial_ID IN (SELECT Trial_ID FROM top_trials)
+        )
+        GROUP BY Trial_ID, bucket, low, width
+        ORDER BY Trial_ID, Metric_Timestamp
+    """, params + [metric_name, buckets, max_trials, buckets]).fetchdf()
+
+
+def hyperparameter_types(conn, experiment_ids=None, flat_table=FLAT_TABLE):
+    where, params = _where(experiment_ids)
+    rows = conn.execute(f"""
+        SELECT DISTINCT Hyperparameter_Type FROM {aggregate_source(conn, 'agg_hyperparameter_metric', flat_table)} {where}
+        ORDER BY Hyperparameter_Type
+    """, params).fetchall()
+    return [row[0] for row in rows]
+
+
+def hyperparameter_means(conn, hyperparameter_type, experiment_ids=None, flat_table=FLAT_TABLE):
+    """Mean metric value per value of ``hyperparameter_type``: columns Hyperparameter_Value and Metric_Value."""
+    where, params = _where(experiment_ids, "Hyperparameter_Type = ?")
+    return conn.execute(f"""
+        SELECT Hyperparameter_Value, SUM(Value_Sum) / SUM(Value_Count) AS Metric_Value
+        FROM {aggregate_source(conn, 'agg_hyperparameter_metric', flat_table)} {where}
+        GROUP BY Hyperparameter_Value ORDER BY Hyperparameter_Value
+    """, params + [hyperparameter_type]).fetchdf()
+
+
+def datasets(conn, columns, experiment_ids=None, flat_table=FLAT_TABLE):
+    """Distinct values of the dataset ``columns`` the flat table has, or None when it has none of them."""
+    available = [row[0] for row in conn.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [flat_table]).fetchall()]
+    columns = [column for column in columns if column in available]
+    if not columns:
+        return None
+    where, params = _where(experiment_ids)
+    return conn.execute(f"SELECT DISTINCT {', '.join(columns)} FROM {flat_table} {where} ORDER BY ALL", params).fetchdf()
+
+
+def trials(conn, experiment_ids=None):
+    """The selected experiments' rows of trial_wide, or None when the star schema is not loaded."""
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'trial_wide'").fetchone()[0]
+    if not exists:
+        return None
+    where, params = _where(experiment_ids)
+    return conn.execute(f"SELECT * FROM trial_wide {where}", params).fetchdf()
@@ -1,50 +1,105 @@
 import sqlite3
 import logging
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 
+from connection_pool import ConnectionPool
+from create_database2 import apply_connection_pragmas
+
 #enter UUIDs
 
 logging.basicConfig(level=logging.ERROR, format='%(levelname)s: %(message)s')
 
+DATABASE_PATH = "test.db"
+POOL_SIZE = 5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure_database(database_name, pool_size=POOL_SIZE):
+    """Point the helpers at a database file, replacing any existing connection pool."""
+    global DATABASE_PATH, POOL_SIZE, _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        DATABASE_PATH = database_name
+        POOL_SIZE = pool_size
+        _pool = None
+    invalidate_options()
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DATABASE_PATH, size=POOL_SIZE, on_connect=apply_connection_pragmas)
+        return _pool
 
-def connect_db(database_name="test.db"):
-    """Establish a connection to the SQLite database."""
-    return sqlite3.connect(database_name)
+
+def connect_db(database_name=None):
+    """Establish a standalone connection to the SQLite database (defaults to the configured path)."""
+    return sqlite3.connect(database_name or DATABASE_PATH)
 
 
 def execute_query(query, params=()):
     """Execute a single query with error handling."""
     try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
     except sqlite3.IntegrityError as e:
         logging.error(f"Integrity error: {e}")
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
     except Exception as e:
         logging.error(f"Exception: {e}")
-    finally:
-        conn.close()
 
 def fetch_data(query, params=()):
     """Retrieve data from the database with error handling."""
     try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        result = cursor.fetchall()
-        return result
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+            return result
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
         return []
     except Exception as e:
         logging.error(f"Exception: {e}")
         return []
-    finally:
-        conn.close()
+
+
+@contextmanager
+def transaction(conn=None):
+    """Yield a connection inside a single transaction, committing on success and rolling back on error.
+
+    If ``conn`` already has a transaction open, the caller owns it: the work runs inside a savepoint that is
+    rolled back on error, and nothing is committed here.
+    """
+    if conn is not None and conn.in_transaction:
+        conn.execute("SAVEPOINT nested_transaction")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK TO nested_transaction")
+            raise
+        finally:
+            conn.execute("RELEASE nested_transaction")
+        return
+    with (nullcontext(conn) if conn is not None else get_pool().connection()) as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def insert_user(first_name, last_name, email, role):
@@ -56,6 +111,7 @@ def insert_user(first_name, last_name, email, role):
     query = """
     INSERT INTO User (User_ID, First_Name, Last_Name, Email, Role) VALUES (?, ?, ?, ?, ?)"""
     execute_query(query, (user_id, first_name, last_name, email, role))
+    invalidate_options("User")
 
 def insert_dataset(name, version, description, storage_location, size):
     """Insert a new dataset into the Dataset table with validation."""
@@ -66,6 +122,7 @@ def insert_dataset(name, version, description, storage_location, size):
     query = """
     INSERT INTO Dataset (DataSet_ID, Name, Version, Description, Storage_Location, Size) VALUES (?, ?, ?, ?, ?, ?)"""
     execute_query(query, (data_id, name, version, description, storage_location, size))
+    invalidate_options("Dataset")
 
 def insert_model(name, model_type, version, hyperparameters, artifact_location):
     """Insert a new model into the Model table with validation."""
@@ -76,6 +133,7 @@ def insert_model(name, model_type, version, hyperparameters, artifact_location):
     query = """
     INSERT INTO Model (Model_ID, Name, Type, Version, Hyperparameters, ArtifactLocation) VALUES (?, ?, ?, ?, ?, ?)"""
     execute_query(query, (model_id, name, model_type, version, hyperparameters, artifact_location))
+    invalidate_options("Model")
 
 def insert_experiment(name, author_id, description, status, model_id, dataset_id):
     """Insert a new experiment into the Experiment table with validation."""
@@ -89,6 +147,7 @@ def insert_experiment(name, author_id, description, status, model_id, dataset_id
     INSERT INTO Experiment (Experiment_ID, Name, Author_ID, Description, StartTimeStamp, EndTimeStamp, Status, Model_ID, DataSet_ID) 
     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
     execute_query(query, (experiment_id, name, author_id, description, start_time, end_time, status, model_id, dataset_id))
+    invalidate_options("Experiment")
 
 def insert_trial(experiment_id, status, start_time, end_time, seed):
     """Insert a new trial into the Trial table with validation."""
@@ -99,6 +158,7 @@ def insert_trial(experiment_id, status, start_time, end_time, seed):
     query = """
     INSERT INTO Trial (Trial_ID, Experiment_ID, Status, StartTime, EndTime, Seed) VALUES (?, ?, ?, ?, ?, ?)"""
     execute_query(query, (trial_id, experiment_id, status, start_time, end_time, seed))
+    invalidate_options("Trial")
 
 def insert_metric(trial_id, name, value, timestamp):
     """Insert a new metric into the Metric table with validation."""
@@ -130,17 +190,220 @@ def insert_error_log(experiment_id, trial_id, timestamp, error_message, error_de
     INSERT INTO ErrorLog (Error_ID, Experiment_ID, Trial_ID, TimeStamp, ErrorMessage, ErrorDetails) VALUES (?, ?, ?, ?, ?, ?)"""
     execute_query(query, (error_id, experiment_id, trial_id, timestamp, error_message, error_details))
 
+TRIAL_INSERT = "INSERT INTO Trial (Trial_ID, Experiment_ID, Status, StartTime, EndTime, Seed) VALUES (?, ?, ?, ?, ?, ?)"
+METRIC_INSERT = "INSERT INTO Metric (Metric_ID, Trial_ID, Name, Value, TimeStamp) VALUES (?, ?, ?, ?, ?)"
+HYPERPARAMETER_INSERT = "INSERT INTO Hyperparameter (Hyperparameter_ID, Trial_ID, Type, Epochs, Value) VALUES (?, ?, ?, ?, ?)"
+
+TRIAL_ERROR = "Error: Experiment ID, status, start time, and end time are required."
+METRIC_ERROR = "Error: Trial ID, name, value, and timestamp are required."
+HYPERPARAMETER_ERROR = "Error: Trial ID, type, and value are required."
+
+
+def _validate_rows(rows, width, required, not_none, message):
+    """Split rows into valid rows and (index, message) failures in a single pass.
+
+    ``required`` lists positions that must be truthy and ``not_none`` positions that may be falsy but not None.
+    """
+    rows = [tuple(row) for row in rows]
+    shape_ok = [len(row) == width for row in rows]
+    values_ok = [ok and all(row[i] for i in required) and all(row[i] is not None for i in not_none)
+                 for row, ok in zip(rows, shape_ok)]
+    valid = [row for row, ok in zip(rows, values_ok) if ok]
+    failures = [(index, message if shape_ok[index] else f"Error: Expected {width} fields, got {len(rows[index])}.")
+                for index, ok in enumerate(values_ok) if not ok]
+    for index, reason in failures:
+        logging.error(f"Row {index} rejected: {reason}")
+    return valid, failures
+
+
+def _insert_many(query, rows, conn=None):
+    """Prefix each row with a new UUID and insert them all with executemany in one transaction.
+
+    If the database rejects a row (a duplicate key, say), the batch is retried row by row in one transaction,
+    each row in its own savepoint, so the other rows still go in. Returns the IDs of the inserted rows and a
+    list of (position, message) for the rejected ones.
+    """
+    rows = [(str(uuid.uuid4()),) + tuple(row) for row in rows]
+    if not rows:
+        return [], []
+    try:
+        try:
+            with transaction(conn) as batch_conn:
+                batch_conn.executemany(query, rows)
+            return [row[0] for row in rows], []
+        except sqlite3.IntegrityError:
+            pass
+        rejected = []
+        with transaction(conn) as conn:
+            # An outer savepoint keeps the per-row savepoints in one transaction instead of committing each row
+            conn.execute("SAVEPOINT insert_rows")
+            for position, row in enumerate(rows):
+                conn.execute("SAVEPOINT insert_row")
+                try:
+                    conn.execute(query, row)
+                except sqlite3.IntegrityError as e:
+                    conn.execute("ROLLBACK TO insert_row")
+                    rejected.append((position, f"Integrity error: {e}"))
+                conn.execute("RELEASE insert_row")
+            conn.execute("RELEASE insert_rows")
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        return [], [(position, f"Database error: {e}") for position in range(len(rows))]
+    failed = {position for position, _ in rejected}
+    return [row[0] for position, row in enumerate(rows) if position not in failed], rejected
+
+
+def _insert_valid(query, valid, failures, conn=None):
+    """Insert the rows _validate_rows accepted; rows the database rejects join ``failures`` under their batch index."""
+    failed = {index for index, _ in failures}
+    indices = [index for index in range(len(valid) + len(failures)) if index not in failed]
+    ids, rejected = _insert_many(query, valid, conn)
+    for position, reason in rejected:
+        logging.error(f"Row {indices[position]} rejected: {reason}")
+    return ids, sorted(failures + [(indices[position], reason) for position, reason in rejected])
+
+
+def insert_trials_many(rows, conn=None):
+    """Insert (experiment_id, status, start_time, end_time, seed) rows into Trial in one transaction.
+
+    Returns the new Trial_IDs of the inserted rows and a list of (row index, message) failures: rows that failed
+    validation or that the database rejected.
+    """
+    valid, failures = _validate_rows(rows, 5, (0, 1, 2, 3), (), TRIAL_ERROR)
+    ids, failures = _insert_valid(TRIAL_INSERT, valid, failures, conn)
+    invalidate_options("Trial")
+    return ids, failures
+
+def insert_metrics_many(rows, conn=None):
+    """Insert (trial_id, name, value, timestamp) rows into Metric in one transaction.
+
+    Returns the new Metric_IDs of the inserted rows and a list of (row index, message) failures: rows that failed
+    validation or that the database rejected.
+    """
+    valid, failures = _validate_rows(rows, 4, (0, 1, 3), (2,), METRIC_ERROR)
+    return _insert_valid(METRIC_INSERT, valid, failures, conn)
+
+def insert_hyperparameters_many(rows, conn=None):
+    """Insert (trial_id, param_type, epochs, value) rows into Hyperparameter in one transaction.
+
+    Returns the new Hyperparameter_IDs of the inserted rows and a list of (row index, message) failures: rows that
+    failed validation or that the database rejected.
+    """
+    valid, failures = _validate_rows(rows, 4, (0, 1), (3,), HYPERPARAMETER_ERROR)
+    return _insert_valid(HYPERPARAMETER_INSERT, valid, failures, conn)
+
+
+def insert_trial_bundle(experiment_id, status, start_time, end_time, seed, hyperparameters=None, metrics=None, trial_id=None, conn=None):
+    """Insert a trial together with its hyperparameters and metrics in one transaction.
+
+    ``hyperparameters`` is a {type: value} dict or a list of (type, epochs, value) tuples, and ``metrics`` is a
+    {name: value} dict (timestamped with ``end_time``) or a list of (name, value, timestamp) tuples.
+    A ``trial_id`` chosen by the caller is used instead of a fresh UUID.
+    Returns the new Trial_ID (None if the trial itself was rejected) and a dict of validation failures per table.
+    """
+    if isinstance(hyperparameters, dict):
+        hyperparameters = [(param_type, 0, value) for param_type, value in hyperparameters.items()]
+    if isinstance(metrics, dict):
+        metrics = [(name, value, end_time) for name, value in metrics.items()]
+
+    trial, trial_failures = _validate_rows([(experiment_id, status, start_time, end_time, seed)], 5, (0, 1, 2, 3), (), TRIAL_ERROR)
+    failures = {"Trial": trial_failures, "Hyperparameter": [], "Metric": []}
+    if not trial:
+        return None, failures
+
+    trial_id = trial_id or str(uuid.uuid4())
+    hp_rows, failures["Hyperparameter"] = _validate_rows([(trial_id,) + tuple(row) for row in hyperparameters or []],
+                                                         4, (0, 1), (3,), HYPERPARAMETER_ERROR)
+    metric_rows, failures["Metric"] = _validate_rows([(trial_id,) + tuple(row) for row in metrics or []],
+                                                     4, (0, 1, 3), (2,), METRIC_ERROR)
+    try:
+        with transaction(conn) as conn:
+            conn.execute(TRIAL_INSERT, (trial_id,) + trial[0])
+            conn.executemany(HYPERPARAMETER_INSERT, [(str(uuid.uuid4()),) + row for row in hp_rows])
+            conn.executemany(METRIC_INSERT, [(str(uuid.uuid4()),) + row for row in metric_rows])
+    except sqlite3.IntegrityError as e:
+        logging.error(f"Integrity error: {e}")
+        return None, failures
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        return None, failures
+    invalidate_options("Trial")
+    return trial_id, failures
+
+
+def _execute_counted(query, params=(), conn=None):
+    """Run one write statement in a transaction and return how many rows it changed, or None on error."""
+    try:
+        with transaction(conn) as conn:
+            return conn.execute(query, params).rowcount
+    except sqlite3.IntegrityError as e:
+        logging.error(f"Integrity error: {e}")
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+    return None
+
+
+def _execute_for_keys(query, params, table, condition_column, keys, conn=None):
+    """Run ``query`` (with a ``{rowids}`` subquery placeholder) on the rows of ``table`` matching ``keys``, in one transaction.
+
+    The keys are loaded into a temporary table and matched with ``condition_column = key`` inside SQLite, so the
+    column's type affinity applies as it does for a single ``= ?`` and no bound-variable limit is involved. Missing
+    keys are found before the statement runs, so it may change ``condition_column`` itself. Returns the keys no
+    record was found for, or None on error.
+    """
+    keys = list(dict.fromkeys(keys))
+    try:
+        with transaction(conn) as conn:
+            # The key column has no declared type, so each key keeps the type it was bound with
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS mutation_keys (position INTEGER PRIMARY KEY, key)")
+            conn.execute("DELETE FROM temp.mutation_keys")
+            conn.executemany("INSERT INTO temp.mutation_keys VALUES (?, ?)", enumerate(keys))
+            missing = [row[0] for row in conn.execute(f"""
+                SELECT position FROM temp.mutation_keys
+                WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.{condition_column} = mutation_keys.key)
+                ORDER BY position""")]
+            rowids = f"SELECT {table}.rowid FROM {table} JOIN temp.mutation_keys ON {table}.{condition_column} = mutation_keys.key"
+            conn.execute(query.format(rowids=rowids), params)
+            conn.execute("DELETE FROM temp.mutation_keys")
+    except sqlite3.IntegrityError as e:
+        logging.error(f"Integrity error: {e}")
+        return None
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        return None
+    return [keys[position] for position in missing]
+
+
+def _log_missing(action, table, condition_column, missing):
+    if missing:
+        shown = ", ".join(str(key) for key in missing[:10]) + (", ..." if len(missing) > 10 else "")
+        logging.error(f"{action} failed: No record found in {table} for {len(missing)} {condition_column} values: {shown}")
+
+
 def update_value(table, column, new_value, condition_column, condition_value):
-    """Update a specific column in a table based on a condition, logging errors if no record is found."""
-    check_query = f"SELECT COUNT(*) FROM {table} WHERE {condition_column} = ?"
-    existing_count = fetch_data(check_query, (condition_value,))[0][0]
+    """Update a specific column in a table based on a condition, logging errors if no record is found.
 
-    if existing_count == 0:
+    The UPDATE's own row count tells whether a record matched. Returns the number of rows updated (None on error).
+    """
+    query = f"UPDATE {table} SET {column} = ? WHERE {condition_column} = ?"
+    count = _execute_counted(query, (new_value, condition_value))
+    if count == 0:
         logging.error(f"Update failed: No record found in {table} where {condition_column} = {condition_value}")
-        return
+    elif count:
+        invalidate_options(table if table in OPTION_COLUMNS else None)
+    return count
 
-    query = f"UPDATE {table} SET {column} = ? WHERE {condition_column} = ?"
-    execute_query(query, (new_value, condition_value))
+def update_many(table, column, new_value, condition_column, condition_values, conn=None):
+    """Set ``column`` to ``new_value`` on every row whose ``condition_column`` is in ``condition_values``, in one transaction.
+
+    Returns the values no record was found for (logged as one error), or None if the update failed and was rolled back.
+    """
+    query = f"UPDATE {table} SET {column} = ? WHERE rowid IN ({{rowids}})"
+    missing = _execute_for_keys(query, (new_value,), table, condition_column, condition_values, conn)
+    if missing is not None:
+        _log_missing("Update", table, condition_column, missing)
+        invalidate_options(table if table in OPTION_COLUMNS else None)
+    return missing
 
 
 def fetch_table(table):
@@ -148,28 +411,195 @@ def fetch_table(table):
     query = f"SELECT * FROM {table}"
     return fetch_data(query)
 
+OPTION_COLUMNS = {
+    "User": ("User_ID", "Email"),
+    "Dataset": ("DataSet_ID", "Name"),
+    "Model": ("Model_ID", "Name"),
+    "Experiment": ("Experiment_ID", "Name"),
+    "Trial": ("Trial_ID", "Trial_ID"),
+}
+OPTION_LIMIT = 20
+OPTION_CACHE_SIZE = 256
+OPTION_CACHE_SECONDS = 60
+
+_option_cache = OrderedDict()
+_option_lock = threading.Lock()
+
+
+def invalidate_options(table=None):
+    """Drop cached dropdown options of ``table`` (of every table if None) after it was written to."""
+    with _option_lock:
+        for key in [key for key in _option_cache if table is None or key[0] == table]:
+            del _option_cache[key]
+
+
+def search_options(table, text="", limit=OPTION_LIMIT):
+    """Up to ``limit`` (id, label) options of ``table`` whose id starts with or label contains ``text``.
+
+    Only the two option columns are read. Results are cached in-process; the writers in this module invalidate
+    the table's entries, and OPTION_CACHE_SECONDS bounds how stale writes from other processes can leave them.
+    """
+    id_column, label_column = OPTION_COLUMNS[table]
+    key = (table, text, limit)
+    with _option_lock:
+        cached = _option_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < OPTION_CACHE_SECONDS:
+            _option_cache.move_to_end(key)
+            return cached[1]
+
+    if not text:
+        query = f"SELECT {id_column}, {label_column} FROM {table} ORDER BY {label_column} LIMIT ?"
+        params = (limit,)
+    elif id_column == label_column:
+        # A range on the primary key is a prefix search that can use its index
+        query = f"SELECT {id_column}, {label_column} FROM {table} WHERE {id_column} >= ? AND {id_column} < ? ORDER BY {id_column} LIMIT ?"
+        params = (text, text[:-1] + chr(ord(text[-1]) + 1), limit)
+    else:
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = f"""SELECT {id_column}, {label_column} FROM {table}
+        WHERE {label_column} LIKE ? ESCAPE '\\' OR ({id_column} >= ? AND {id_column} < ?) ORDER BY {label_column} LIMIT ?"""
+        params = (pattern, text, text[:-1] + chr(ord(text[-1]) + 1), limit)
+    options = fetch_data(query, params)
+
+    with _option_lock:
+        _option_cache[key] = (time.monotonic(), options)
+        _option_cache.move_to_end(key)
+        while len(_option_cache) > OPTION_CACHE_SIZE:
+            _option_cache.popitem(last=False)
+    return options
+
+PAGE_SIZE = 50
+
+def get_table_columns(table):
+    """Column names of ``table``, or an empty list if it is not a table in the database."""
+    if not fetch_data("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)):
+        return []
+    return [row[1] for row in fetch_data(f'PRAGMA table_info("{table}")')]
+
+def get_sort_columns(table):
+    """Columns of ``table`` that lead a full index (the primary key's included), in table order."""
+    columns = get_table_columns(table)
+    indexed = set()
+    for _, index_name, _, _, partial in fetch_data(f'PRAGMA index_list("{table}")') if columns else ():
+        if not partial:
+            indexed.update(name for seqno, _, name in fetch_data(f'PRAGMA index_info("{index_name}")') if seqno == 0)
+    return [column for column in columns if column in indexed]
+
+def fetch_page(table, sort_column=None, after=None, before=None, page_size=PAGE_SIZE):
+    """Retrieve one page of ``table`` ordered by ``sort_column`` (insertion order if None) using keyset pagination.
+
+    ``after``/``before`` take a key from a previous page to fetch the page following or preceding it. Only rowid and
+    the columns from get_sort_columns can be sorted by, so every page costs an index seek rather than an OFFSET scan
+    or a sort of the whole table. Returns the rows, their keys and whether a further page exists in the direction
+    fetched.
+    """
+    columns = get_table_columns(table)
+    if not columns or (sort_column is not None and sort_column not in columns):
+        logging.error(f"Page failed: No column {sort_column} in table {table}")
+        return [], [], False
+    if sort_column is not None and sort_column not in get_sort_columns(table):
+        logging.error(f"Page failed: Column {sort_column} of table {table} has no index to sort by")
+        return [], [], False
+    nullable = sort_column is not None and not any(
+        row[1] == sort_column and row[3] for row in fetch_data(f'PRAGMA table_info("{table}")'))
+    rows = []
+    for query, params in _page_queries(table, sort_column, after, before, nullable):
+        rows += fetch_data(query, params + (page_size + 1 - len(rows),))
+        if len(rows) > page_size:
+            break
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+    return [row[2:] for row in rows], [row[:2] for row in rows], more
+
+def _page_queries(table, sort_column=None, after=None, before=None, nullable=True):
+    """The (query, params) pairs fetch_page reads in order until the page is full; each takes the LIMIT last.
+
+    NULLs sort first and row value comparisons with NULL are never true, so a ``nullable`` sort column splits into
+    its NULL run and its non-NULL range. Each is its own query, since an OR of the two cannot walk the index.
+    """
+    column = f'"{sort_column}"' if sort_column else "rowid"
+    if sort_column is not None and not nullable:
+        # No NULL run to visit (and "IS NULL" on a NOT NULL column would walk the whole index to find nothing)
+        if after is not None:
+            ranges = [(f"({column}, rowid) > (?, ?)", tuple(after))]
+        elif before is not None:
+            ranges = [(f"({column}, rowid) < (?, ?)", tuple(before))]
+        else:
+            ranges = [("1", ())]
+    elif after is not None:
+        key = tuple(after)
+        if sort_column is None:
+            ranges = [("rowid > ?", key[1:])]
+        elif key[0] is None:
+            ranges = [(f"{column} IS NULL AND rowid > ?", key[1:]), (f"{column} IS NOT NULL", ())]
+        else:
+            ranges = [(f"({column}, rowid) > (?, ?)", key)]
+    elif before is not None:
+        key = tuple(before)
+        if sort_column is None:
+            ranges = [("rowid < ?", key[1:])]
+        elif key[0] is None:
+            ranges = [(f"{column} IS NULL AND rowid < ?", key[1:])]
+        else:
+            ranges = [(f"({column}, rowid) < (?, ?)", key), (f"{column} IS NULL", ())]
+    elif sort_column is None:
+        ranges = [("1", ())]
+    else:
+        ranges = [(f"{column} IS NULL", ()), (f"{column} IS NOT NULL", ())]
+    direction = "DESC" if before is not None else "ASC"
+    return [(f'SELECT {column}, rowid, * FROM "{table}" WHERE {condition} '
+             f'ORDER BY {column} {direction}, rowid {direction} LIMIT ?', params) for condition, params in ranges]
+
+def estimate_row_count(table):
+    """Cheap row count estimate for ``table``: its largest rowid, found with one b-tree seek instead of a full COUNT(*).
+
+    Exact for tables that are only ever appended to; rows deleted since the last insert make it an overestimate.
+    """
+    if not get_table_columns(table):
+        return 0
+    return fetch_data(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"')[0][0]
+
 def delete_row(table, condition_column, condition_value):
-    """Delete a row from a table based on a condition, logging an error if no record exists."""
-    
-    check_query = f"SELECT COUNT(*) FROM {table} WHERE {condition_column} = ?"
-    record_exists = fetch_data(check_query, (condition_value,))[0][0] > 0  # Returns True if record exists
-    
-    if not record_exists:
-        logging.error(f"Delete failed: No record found in {table} where {condition_column} = {condition_value}")
-        return 
+    """Delete a row from a table based on a condition, logging an error if no record exists.
 
+    The DELETE's own row count tells whether a record matched. Returns the number of rows deleted (None on error).
+    """
     query = f"DELETE FROM {table} WHERE {condition_column} = ?"
-    execute_query(query, (condition_value,))
+    count = _execute_counted(query, (condition_value,))
+    if count == 0:
+        logging.error(f"Delete failed: No record found in {table} where {condition_column} = {condition_value}")
+    elif count:
+        # Deletes cascade to child tables
+        invalidate_options()
+    return count
+
+def delete_many(table, condition_column, condition_values, conn=None):
+    """Delete every row whose ``condition_column`` is in ``condition_values`` in one transaction.
+
+    Returns the values no record was found for (logged as one error), or None if the delete failed and was rolled back.
+    """
+    query = f"DELETE FROM {table} WHERE rowid IN ({{rowids}})"
+    missing = _execute_for_keys(query, (), table, condition_column, condition_values, conn)
+    if missing is not None:
+        _log_missing("Delete", table, condition_column, missing)
+        invalidate_options()
+    return missing
 
 def delete_table(table):
     """Delete an entire table from the database."""
     query = f"DROP TABLE IF EXISTS {table}"
     execute_query(query)
+    invalidate_options()
+
+EXPERIMENTS_BY_AUTHOR_QUERY = "SELECT * FROM Experiment WHERE Author_ID = ?"
+LATEST_EXPERIMENT_QUERY = "SELECT * FROM Experiment ORDER BY StartTimeStamp DESC LIMIT 1"
+ACTIVE_EXPERIMENTS_QUERY = "SELECT * FROM Experiment WHERE Status = 'Active'"
 
 def fetch_experiments_by_author(author_id):
     """Retrieve all experiments associated with a given author ID."""
-    query = "SELECT * FROM Experiment WHERE Author_ID = ?"
-    return fetch_data(query, (author_id,))
+    return fetch_data(EXPERIMENTS_BY_AUTHOR_QUERY, (author_id,))
 
 def count_records(table):
     """Count the number of records in a given table."""
@@ -178,13 +608,11 @@ def count_records(table):
 
 def get_latest_experiment():
     """Retrieve the most recently created experiment."""
-    query = "SELECT * FROM Experiment ORDER BY StartTimeStamp DESC LIMIT 1"
-    return fetch_data(query)
+    return fetch_data(LATEST_EXPERIMENT_QUERY)
 
 def get_active_experiments():
     """Retrieve all experiments that are currently active."""
-    query = "SELECT * FROM Experiment WHERE Status = 'Active'"
-    return fetch_data(query)
+    return fetch_data(ACTIVE_EXPERIMENTS_QUERY)
 
 #test
 #insert_user("Tilly", "White", "email7@email", "Data Scientist")
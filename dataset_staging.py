@@ -0,0 +1,94 @@
+#stage train/test splits once as .npy files so parallel workers can memory-map them
+#instead of receiving a pickled copy of every array with each trial
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+# RAM-backed when available and large enough (containers often mount only 64MB), so the memory maps never
+# touch a disk; otherwise the system temporary directory
+SHARED_MEMORY_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Memory maps already opened by this process for one staging directory: {directory: {path: memmap}}. Opening
+# another directory drops the previous one, so long-lived workers do not keep deleted files mapped
+_opened = {}
+
+
+class StagedDataset:
+    """A small, picklable handle to arrays staged on disk.
+
+    Only the file paths travel to the workers; ``load()`` returns read-only memory maps that share the
+    operating system's page cache across every process on the machine.
+    """
+
+    def __init__(self, directory, names):
+        self.directory = directory
+        self.names = list(names)
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def __getitem__(self, name):
+        if self.directory not in _opened:
+            _opened.clear()
+            _opened[self.directory] = {}
+        opened = _opened[self.directory]
+        path = self.path(name)
+        if path not in opened:
+            opened[path] = np.load(path, mmap_mode="r")
+        return opened[path]
+
+    def load(self):
+        """Return the staged arrays in the order they were staged."""
+        return tuple(self[name] for name in self.names)
+
+    def nbytes(self):
+        """Total size of the staged files in bytes."""
+        return sum(os.path.getsize(self.path(name)) for name in self.names)
+
+
+def _prepare(array, downcast):
+    """Make an array memory-mappable and optionally shrink float64 data to float32."""
+    array = np.asarray(array)
+    if array.dtype == object:
+        # Object arrays (e.g. string labels from fetch_openml) cannot be memory-mapped
+        array = array.astype(str)
+    if downcast and array.dtype == np.float64:
+        array = array.astype(np.float32)
+    return np.ascontiguousarray(array)
+
+
+def _staging_root(nbytes):
+    """SHARED_MEMORY_DIR when it has room for ``nbytes``, else None (the system temporary directory)."""
+    if SHARED_MEMORY_DIR is None:
+        return None
+    try:
+        free = shutil.disk_usage(SHARED_MEMORY_DIR).free
+    except OSError:
+        return None
+    return SHARED_MEMORY_DIR if free > nbytes else None
+
+
+def stage_arrays(directory=None, downcast=False, **arrays):
+    """Write each keyword array to ``<directory>/<name>.npy`` and return a StagedDataset handle."""
+    arrays = {name: _prepare(array, downcast) for name, array in arrays.items()}
+    directory = directory or tempfile.mkdtemp(
+        prefix="mled_dataset_", dir=_staging_root(sum(array.nbytes for array in arrays.values())))
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+    return StagedDataset(directory, arrays)
+
+
+@contextmanager
+def stage_dataset(downcast=False, **arrays):
+    """Stage arrays in a temporary directory for the duration of the ``with`` block, then remove them."""
+    staged = stage_arrays(downcast=downcast, **arrays)
+    try:
+        yield staged
+    finally:
+        _opened.pop(staged.directory, None)
+        shutil.rmtree(staged.directory, ignore_errors=True)
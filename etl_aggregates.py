@@ -0,0 +1,177 @@
+#summary tables the dashboard reads instead of scanning experiment_flat
+#maintained from each loaded batch: the batch is added and the stored rows it replaces are subtracted
+
+# table: ([(key column, type)], [(value column, type)])
+AGGREGATE_TABLES = {
+    # one row per trial ever loaded, so distinct trial counts never need the fact rows
+    "agg_trial": ([("Trial_ID", "VARCHAR")], [("Experiment_ID", "VARCHAR")]),
+    "agg_experiment": ([("Experiment_ID", "VARCHAR")], [
+        ("Experiment_Name", "VARCHAR"), ("Model_ID", "VARCHAR"), ("Trial_Count", "BIGINT"),
+    ]),
+    # mean of each metric per time bucket (one point per Metric_ID, however many flat rows repeat it)
+    "agg_metric_series": ([("Experiment_ID", "VARCHAR"), ("Metric_Name", "VARCHAR"), ("Bucket", "TIMESTAMP")], [
+        ("Value_Sum", "DOUBLE"), ("Value_Count", "BIGINT"),
+    ]),
+    # metric values of the flat rows per hyperparameter setting
+    "agg_hyperparameter_metric": ([
+        ("Experiment_ID", "VARCHAR"), ("Hyperparameter_Type", "VARCHAR"), ("Hyperparameter_Value", "VARCHAR"),
+        ("Metric_Name", "VARCHAR"),
+    ], [("Value_Sum", "DOUBLE"), ("Value_Count", "BIGINT")]),
+}
+
+SERIES_BUCKET = "1 minute"
+
+# Flat columns the aggregates read; a batch without some of them contributes NULLs
+AGGREGATE_COLUMNS = ["Composite_ID", "Experiment_ID", "Experiment_Name", "Model_ID", "Trial_ID", "Hyperparameter_Type",
+                     "Hyperparameter_Value", "Metric_ID", "Metric_Name", "Metric_Value", "Metric_Timestamp"]
+
+_BUCKET = f"time_bucket(INTERVAL '{SERIES_BUCKET}', TRY_CAST(Metric_Timestamp AS TIMESTAMP))"
+
+# The same summaries computed from the flat table, for readers without the maintained tables (the parquet lake)
+AGGREGATE_QUERIES = {
+    "agg_experiment": """
+        SELECT Experiment_ID, any_value(Experiment_Name) AS Experiment_Name, any_value(Model_ID) AS Model_ID,
+               COUNT(DISTINCT Trial_ID) AS Trial_Count
+        FROM {flat_table} GROUP BY Experiment_ID
+    """,
+    "agg_metric_series": f"""
+        SELECT Experiment_ID, Metric_Name, Bucket, sum(Metric_Value) AS Value_Sum, COUNT(*) AS Value_Count
+        FROM (SELECT DISTINCT ON (Metric_ID) *, {_BUCKET} AS Bucket FROM {{flat_table}} WHERE Metric_ID IS NOT NULL)
+        WHERE Metric_Name IS NOT NULL AND Bucket IS NOT NULL AND Metric_Value IS NOT NULL
+        GROUP BY ALL
+    """,
+    "agg_hyperparameter_metric": """
+        SELECT Experiment_ID, Hyperparameter_Type, Hyperparameter_Value, Metric_Name,
+               sum(Metric_Value) AS Value_Sum, COUNT(*) AS Value_Count
+        FROM {flat_table}
+        WHERE Hyperparameter_Type IS NOT NULL AND Hyperparameter_Value IS NOT NULL AND Metric_Name IS NOT NULL
+          AND Metric_Value IS NOT NULL
+        GROUP BY ALL
+    """,
+}
+
+
+def _create_aggregate_tables(duck_conn):
+    for table, (keys, values) in AGGREGATE_TABLES.items():
+        definitions = ", ".join(f"{name} {column_type} NOT NULL" for name, column_type in keys)
+        definitions += "".join(f", {name} {column_type}" for name, column_type in values)
+        duck_conn.execute(f"CREATE TABLE {table} ({definitions}, PRIMARY KEY ({', '.join(name for name, _ in keys)}))")
+
+
+def ensure_aggregate_tables(duck_conn, flat_table="experiment_flat"):
+    """Create the summary tables, filling them from ``flat_table`` when it was loaded before they existed."""
+    existing = {row[0] for row in duck_conn.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+    if all(table in existing for table in AGGREGATE_TABLES):
+        return
+    drop_aggregate_tables(duck_conn)
+    _create_aggregate_tables(duck_conn)
+    if flat_table in existing:
+        _fold(duck_conn, flat_table, AGGREGATE_COLUMNS, flat_table, subtract_stored=False)
+
+
+def aggregate_source(duck_conn, table, flat_table="experiment_flat"):
+    """SQL table expression for the summary ``table``: the maintained table, or its query over ``flat_table``."""
+    exists = duck_conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]).fetchone()[0]
+    if exists:
+        return table
+    return f"({AGGREGATE_QUERIES[table].format(flat_table=flat_table)})"
+
+
+def drop_aggregate_tables(duck_conn):
+    for table in AGGREGATE_TABLES:
+        duck_conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def update_aggregates(duck_conn, source, columns, flat_table="experiment_flat"):
+    """Fold the flat rows of the table or view ``source`` into the summary tables.
+
+    Run before the batch is upserted into ``flat_table``: stored rows with the batch's Composite_IDs are
+    subtracted and the batch added, so the work follows the batch size rather than the table size.
+    """
+    ensure_aggregate_tables(duck_conn, flat_table)
+    _fold(duck_conn, source, columns, flat_table, subtract_stored=True)
+
+
+def subtract_experiments(duck_conn, experiments, flat_table="experiment_flat"):
+    """Take the stored rows of the experiments listed in the table ``experiments`` out of the summary tables.
+
+    Run before those rows are deleted from ``flat_table``.
+    """
+    ensure_aggregate_tables(duck_conn, flat_table)
+    stored = f"FROM {flat_table} WHERE Experiment_ID IN (SELECT Experiment_ID FROM {experiments})"
+    _add_sums(duck_conn, "agg_hyperparameter_metric", f"SELECT *, -1 AS sign {stored}")
+    _add_sums(duck_conn, "agg_metric_series", f"""
+        SELECT DISTINCT ON (Metric_ID) Experiment_ID, Metric_Name, Metric_Value, {_BUCKET} AS Bucket, -1 AS sign
+        {stored} AND Metric_ID IS NOT NULL
+    """)
+    for table in ("agg_trial", "agg_experiment"):
+        duck_conn.execute(f"DELETE FROM {table} WHERE Experiment_ID IN (SELECT Experiment_ID FROM {experiments})")
+
+
+def _add_sums(duck_conn, table, rows):
+    """Add the signed (Value_Sum, Value_Count) of ``rows`` to ``table``, dropping groups that reach zero."""
+    keys = ", ".join(name for name, _ in AGGREGATE_TABLES[table][0])
+    duck_conn.execute(f"""
+        INSERT INTO {table}
+        SELECT {keys}, sum(sign * Metric_Value), sum(sign) FROM ({rows})
+        WHERE {" AND ".join(f"{key} IS NOT NULL" for key in keys.split(", "))} AND Metric_Value IS NOT NULL
+        GROUP BY ALL
+        ON CONFLICT ({keys}) DO UPDATE SET
+            Value_Sum = Value_Sum + excluded.Value_Sum, Value_Count = Value_Count + excluded.Value_Count
+    """)
+    duck_conn.execute(f"DELETE FROM {table} WHERE Value_Count = 0")
+
+
+def _fold(duck_conn, source, columns, flat_table, subtract_stored):
+    select = ", ".join(name if name in columns else f"NULL AS {name}" for name in AGGREGATE_COLUMNS)
+    duck_conn.execute(f"CREATE OR REPLACE TEMP VIEW agg_batch AS SELECT {select} FROM {source}")
+    try:
+        flat_rows = "SELECT *, 1 AS sign FROM (SELECT DISTINCT ON (Composite_ID) * FROM agg_batch)"
+        # Metric values repeat on every flat row of their trial; count each Metric_ID once
+        metric_points = f"""
+            SELECT DISTINCT ON (Metric_ID) Experiment_ID, Metric_Name, Metric_Value, {_BUCKET} AS Bucket, 1 AS sign
+            FROM agg_batch WHERE Metric_ID IS NOT NULL
+        """
+        if subtract_stored:
+            flat_rows += f"""
+                UNION ALL BY NAME
+                SELECT {", ".join(AGGREGATE_COLUMNS)}, -1 AS sign FROM {flat_table}
+                WHERE Composite_ID IN (SELECT Composite_ID FROM agg_batch)
+            """
+            metric_points += f"""
+                UNION ALL
+                SELECT DISTINCT ON (Metric_ID) Experiment_ID, Metric_Name, Metric_Value, {_BUCKET}, -1
+                FROM {flat_table} WHERE Metric_ID IN (SELECT Metric_ID FROM agg_batch)
+            """
+        _add_sums(duck_conn, "agg_hyperparameter_metric", flat_rows)
+        _add_sums(duck_conn, "agg_metric_series", metric_points)
+
+        # Trial counts of the batch's experiments, and of the experiments its trials were filed under before
+        duck_conn.execute("""
+            CREATE OR REPLACE TEMP TABLE agg_touched AS
+            SELECT Experiment_ID FROM agg_batch WHERE Experiment_ID IS NOT NULL
+            UNION SELECT Experiment_ID FROM agg_trial WHERE Trial_ID IN (SELECT Trial_ID FROM agg_batch)
+        """)
+        duck_conn.execute("""
+            INSERT INTO agg_trial
+            SELECT DISTINCT ON (Trial_ID) Trial_ID, Experiment_ID FROM agg_batch
+            WHERE Trial_ID IS NOT NULL AND Experiment_ID IS NOT NULL
+            ON CONFLICT (Trial_ID) DO UPDATE SET Experiment_ID = excluded.Experiment_ID
+        """)
+        duck_conn.execute("""
+            INSERT INTO agg_experiment BY NAME
+            SELECT DISTINCT ON (Experiment_ID) Experiment_ID, Experiment_Name, Model_ID FROM agg_batch
+            WHERE Experiment_ID IS NOT NULL
+            ON CONFLICT (Experiment_ID) DO UPDATE SET
+                Experiment_Name = excluded.Experiment_Name, Model_ID = excluded.Model_ID
+        """)
+        duck_conn.execute("""
+            UPDATE agg_experiment SET Trial_Count = (
+                SELECT COUNT(*) FROM agg_trial WHERE agg_trial.Experiment_ID = agg_experiment.Experiment_ID
+            )
+            WHERE Experiment_ID IN (SELECT Experiment_ID FROM agg_touched)
+        """)
+        duck_conn.execute("DROP TABLE agg_touched")
+    finally:
+        duck_conn.execute("DROP VIEW IF EXISTS agg_batch")
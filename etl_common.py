@@ -0,0 +1,587 @@
+#SQL and bookkeeping shared by the full and hourly ETL flows
+
+import duckdb
+import pandas as pd
+
+from etl_aggregates import ensure_aggregate_tables, subtract_experiments, update_aggregates
+from etl_star_schema import load_star_from, load_star_schema, remove_star_experiments
+
+# Columns of the flattened experiment table, in load order
+FLAT_COLUMNS = """
+        e.Experiment_ID,
+        e.Name AS Experiment_Name,
+        e.Description AS Experiment_Description,
+        e.Status AS Experiment_Status,
+        e.StartTimeStamp,
+        e.EndTimeStamp,
+        u.First_Name || ' ' || u.Last_Name AS Author_Name,
+
+        d.DataSet_ID,
+        d.Name AS Dataset_Name,
+        d.Version AS Dataset_Version,
+        d.Size AS Dataset_Size,
+        d.Description AS Dataset_Description,
+
+        m.Model_ID,
+        m.Name AS Model_Name,
+        m.Type AS Model_Type,
+        m.Version AS Model_Version,
+        m.Hyperparameters AS Model_Hyperparameters,
+
+        t.Trial_ID,
+        t.Status AS Trial_Status,
+        t.StartTime AS Trial_Start,
+        t.EndTime AS Trial_End,
+        t.Seed AS Trial_Seed,
+
+        hp.Hyperparameter_ID,
+        hp.Type AS Hyperparameter_Type,
+        hp.Epochs,
+        hp.Value AS Hyperparameter_Value,
+
+        mt.Metric_ID,
+        mt.Name AS Metric_Name,
+        mt.Value AS Metric_Value,
+        mt.TimeStamp AS Metric_Timestamp
+"""
+
+EXPERIMENT_DIMENSION_JOINS = """
+    LEFT JOIN User u ON e.Author_ID = u.User_ID
+    LEFT JOIN Dataset d ON e.DataSet_ID = d.DataSet_ID
+    LEFT JOIN Model m ON e.Model_ID = m.Model_ID
+"""
+
+# Full extraction: every experiment exploded to one row per (trial, hyperparameter, metric)
+FLAT_QUERY = f"""
+    SELECT {FLAT_COLUMNS}
+    FROM Experiment e
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
+    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+"""
+
+# Watermarks stored after each load. On databases with the ChangeLog only its Change_Seq mark drives the
+# incremental extraction: the triggers log every insert, update and delete of the experiment tables, and an
+# AUTOINCREMENT sequence never hands out a number twice. The rowid marks (highest rowid loaded so far) bound
+# the sharded full extraction, and find new rows on databases not migrated yet, where a row inserted under
+# the rowid of a deleted one is missed; migrate the source and run the full ETL once to switch over.
+# Implicit rowids can be renumbered by VACUUM, so run the full ETL again after vacuuming the source.
+WATERMARK_TABLES = ["Experiment", "Trial", "Hyperparameter", "Metric", "ChangeLog"]
+
+# Tables FLAT_QUERY reads; the sharded extraction reads each one separately and joins them in DuckDB,
+# splitting the large child tables into rowid ranges
+SOURCE_TABLES = ["User", "Dataset", "Model", "Experiment", "Trial", "Hyperparameter", "Metric"]
+SHARDED_TABLES = ["Trial", "Hyperparameter", "Metric"]
+
+CHANGE_WINDOW = "Change_Seq > :ChangeLog_low AND Change_Seq <= :ChangeLog_high"
+
+
+def _logged_rowids(table):
+    """Rowids of ``table`` inserted or updated inside the ChangeLog window."""
+    return f"""(
+        SELECT Row_ID FROM ChangeLog
+        WHERE Table_Name = '{table}' AND Operation <> 'DELETE' AND {CHANGE_WINDOW}
+    )"""
+
+
+def _changed_rowids(table, rowid_window):
+    """Logged rowids of ``table``, plus those inside its rowid watermark window when ``rowid_window`` is set."""
+    if not rowid_window:
+        return _logged_rowids(table)
+    return f"""(
+        SELECT rowid FROM {table} WHERE rowid > :{table}_low AND rowid <= :{table}_high
+        UNION
+        SELECT Row_ID FROM {_logged_rowids(table)}
+    )"""
+
+
+def _delta_query(rowid_window):
+    """Incremental extraction: one branch per source table, each driven by that table's changed rowids, so the
+    work done is proportional to the changes rather than to the whole history.
+
+    New users, datasets and models arrive with the experiments that reference them; updates to them
+    re-extract those experiments. An experiment that lost rows to a DELETE is re-extracted whole, so its
+    stored rows can be replaced (see deleted_experiments).
+    """
+    return f"""
+    SELECT {FLAT_COLUMNS}
+    FROM Experiment e
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
+    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+    WHERE e.rowid IN {_changed_rowids("Experiment", rowid_window)}
+
+    UNION
+
+    SELECT {FLAT_COLUMNS}
+    FROM Trial t
+    JOIN Experiment e ON e.Experiment_ID = t.Experiment_ID
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+    WHERE t.rowid IN {_changed_rowids("Trial", rowid_window)}
+
+    UNION
+
+    SELECT {FLAT_COLUMNS}
+    FROM Hyperparameter hp
+    JOIN Trial t ON t.Trial_ID = hp.Trial_ID
+    JOIN Experiment e ON e.Experiment_ID = t.Experiment_ID
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+    WHERE hp.rowid IN {_changed_rowids("Hyperparameter", rowid_window)}
+
+    UNION
+
+    SELECT {FLAT_COLUMNS}
+    FROM Metric mt
+    JOIN Trial t ON t.Trial_ID = mt.Trial_ID
+    JOIN Experiment e ON e.Experiment_ID = t.Experiment_ID
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+    WHERE mt.rowid IN {_changed_rowids("Metric", rowid_window)}
+
+    UNION
+
+    SELECT {FLAT_COLUMNS}
+    FROM Experiment e
+    {EXPERIMENT_DIMENSION_JOINS}
+    LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
+    LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+    LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+    WHERE e.Author_ID IN (SELECT User_ID FROM User WHERE rowid IN {_logged_rowids("User")})
+       OR e.DataSet_ID IN (SELECT DataSet_ID FROM Dataset WHERE rowid IN {_logged_rowids("Dataset")})
+       OR e.Model_ID IN (SELECT Model_ID FROM Model WHERE rowid IN {_logged_rowids("Model")})
+       OR e.Experiment_ID IN ({DELETED_EXPERIMENTS_QUERY})
+"""
+
+
+# Experiments that lost rows to a DELETE inside the ChangeLog window
+DELETED_EXPERIMENTS_QUERY = f"""
+    SELECT Experiment_ID FROM ChangeLog
+    WHERE Operation = 'DELETE' AND Experiment_ID IS NOT NULL AND {CHANGE_WINDOW}
+"""
+
+DELTA_QUERY = _delta_query(rowid_window=False)
+
+# Stands in for ChangeLog on databases that have not been migrated yet (no changes are logged there)
+EMPTY_CHANGE_LOG = ("WITH ChangeLog (Change_Seq, Table_Name, Row_ID, Operation, Experiment_ID) AS "
+                    "(SELECT NULL, NULL, NULL, NULL, NULL WHERE 0)")
+ROWID_DELTA_QUERY = EMPTY_CHANGE_LOG + _delta_query(rowid_window=True)
+
+
+# What the flows load: the exploded experiment_flat table, the star schema (etl_star_schema), or both
+ETL_TARGETS = ("flat", "star", "both")
+
+# Typed schema of the flat DuckDB table; Composite_ID is the upsert key
+FLAT_TABLE = "experiment_flat"
+FLAT_TABLE_COLUMNS = [
+    ("Experiment_ID", "VARCHAR"), ("Experiment_Name", "VARCHAR"), ("Experiment_Description", "VARCHAR"),
+    ("Experiment_Status", "VARCHAR"), ("StartTimeStamp", "VARCHAR"), ("EndTimeStamp", "VARCHAR"),
+    ("Author_Name", "VARCHAR"),
+    ("DataSet_ID", "VARCHAR"), ("Dataset_Name", "VARCHAR"), ("Dataset_Version", "BIGINT"), ("Dataset_Size", "BIGINT"),
+    ("Dataset_Description", "VARCHAR"),
+    ("Model_ID", "VARCHAR"), ("Model_Name", "VARCHAR"), ("Model_Type", "VARCHAR"), ("Model_Version", "BIGINT"),
+    ("Model_Hyperparameters", "VARCHAR"),
+    ("Trial_ID", "VARCHAR"), ("Trial_Status", "VARCHAR"), ("Trial_Start", "VARCHAR"), ("Trial_End", "VARCHAR"),
+    ("Trial_Seed", "DOUBLE"),
+    ("Hyperparameter_ID", "VARCHAR"), ("Hyperparameter_Type", "VARCHAR"), ("Epochs", "DOUBLE"),
+    ("Hyperparameter_Value", "VARCHAR"),
+    ("Metric_ID", "VARCHAR"), ("Metric_Name", "VARCHAR"), ("Metric_Value", "DOUBLE"), ("Metric_Timestamp", "VARCHAR"),
+    ("Composite_ID", "BLOB PRIMARY KEY"),
+]
+
+# Keyless table that streamed chunks are appended to before the final keyed load
+STAGING_TABLE = "experiment_flat_staging"
+
+# Natural key of a flat row; missing trial/metric/hyperparameter IDs are spelled out so the key never collapses
+KEY_COLUMNS = ["Experiment_ID", "Trial_ID", "Model_ID", "DataSet_ID", "Metric_ID", "Hyperparameter_ID"]
+RAW_COMPOSITE_KEY = """concat_ws('_', Experiment_ID, coalesce(Trial_ID, 'None'), Model_ID, DataSet_ID,
+                                 coalesce(Metric_ID, 'NULL'), coalesce(Hyperparameter_ID, 'NULL'))"""
+# Stored key: the 16-byte MD5 of the raw key instead of the ~220 character string itself
+COMPOSITE_KEY = f"unhex(md5({RAW_COMPOSITE_KEY}))"
+
+
+class CompositeKeyCollision(Exception):
+    """Two different natural keys hashed to the same Composite_ID."""
+
+
+def source_high_marks(sqlite_conn):
+    """Current highest rowid of every watermarked source table (0 for empty or missing tables).
+
+    Call inside the same read transaction as the extraction so the marks match the extracted snapshot.
+    """
+    existing = {row[0] for row in sqlite_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    marks = {}
+    for table in WATERMARK_TABLES:
+        if table == "ChangeLog" and "sqlite_sequence" in existing:
+            # The AUTOINCREMENT counter keeps rising after prune_change_log empties the table
+            marks[table] = sqlite_conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()[0]
+        elif table in existing:
+            marks[table] = sqlite_conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        else:
+            marks[table] = 0
+    return marks
+
+
+def ensure_watermark_table(duck_conn):
+    duck_conn.execute("""
+        CREATE TABLE IF NOT EXISTS etl_watermark (
+            Source_Table VARCHAR PRIMARY KEY,
+            Last_RowID BIGINT NOT NULL,
+            Updated_At TIMESTAMP NOT NULL
+        )
+    """)
+
+
+def read_watermarks(duck_conn):
+    """Last loaded rowid per source table (0 for tables never loaded)."""
+    ensure_watermark_table(duck_conn)
+    stored = dict(duck_conn.execute("SELECT Source_Table, Last_RowID FROM etl_watermark").fetchall())
+    return {table: stored.get(table, 0) for table in WATERMARK_TABLES}
+
+
+def write_watermarks(duck_conn, marks):
+    """Advance the watermarks; call inside the load transaction so they commit together with the data."""
+    ensure_watermark_table(duck_conn)
+    for table, last_rowid in marks.items():
+        duck_conn.execute("""
+            INSERT INTO etl_watermark VALUES (?, ?, now())
+            ON CONFLICT (Source_Table) DO UPDATE SET Last_RowID = excluded.Last_RowID, Updated_At = excluded.Updated_At
+        """, [table, last_rowid])
+
+
+def prune_change_log(sqlite_conn, marks):
+    """Delete the ChangeLog rows at or below the ChangeLog watermark; call once the load that used them committed.
+
+    Returns the number of rows deleted.
+    """
+    has_change_log = sqlite_conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ChangeLog'").fetchone()[0]
+    if not has_change_log:
+        return 0
+    deleted = sqlite_conn.execute("DELETE FROM ChangeLog WHERE Change_Seq <= ?", (marks.get("ChangeLog", 0),)).rowcount
+    sqlite_conn.commit()
+    return deleted
+
+
+def bump_load_version(duck_conn, rows):
+    """Record a load of ``rows`` rows under the next load version; call inside the load transaction.
+
+    Readers cache query results under the current version, so bump only when data actually landed.
+    """
+    duck_conn.execute("""
+        CREATE TABLE IF NOT EXISTS etl_load (
+            Load_Version BIGINT PRIMARY KEY,
+            Loaded_At TIMESTAMP NOT NULL,
+            Loaded_Rows BIGINT NOT NULL
+        )
+    """)
+    duck_conn.execute("INSERT INTO etl_load SELECT COALESCE(MAX(Load_Version), 0) + 1, now(), ? FROM etl_load", [rows])
+
+
+def read_load_version(duck_conn):
+    """Version of the last load that landed data (0 before the first one)."""
+    exists = duck_conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'etl_load'").fetchone()[0]
+    if not exists:
+        return 0
+    return duck_conn.execute("SELECT COALESCE(MAX(Load_Version), 0) FROM etl_load").fetchone()[0]
+
+
+def delta_params(low_marks, high_marks):
+    """Named parameters for DELTA_QUERY from the stored (low) and current (high) watermarks."""
+    params = {}
+    for table in WATERMARK_TABLES:
+        params[f"{table}_low"] = low_marks.get(table, 0)
+        params[f"{table}_high"] = high_marks.get(table, 0)
+    return params
+
+
+def _snapshot_query(sqlite_conn, low_marks):
+    """Read the high marks and pick the extraction query; call inside the extraction's read transaction.
+
+    ``low_marks`` of None means a full extraction. Returns (query, params, high marks).
+    """
+    high_marks = source_high_marks(sqlite_conn)
+    if low_marks is None:
+        return FLAT_QUERY, None, high_marks
+    has_change_log = sqlite_conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ChangeLog'").fetchone()[0]
+    query = DELTA_QUERY if has_change_log else ROWID_DELTA_QUERY
+    return query, delta_params(low_marks, high_marks), high_marks
+
+
+def extract_all(sqlite_conn):
+    """Extract every flat row; returns (DataFrame, high marks of the extracted snapshot)."""
+    sqlite_conn.execute("BEGIN")
+    try:
+        query, params, high_marks = _snapshot_query(sqlite_conn, None)
+        df = pd.read_sql_query(query, sqlite_conn, params=params)
+    finally:
+        sqlite_conn.rollback()
+    return df, high_marks
+
+
+def extract_changes(sqlite_conn, low_marks):
+    """Extract the flat rows touched since ``low_marks``; returns (DataFrame, new high marks).
+
+    The marks and the rows are read in one transaction, so a row committed mid-extraction is either in
+    this batch or above the returned marks, never lost between them.
+    """
+    sqlite_conn.execute("BEGIN")
+    try:
+        query, params, high_marks = _snapshot_query(sqlite_conn, low_marks)
+        df = pd.read_sql_query(query, sqlite_conn, params=params)
+    finally:
+        sqlite_conn.rollback()
+    return df, high_marks
+
+
+def deleted_experiments(sqlite_conn, low_marks, high_marks):
+    """IDs of the experiments that lost rows to DELETEs between the ChangeLog marks.
+
+    extract_changes re-extracts these experiments whole, so load_batch can replace their stored rows with the
+    batch (an experiment deleted outright simply has no rows left).
+    """
+    has_change_log = sqlite_conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'ChangeLog'").fetchone()[0]
+    if not has_change_log:
+        return []
+    rows = sqlite_conn.execute(f"SELECT DISTINCT Experiment_ID FROM ({DELETED_EXPERIMENTS_QUERY})",
+                               delta_params(low_marks, high_marks)).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def shard_ranges(high_mark, shards):
+    """Split the rowids (0, high_mark] into at most ``shards`` contiguous (low, high] ranges."""
+    step = max(1, -(-high_mark // max(1, shards)))
+    return [(low, min(low + step, high_mark)) for low in range(0, high_mark, step)] or [(0, 0)]
+
+
+def extraction_shards(high_marks, shards):
+    """(table, low, high) reads covering the snapshot at ``high_marks``, the large child tables split in ``shards``.
+
+    Each read is bounded by the marks, so rows inserted while the shards run are left to the next hourly load.
+    Rows updated meanwhile are above the ChangeLog mark, so the hourly load re-extracts those too.
+    """
+    reads = []
+    for table in SOURCE_TABLES:
+        if table in SHARDED_TABLES:
+            reads += [(table, low, high) for low, high in shard_ranges(high_marks.get(table, 0), shards)]
+        elif table in high_marks:
+            reads.append((table, 0, high_marks[table]))
+        else:
+            reads.append((table, None, None))
+    return reads
+
+
+def extract_table(sqlite_conn, table, low=None, high=None):
+    """Read ``table``, or only its rowids in (low, high], as a DataFrame."""
+    if low is None:
+        return pd.read_sql_query(f"SELECT * FROM {table}", sqlite_conn)
+    return pd.read_sql_query(f"SELECT * FROM {table} WHERE rowid > ? AND rowid <= ?", sqlite_conn,
+                             params=(low, high))
+
+
+def join_in_duckdb(frames):
+    """Run the flattening join in DuckDB over ``{table: [DataFrame shards]}`` read from the source tables."""
+    conn = duckdb.connect()
+    try:
+        for table in SOURCE_TABLES:
+            shards = frames[table]
+            conn.register(table, shards[0] if len(shards) == 1 else pd.concat(shards, ignore_index=True))
+        return conn.execute(FLAT_QUERY).fetchdf()
+    finally:
+        conn.close()
+
+
+def stream_extraction(sqlite_conn, load_chunk, chunk_size, low_marks=None):
+    """Extract in chunks of ``chunk_size`` rows, handing each keyed chunk to ``load_chunk`` as it is read.
+
+    Memory stays bounded by the chunk size instead of the extracted history. ``low_marks`` of None streams
+    everything, otherwise only the rows changed since those watermarks. Returns (rows, high marks).
+    """
+    rows = 0
+    sqlite_conn.execute("BEGIN")
+    try:
+        query, params, high_marks = _snapshot_query(sqlite_conn, low_marks)
+        for chunk in pd.read_sql_query(query, sqlite_conn, params=params, chunksize=chunk_size):
+            load_chunk(add_composite_key(chunk))
+            rows += len(chunk)
+    finally:
+        sqlite_conn.rollback()
+    return rows, high_marks
+
+
+def add_composite_key(df):
+    """Add the hashed Composite_ID column to an extracted batch, checking the batch for hash collisions."""
+    conn = duckdb.connect()
+    try:
+        conn.register("batch", df)
+        raw_count, key_count = conn.execute(
+            f"SELECT COUNT(DISTINCT {RAW_COMPOSITE_KEY}), COUNT(DISTINCT {COMPOSITE_KEY}) FROM batch").fetchone()
+        if raw_count != key_count:
+            raise CompositeKeyCollision(f"{raw_count} distinct keys hashed to only {key_count} Composite_IDs")
+        # DuckDB keeps the frame's row order, so the keys line up with df
+        keys = conn.execute(f"SELECT {COMPOSITE_KEY} AS Composite_ID FROM batch").fetchdf()["Composite_ID"]
+    finally:
+        conn.close()
+    df["Composite_ID"] = [bytes(key) for key in keys]
+    return df
+
+
+def _flat_table_ddl(table_name, keyed=True):
+    columns = ",\n            ".join(f"{name} {column_type if keyed else column_type.replace(' PRIMARY KEY', '')}"
+                                    for name, column_type in FLAT_TABLE_COLUMNS)
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n            {columns}\n        )"
+
+
+def ensure_flat_table(duck_conn):
+    """Create the flat table with its Composite_ID primary key, rebuilding a keyless table from older loads."""
+    exists = duck_conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [FLAT_TABLE]).fetchone()[0]
+    if not exists:
+        duck_conn.execute(_flat_table_ddl(FLAT_TABLE))
+        ensure_aggregate_tables(duck_conn, FLAT_TABLE)
+        return
+
+    has_key = duck_conn.execute("""
+        SELECT COUNT(*) FROM duckdb_constraints()
+        WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'
+    """, [FLAT_TABLE]).fetchone()[0]
+    key_type = duck_conn.execute("""
+        SELECT data_type FROM information_schema.columns WHERE table_name = ? AND column_name = 'Composite_ID'
+    """, [FLAT_TABLE]).fetchone()[0]
+    if not has_key or key_type != "BLOB":
+        # One-off migration: keep one row per key, as the old rebuild-style deduplication did, and hash
+        # string keys from older loads (they are the raw key, so the hash matches newly extracted rows)
+        key = "unhex(md5(Composite_ID))" if key_type == "VARCHAR" else "Composite_ID"
+        duck_conn.execute(_flat_table_ddl(f"{FLAT_TABLE}_keyed"))
+        duck_conn.execute(f"""
+            INSERT INTO {FLAT_TABLE}_keyed BY NAME
+            SELECT DISTINCT ON (Composite_ID) * FROM (
+                SELECT * REPLACE ({key} AS Composite_ID) FROM {FLAT_TABLE}
+            ) ORDER BY Composite_ID, Trial_ID
+        """)
+        duck_conn.execute(f"DROP TABLE {FLAT_TABLE}")
+        duck_conn.execute(f"ALTER TABLE {FLAT_TABLE}_keyed RENAME TO {FLAT_TABLE}")
+    ensure_aggregate_tables(duck_conn, FLAT_TABLE)
+
+
+def upsert_flat_from(duck_conn, source, columns):
+    """Upsert the rows of the table or view ``source`` (with ``columns``) into the flat table.
+
+    Rows whose Composite_ID is already present are replaced. Only the batch and the primary key index are
+    touched, so the cost follows the batch size rather than the table size. The summary tables
+    (etl_aggregates) are updated from the same batch.
+    """
+    ensure_flat_table(duck_conn)
+    if set(KEY_COLUMNS).issubset(columns):
+        # A stored row under the same Composite_ID must have the same natural key
+        mismatched = " OR ".join(f"f.{column} IS DISTINCT FROM b.{column}" for column in KEY_COLUMNS)
+        collisions = duck_conn.execute(f"""
+            SELECT COUNT(*) FROM {source} b JOIN {FLAT_TABLE} f ON f.Composite_ID = b.Composite_ID
+            WHERE {mismatched}
+        """).fetchone()[0]
+        if collisions:
+            raise CompositeKeyCollision(f"{collisions} rows collide with stored rows under the same Composite_ID")
+
+    # Before the upsert, while the rows the batch replaces can still be subtracted
+    update_aggregates(duck_conn, source, columns, FLAT_TABLE)
+
+    updates = ", ".join(f"{name} = excluded.{name}" for name, _ in FLAT_TABLE_COLUMNS
+                        if name != "Composite_ID" and name in columns)
+    conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    # A batch may carry the same key twice (e.g. a trial that was both inserted and updated); keep one
+    duck_conn.execute(f"""
+        INSERT INTO {FLAT_TABLE} BY NAME
+        SELECT DISTINCT ON (Composite_ID) * FROM {source}
+        ON CONFLICT (Composite_ID) {conflict}
+    """)
+
+
+def upsert_flat_rows(duck_conn, df):
+    """Upsert a keyed DataFrame into the flat table (see upsert_flat_from)."""
+    ensure_flat_table(duck_conn)
+    if df.empty:
+        return
+    duck_conn.register("flat_batch", df)
+    try:
+        upsert_flat_from(duck_conn, "flat_batch", list(df.columns))
+    finally:
+        duck_conn.unregister("flat_batch")
+
+
+def remove_experiments(duck_conn, experiment_ids, target="flat"):
+    """Delete the stored rows of ``experiment_ids`` from the targets, and their share of the summary tables.
+
+    Run inside the load transaction, before the batch that holds every remaining row of those experiments.
+    """
+    if not experiment_ids:
+        return
+    duck_conn.execute("CREATE OR REPLACE TEMP TABLE removed_experiments AS SELECT unnest(?::VARCHAR[]) AS Experiment_ID",
+                      [list(experiment_ids)])
+    try:
+        if target in ("flat", "both"):
+            ensure_flat_table(duck_conn)
+            subtract_experiments(duck_conn, "removed_experiments", FLAT_TABLE)
+            duck_conn.execute(
+                f"DELETE FROM {FLAT_TABLE} WHERE Experiment_ID IN (SELECT Experiment_ID FROM removed_experiments)")
+        if target in ("star", "both"):
+            remove_star_experiments(duck_conn, "removed_experiments")
+    finally:
+        duck_conn.execute("DROP TABLE IF EXISTS removed_experiments")
+
+
+def _load_from(duck_conn, source, columns, target, rebuild_wide):
+    if target in ("flat", "both"):
+        upsert_flat_from(duck_conn, source, columns)
+    if target in ("star", "both"):
+        load_star_from(duck_conn, source, rebuild_wide)
+
+
+def load_batch(duck_conn, df, target="flat", rebuild_wide=True, replaced_experiments=()):
+    """Load a keyed batch into the flat table, the star schema, or both (see ETL_TARGETS).
+
+    The stored rows of ``replaced_experiments`` (see deleted_experiments) are removed first.
+    """
+    remove_experiments(duck_conn, replaced_experiments, target)
+    if df.empty:
+        ensure_flat_table(duck_conn)
+        if target in ("star", "both"):
+            load_star_schema(duck_conn, df, rebuild_wide)
+        return
+    duck_conn.register("etl_batch", df)
+    try:
+        _load_from(duck_conn, "etl_batch", list(df.columns), target, rebuild_wide)
+    finally:
+        duck_conn.unregister("etl_batch")
+
+
+def stage_chunk(duck_conn, df):
+    """Append a keyed chunk to the keyless staging table (autocommitted, so nothing accumulates in memory)."""
+    duck_conn.execute(_flat_table_ddl(STAGING_TABLE, keyed=False))
+    if df.empty:
+        return
+    duck_conn.register("staged_chunk", df)
+    try:
+        duck_conn.execute(f"INSERT INTO {STAGING_TABLE} BY NAME SELECT * FROM staged_chunk")
+    finally:
+        duck_conn.unregister("staged_chunk")
+
+
+def load_staged(duck_conn, target="flat"):
+    """Load the staging table into the targets and drop it; run inside the load transaction.
+
+    Chunks were only checked for hash collisions one at a time, so the whole staged set is checked here.
+    """
+    raw_count, key_count = duck_conn.execute(
+        f"SELECT COUNT(DISTINCT {RAW_COMPOSITE_KEY}), COUNT(DISTINCT Composite_ID) FROM {STAGING_TABLE}").fetchone()
+    if raw_count != key_count:
+        raise CompositeKeyCollision(f"{raw_count} distinct keys hashed to only {key_count} Composite_IDs")
+    _load_from(duck_conn, STAGING_TABLE, [name for name, _ in FLAT_TABLE_COLUMNS], target, rebuild_wide=True)
+    duck_conn.execute(f"DROP TABLE {STAGING_TABLE}")
@@ -0,0 +1,119 @@
+#Hive-partitioned Parquet copy of experiment_flat for readers that should not open the DuckDB file
+#layout: <PARQUET_DIR>/experiment_date=<date>/Experiment_ID=<id>/data_<uuid>.parquet
+
+import glob
+import os
+import shutil
+import uuid
+
+from etl_common import read_load_version
+
+PARQUET_DIR = "mled_lake"
+PARQUET_COMPRESSION = "zstd"
+ROW_GROUP_SIZE = 100000
+PARTITION_COLUMNS = ("experiment_date", "Experiment_ID")
+# Load version of the DuckDB data the lake was last written from (see etl_common.bump_load_version)
+LOAD_VERSION_FILE = "_load_version"
+
+
+def parquet_source(directory=PARQUET_DIR):
+    """SQL table expression reading the lake; filters on the partition columns skip whole directories."""
+    return f"read_parquet('{directory}/**/*.parquet', hive_partitioning = true, union_by_name = true)"
+
+
+def read_lake_version(directory=PARQUET_DIR):
+    """Load version the lake was exported at, or None for a lake written before versions were recorded."""
+    try:
+        with open(os.path.join(directory, LOAD_VERSION_FILE)) as version_file:
+            return int(version_file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_lake_version(directory, version):
+    # Written last and renamed into place, so a reader never sees the new version before the new files
+    path = os.path.join(directory, LOAD_VERSION_FILE)
+    with open(path + ".tmp", "w") as version_file:
+        version_file.write(str(version))
+    os.replace(path + ".tmp", path)
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _copy_to(duck_conn, target, where):
+    duck_conn.execute(f"""
+        COPY (
+            SELECT *, CAST(TRY_CAST(StartTimeStamp AS TIMESTAMP) AS DATE) AS experiment_date
+            FROM experiment_flat {where}
+        ) TO '{target}' (
+            FORMAT parquet, PARTITION_BY ({", ".join(PARTITION_COLUMNS)}), COMPRESSION {PARQUET_COMPRESSION},
+            ROW_GROUP_SIZE {ROW_GROUP_SIZE}, FILENAME_PATTERN 'data_{{uuid}}'
+        )
+    """)
+
+
+def _swap_in(staging, directory):
+    """Replace ``directory`` with ``staging`` by two renames, so readers see either the old or the new lake."""
+    aside = f"{directory}.old-{uuid.uuid4().hex}"
+    if os.path.isdir(directory):
+        os.replace(directory, aside)
+    os.replace(staging, directory)
+    shutil.rmtree(aside, ignore_errors=True)
+
+
+def export_experiments(duck_conn, directory=PARQUET_DIR, experiment_ids=None):
+    """Rewrite the lake partitions of ``experiment_ids`` from experiment_flat (the whole lake when None).
+
+    Files are written to a staging directory next to the lake first, so a failed export leaves the lake as it
+    was. A full export then swaps the staged lake in; an incremental one replaces the experiments' partition
+    directories by renames. Returns the number of experiments written. Call after the load has committed, so the files never hold rows the DuckDB table does not.
+
+    Rewriting some experiments only brings the lake up to date when it already held every load before the
+    last one, so a lake without a version (missing, or never fully exported) or further behind is exported
+    in full instead.
+    """
+    version = read_load_version(duck_conn)
+    lake_version = read_lake_version(directory)
+    if lake_version is None or lake_version < version - 1:
+        experiment_ids = None
+    if experiment_ids is None:
+        where = ""
+    else:
+        experiment_ids = sorted({str(experiment_id) for experiment_id in experiment_ids if experiment_id is not None})
+        if not experiment_ids:
+            return 0
+        where = f"WHERE Experiment_ID IN ({', '.join(_quote(experiment_id) for experiment_id in experiment_ids)})"
+
+    staging = f"{os.path.normpath(directory)}.staging-{uuid.uuid4().hex}"
+    os.makedirs(staging)
+    try:
+        _copy_to(duck_conn, staging, where)
+        if experiment_ids is None:
+            _write_lake_version(staging, version)
+            _swap_in(staging, directory)
+            return duck_conn.execute("SELECT COUNT(DISTINCT Experiment_ID) FROM experiment_flat").fetchone()[0]
+
+        # An experiment's date can change, so its old partitions are collected under every date. Each one is
+        # renamed aside before the experiment's new partitions are renamed in: a reader can briefly miss the
+        # experiment, but never sees its old and new rows together
+        replaced = os.path.join(staging, "_replaced")
+        staged = {}
+        for partition in glob.glob(os.path.join(staging, "*", "*")):
+            staged.setdefault(os.path.basename(partition), []).append(partition)
+        names = set(staged) | {f"Experiment_ID={experiment_id}" for experiment_id in experiment_ids}
+        for name in sorted(names):
+            for number, partition in enumerate(glob.glob(os.path.join(directory, "*", glob.escape(name)))):
+                os.makedirs(replaced, exist_ok=True)
+                os.replace(partition, os.path.join(replaced, f"{name}-{number}"))
+                if not os.listdir(os.path.dirname(partition)):
+                    os.rmdir(os.path.dirname(partition))
+            for partition in staged.get(name, []):
+                parent = os.path.join(directory, os.path.basename(os.path.dirname(partition)))
+                os.makedirs(parent, exist_ok=True)
+                os.replace(partition, os.path.join(parent, name))
+        _write_lake_version(directory, version)
+        return len(experiment_ids)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
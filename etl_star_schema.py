@@ -0,0 +1,164 @@
+#star-schema ETL target: one row per entity instead of one per (trial, hyperparameter, metric) combination
+#the dimension and fact tables are upserted from each extracted batch; trial_wide is refreshed from them
+
+# table: (key column, [(column, type)]); the extracted flat columns keep their names
+STAR_TABLES = {
+    "dim_model": ("Model_ID", [
+        ("Model_ID", "VARCHAR"), ("Model_Name", "VARCHAR"), ("Model_Type", "VARCHAR"), ("Model_Version", "BIGINT"),
+        ("Model_Hyperparameters", "VARCHAR"),
+    ]),
+    "dim_dataset": ("DataSet_ID", [
+        ("DataSet_ID", "VARCHAR"), ("Dataset_Name", "VARCHAR"), ("Dataset_Version", "BIGINT"), ("Dataset_Size", "BIGINT"),
+        ("Dataset_Description", "VARCHAR"),
+    ]),
+    "dim_experiment": ("Experiment_ID", [
+        ("Experiment_ID", "VARCHAR"), ("Experiment_Name", "VARCHAR"), ("Experiment_Description", "VARCHAR"),
+        ("Experiment_Status", "VARCHAR"), ("StartTimeStamp", "VARCHAR"), ("EndTimeStamp", "VARCHAR"),
+        ("Author_Name", "VARCHAR"), ("Model_ID", "VARCHAR"), ("DataSet_ID", "VARCHAR"),
+    ]),
+    "dim_trial": ("Trial_ID", [
+        ("Trial_ID", "VARCHAR"), ("Experiment_ID", "VARCHAR"), ("Trial_Status", "VARCHAR"), ("Trial_Start", "VARCHAR"),
+        ("Trial_End", "VARCHAR"), ("Trial_Seed", "DOUBLE"),
+    ]),
+    "fact_hyperparameter": ("Hyperparameter_ID", [
+        ("Hyperparameter_ID", "VARCHAR"), ("Trial_ID", "VARCHAR"), ("Experiment_ID", "VARCHAR"),
+        ("Hyperparameter_Type", "VARCHAR"), ("Epochs", "DOUBLE"), ("Hyperparameter_Value", "VARCHAR"),
+    ]),
+    "fact_metric": ("Metric_ID", [
+        ("Metric_ID", "VARCHAR"), ("Trial_ID", "VARCHAR"), ("Experiment_ID", "VARCHAR"), ("Metric_Name", "VARCHAR"),
+        ("Metric_Value", "DOUBLE"), ("Metric_Timestamp", "VARCHAR"),
+    ]),
+}
+
+WIDE_TABLE = "trial_wide"
+
+
+def ensure_star_tables(duck_conn):
+    for table, (key, columns) in STAR_TABLES.items():
+        definitions = ", ".join(f"{name} {column_type}{' PRIMARY KEY' if name == key else ''}" for name, column_type in columns)
+        duck_conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definitions})")
+
+
+def drop_star_tables(duck_conn):
+    for table in list(STAR_TABLES) + [WIDE_TABLE]:
+        duck_conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def load_star_from(duck_conn, source, rebuild_wide=True):
+    """Upsert the entities in the flat table or view ``source`` into the star tables, then refresh trial_wide.
+
+    Each entity is deduplicated from the batch by its own ID, so a trial with 3 hyperparameters and 4 metrics
+    contributes 1 dim_trial row, 3 fact_hyperparameter rows and 4 fact_metric rows instead of 12 flat rows.
+    """
+    ensure_star_tables(duck_conn)
+    for table, (key, columns) in STAR_TABLES.items():
+        names = [name for name, _ in columns]
+        updates = ", ".join(f"{name} = excluded.{name}" for name in names if name != key)
+        duck_conn.execute(f"""
+            INSERT INTO {table} ({", ".join(names)})
+            SELECT DISTINCT ON ({key}) {", ".join(names)} FROM {source} WHERE {key} IS NOT NULL
+            ON CONFLICT ({key}) DO UPDATE SET {updates}
+        """)
+    if rebuild_wide:
+        rebuild_trial_wide(duck_conn, source)
+
+
+def remove_star_experiments(duck_conn, experiments):
+    """Delete the star rows of the experiments listed in the table ``experiments``."""
+    ensure_star_tables(duck_conn)
+    tables = [table for table, (_, columns) in STAR_TABLES.items() if "Experiment_ID" in dict(columns)]
+    if _table_exists(duck_conn, WIDE_TABLE):
+        tables.append(WIDE_TABLE)
+    for table in tables:
+        duck_conn.execute(f"DELETE FROM {table} WHERE Experiment_ID IN (SELECT Experiment_ID FROM {experiments})")
+
+
+def load_star_schema(duck_conn, df, rebuild_wide=True):
+    """Upsert an extracted flat DataFrame into the star tables (see load_star_from)."""
+    ensure_star_tables(duck_conn)
+    if df.empty:
+        if rebuild_wide and not _table_exists(duck_conn, WIDE_TABLE):
+            rebuild_trial_wide(duck_conn)
+        return
+    duck_conn.register("star_batch", df)
+    try:
+        load_star_from(duck_conn, "star_batch", rebuild_wide)
+    finally:
+        duck_conn.unregister("star_batch")
+
+
+def _table_exists(duck_conn, table):
+    return duck_conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]).fetchone()[0] > 0
+
+
+def _pivot(duck_conn, table, name_column, value_sql, prefix, where=""):
+    """PIVOT a fact table to one row per trial and one column per name, or None when no row matches ``where``."""
+    if not duck_conn.execute(f"SELECT COUNT(*) FROM {table} {where}").fetchone()[0]:
+        return None
+    return f"""(
+        PIVOT (SELECT Trial_ID, '{prefix}' || {name_column} AS name, {value_sql} AS value FROM {table} {where} GROUP BY ALL)
+        ON name USING first(value) GROUP BY Trial_ID
+    )"""
+
+
+def _trial_wide_query(duck_conn, where=""):
+    """SELECT of the trial_wide rows of the dim_trial rows matching ``where`` (every trial by default)."""
+    # Hyperparameter values are stored as text (they mix numbers and strings); metrics keep their last value
+    hyperparameters = _pivot(duck_conn, "fact_hyperparameter", "Hyperparameter_Type",
+                             "any_value(Hyperparameter_Value)", "hp_", where)
+    metrics = _pivot(duck_conn, "fact_metric", "Metric_Name", "arg_max(Metric_Value, Metric_Timestamp)", "metric_",
+                     where)
+
+    joins = ""
+    if hyperparameters:
+        joins += f" LEFT JOIN {hyperparameters} hp USING (Trial_ID)"
+    if metrics:
+        joins += f" LEFT JOIN {metrics} mt USING (Trial_ID)"
+    return f"""
+        SELECT t.*, e.Experiment_Name, e.Model_ID, e.DataSet_ID
+        {", hp.* EXCLUDE (Trial_ID)" if hyperparameters else ""}
+        {", mt.* EXCLUDE (Trial_ID)" if metrics else ""}
+        FROM (SELECT * FROM dim_trial {where}) t
+        LEFT JOIN dim_experiment e USING (Experiment_ID)
+        {joins}
+    """
+
+
+def rebuild_trial_wide(duck_conn, source=None):
+    """Refresh trial_wide: one row per trial, an ``hp_<type>`` column per hyperparameter and a ``metric_<name>``
+    column per metric (its latest value).
+
+    With the batch ``source`` (a flat table or view) only the rows of its trials, and of every trial of its
+    experiments, are replaced, so an hourly load does not re-pivot all history. The table is rebuilt in full
+    (linear in the number of trials) when it does not exist yet, when no source is given, or when the batch
+    brings a hyperparameter type or metric name that has no column.
+    """
+    if source is None or not _table_exists(duck_conn, WIDE_TABLE):
+        duck_conn.execute(f"CREATE OR REPLACE TABLE {WIDE_TABLE} AS {_trial_wide_query(duck_conn)}")
+        return
+
+    duck_conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE wide_trials AS
+        SELECT Trial_ID FROM {source} WHERE Trial_ID IS NOT NULL
+        UNION SELECT Trial_ID FROM dim_trial WHERE Experiment_ID IN (SELECT Experiment_ID FROM {source})
+    """)
+    try:
+        where = "WHERE Trial_ID IN (SELECT Trial_ID FROM wide_trials)"
+        new_columns = duck_conn.execute(f"""
+            SELECT name FROM (
+                SELECT 'hp_' || Hyperparameter_Type AS name FROM fact_hyperparameter {where}
+                UNION SELECT 'metric_' || Metric_Name FROM fact_metric {where}
+            )
+            WHERE name IS NOT NULL AND lower(name) NOT IN (
+                SELECT lower(column_name) FROM information_schema.columns WHERE table_name = '{WIDE_TABLE}'
+            )
+            LIMIT 1
+        """).fetchall()
+        if new_columns:
+            duck_conn.execute(f"CREATE OR REPLACE TABLE {WIDE_TABLE} AS {_trial_wide_query(duck_conn)}")
+            return
+        duck_conn.execute(f"DELETE FROM {WIDE_TABLE} {where}")
+        duck_conn.execute(f"INSERT INTO {WIDE_TABLE} BY NAME {_trial_wide_query(duck_conn, where)}")
+    finally:
+        duck_conn.execute("DROP TABLE IF EXISTS wide_trials")
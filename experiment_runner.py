@@ -0,0 +1,363 @@
+#shared engine for running hyperparameter sweeps and logging them to the MLED database
+#estimators, datasets and experiments are plain registry entries, so a new sweep is a few lines of config
+#run with: python experiment_runner.py <experiment> [--backend loky] [--n-jobs 4]
+
+import argparse
+import itertools
+import pickle
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+
+from joblib import Parallel, delayed
+from sklearn.datasets import load_iris, fetch_openml
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+
+from dataset_staging import stage_dataset
+from result_writer import TrialResultWriter, enqueue_trial
+from trial_cache import CACHE_DIR, TrialCache, trial_key
+
+SQLITE_FILE_PATH = "MLED_transactions.db"
+SEED = 42
+
+SCHEDULERS = ("grid", "halving")
+
+# Backend name -> joblib backend (None runs the trials in the calling thread)
+BACKENDS = {
+    "loky": "loky",
+    "multiprocessing": "multiprocessing",
+    "threads": "threading",
+    "sequential": None,
+}
+
+
+# Dataset loaders: each returns X_train, X_test, y_train, y_test
+def load_iris_split():
+    X, y = load_iris(return_X_y=True)
+    return train_test_split(X, y, test_size=0.2, random_state=SEED)
+
+def load_fashion_mnist_split():
+    X, y = fetch_openml('Fashion-MNIST', version=1, return_X_y=True, as_frame=False)
+    X = X / 255.0  # Normalize pixel values to [0, 1]
+    return train_test_split(X, y, test_size=0.2, random_state=SEED)
+
+
+# Estimator factories: each takes the trial's hyperparameters, the seed and fixed options
+def make_mlp(params, seed, **options):
+    return MLPClassifier(**params, random_state=seed, **options)
+
+def make_svc(params, seed, **options):
+    return SVC(**params, **options)
+
+
+DATASETS = {}
+ESTIMATORS = {}
+EXPERIMENTS = {}
+
+def register_dataset(key, loader, name, version, description, storage_location, size, downcast=False):
+    """Register a dataset loader together with the metadata stored in the Dataset table."""
+    DATASETS[key] = {"loader": loader, "name": name, "version": version, "description": description,
+                     "storage_location": storage_location, "size": size, "downcast": downcast}
+
+def register_estimator(key, factory, name, model_type, version, artifact_location, budget_param=None):
+    """Register an estimator factory together with the metadata stored in the Model table.
+
+    ``budget_param`` names the option that controls training length (e.g. max_iter); successive halving scales
+    it per rung. Estimators without one are given a growing fraction of the training data instead.
+    """
+    ESTIMATORS[key] = {"factory": factory, "name": name, "type": model_type, "version": version,
+                       "artifact_location": artifact_location, "budget_param": budget_param}
+
+def register_experiment(key, dataset, estimator, param_grid, name, author, description, estimator_options=None):
+    """Register a sweep: which dataset and estimator to use and the grid of hyperparameters to try."""
+    EXPERIMENTS[key] = {"dataset": dataset, "estimator": estimator, "param_grid": param_grid, "name": name,
+                        "author": author, "description": description, "estimator_options": estimator_options or {}}
+
+
+register_dataset("iris", load_iris_split, 'Iris', '1.0', 'Iris dataset for classification', '/mnt/data/iris.csv', 150)
+register_dataset("fashion_mnist", load_fashion_mnist_split, 'Fashion-MNIST', '1.0', 'Image classification dataset',
+                 '/mnt/data/fmnist.csv', 70000, downcast=True)
+
+register_estimator("mlp", make_mlp, 'MLPClassifier', 'NeuralNet', '1.0', '/mnt/data/mlp_model.pkl',
+                   budget_param='max_iter')
+register_estimator("svc", make_svc, 'SVC', 'SVM', '1.0', '/mnt/data/model.pkl')
+
+register_experiment("iris_nn", "iris", "mlp",
+                    {'hidden_layer_sizes': [(10,), (50,), (50, 20)],
+                     'activation': ['relu', 'tanh'],
+                     'learning_rate_init': [0.001, 0.01]},
+                    'Iris NN Experiment', 'Lyssa', 'Neural net on Iris dataset',
+                    estimator_options={'max_iter': 300})
+register_experiment("fashion_nn", "fashion_mnist", "mlp",
+                    {'hidden_layer_sizes': [(128, 64), (256, 128), (256, 128, 64)],
+                     'activation': ['relu', 'tanh'],
+                     'learning_rate_init': [0.001, 0.005]},
+                    'FashionNN', 'lyssa', 'Fashion-MNIST NN experiments',
+                    estimator_options={'max_iter': 30, 'early_stopping': True})
+register_experiment("iris_svm", "iris", "svc",
+                    {'C': [0.1, 1, 10, 100],
+                     'kernel': ['linear', 'rbf', 'poly', 'sigmoid'],
+                     'gamma': ['scale', 'auto', 0.01, 0.1]},
+                    'Iris SVM Experiment', 'Lyssa', 'Experiment with SVM on Iris dataset')
+
+
+def expand_grid(param_grid):
+    """Return every combination of a {name: [values]} grid as a list of {name: value} dicts."""
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+def compute_metrics(y_true, y_pred):
+    """Weighted classification metrics logged for every trial."""
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, average='weighted', zero_division=0),
+        'recall': recall_score(y_true, y_pred, average='weighted', zero_division=0),
+        'f1': f1_score(y_true, y_pred, average='weighted', zero_division=0)
+    }
+
+def hyperparameter_value(value):
+    """Tuples such as hidden_layer_sizes are stored as their text form."""
+    return value if isinstance(value, (int, float, str)) else str(value)
+
+def run_trial(factory, options, params, staged, exp_id, result_queue, seed=SEED, trial_id=None, artifact_path=None):
+    """Train and score one configuration, enqueue its results for the writer and return its metrics.
+
+    When ``artifact_path`` is given the fitted model is pickled there for the trial cache.
+    """
+    X_train, X_test, y_train, y_test = staged.load()
+
+    clf = factory(params, seed, **options)
+    clf.fit(X_train, y_train)
+    metrics = compute_metrics(y_test, clf.predict(X_test))
+    if artifact_path is not None:
+        with open(artifact_path, "wb") as artifact:
+            pickle.dump(clf, artifact)
+
+    now = time.strftime('%Y-%m-%d %H:%M:%S')
+    enqueue_trial(result_queue, exp_id, 'completed', now, now, seed,
+                  hyperparameters={name: hyperparameter_value(value) for name, value in params.items()},
+                  metrics={name: float(value) for name, value in metrics.items()},
+                  trial_id=trial_id)
+    return params, metrics
+
+def run_budgeted_trial(factory, options, params, staged, fraction, budget_param=None, seed=SEED):
+    """Train one configuration on a fraction of its full budget and return (metrics, timestamp).
+
+    With a ``budget_param`` the fraction scales that option (e.g. max_iter); otherwise it scales the number of
+    training rows used.
+    """
+    X_train, X_test, y_train, y_test = staged.load()
+
+    if budget_param is not None:
+        options = dict(options, **{budget_param: max(1, round(options[budget_param] * fraction))})
+    else:
+        rows = max(1, round(len(X_train) * fraction))
+        X_train, y_train = X_train[:rows], y_train[:rows]
+
+    clf = factory(params, seed, **options)
+    clf.fit(X_train, y_train)
+    return compute_metrics(y_test, clf.predict(X_test)), time.strftime('%Y-%m-%d %H:%M:%S')
+
+def halving_fractions(eta=3, min_fraction=1 / 9):
+    """Budget fractions for each rung: min_fraction, min_fraction * eta, ... ending at the full budget."""
+    fractions = []
+    fraction = min_fraction
+    while fraction < 1 - 1e-9:
+        fractions.append(fraction)
+        fraction *= eta
+    return fractions + [1.0]
+
+def successive_halving(estimator, options, grid, staged, exp_id, writer, backend="loky", n_jobs=4,
+                       eta=3, min_fraction=1 / 9, objective='accuracy', seed=SEED):
+    """Train every configuration on a small budget, keep the best 1/eta, and repeat on a budget eta times larger.
+
+    Each rung's scores are stored as ``<metric>_rung<r>`` Metric rows on the configuration's Trial. Pruned
+    trials are written with status 'pruned'; survivors of the final, full-budget rung are 'completed' and also
+    get their final scores under the plain metric names.
+    """
+    budget_param = estimator['budget_param']
+    if budget_param is not None and budget_param not in options:
+        raise ValueError(f"Estimator option {budget_param!r} must be set to use successive halving.")
+
+    start = time.strftime('%Y-%m-%d %H:%M:%S')
+    history = {index: [] for index in range(len(grid))}
+    survivors = list(range(len(grid)))
+    fractions = halving_fractions(eta, min_fraction)
+    results = []
+
+    for rung, fraction in enumerate(fractions):
+        tasks = [(estimator['factory'], options, grid[index], staged, fraction, budget_param, seed) for index in survivors]
+        scores = run_tasks(run_budgeted_trial, tasks, backend=backend, n_jobs=n_jobs)
+        for index, (metrics, timestamp) in zip(survivors, scores):
+            history[index] += [(f"{name}_rung{rung}", float(value), timestamp) for name, value in metrics.items()]
+
+        final = rung == len(fractions) - 1
+        ranked = sorted(zip(survivors, scores), key=lambda item: item[1][0][objective], reverse=True)
+        keep = len(ranked) if final else max(1, len(ranked) // eta)
+
+        for position, (index, (metrics, timestamp)) in enumerate(ranked):
+            if position < keep and not final:
+                continue
+            status = 'completed' if final else 'pruned'
+            trial_metrics = history[index]
+            if final:
+                trial_metrics = trial_metrics + [(name, float(value), timestamp) for name, value in metrics.items()]
+            writer.submit(exp_id, status, start, timestamp, seed,
+                          hyperparameters={name: hyperparameter_value(value) for name, value in grid[index].items()},
+                          metrics=trial_metrics)
+            results.append((grid[index], metrics))
+        survivors = [index for index, _ in ranked[:keep]]
+
+    return results
+
+def run_tasks(func, tasks, backend="loky", n_jobs=4):
+    """Run func(*task) for every task on the chosen backend and return the results in order."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; choose from {', '.join(BACKENDS)}.")
+    if BACKENDS[backend] is None:
+        return [func(*task) for task in tasks]
+    return Parallel(n_jobs=n_jobs, backend=BACKENDS[backend])(delayed(func)(*task) for task in tasks)
+
+
+def insert_experiment_setup(database_name, dataset, estimator):
+    """Record the dataset and model rows for a sweep and return their IDs."""
+    dataset_id = str(uuid.uuid4())
+    model_id = str(uuid.uuid4())
+    conn = sqlite3.connect(database_name)
+    try:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO Dataset (Dataset_ID, name, version, description, storage_location, size) VALUES (?, ?, ?, ?, ?, ?)",
+                    (dataset_id, dataset['name'], dataset['version'], dataset['description'],
+                     dataset['storage_location'], dataset['size']))
+        cur.execute("INSERT INTO Model (Model_ID, Name, Type, Version, Hyperparameters, ArtifactLocation) VALUES (?, ?, ?, ?, ?, ?)",
+                    (model_id, estimator['name'], estimator['type'], estimator['version'],
+                     ', '.join(estimator['param_names']), estimator['artifact_location']))
+        conn.commit()
+    finally:
+        conn.close()
+    return dataset_id, model_id
+
+def insert_experiment(database_name, exp_id, experiment, start_time, end_time, model_id, dataset_id):
+    """Record the finished experiment row."""
+    conn = sqlite3.connect(database_name)
+    try:
+        conn.execute("INSERT INTO Experiment (Experiment_ID, Name, Author_ID, Description, StartTimeStamp, EndTimeStamp, status, model_id, dataset_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (exp_id, experiment['name'], experiment['author'], experiment['description'],
+                      start_time.strftime('%Y-%m-%d %H:%M:%S'), end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                      'completed', model_id, dataset_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_grid(estimator, options, dataset, grid, exp_id, writer_args, backend="loky", n_jobs=4, cache=None):
+    """Train every configuration to completion, reusing cached trials when a cache is given.
+
+    Cache hits are recorded on this experiment as trials with status 'cached' carrying the stored metrics;
+    the dataset is only loaded and staged if at least one configuration has to be trained.
+    """
+    results = [None] * len(grid)
+    keys = [trial_key(dataset, estimator, options, params, SEED) for params in grid] if cache else [None] * len(grid)
+    misses = []
+
+    database_name, shared = writer_args
+    with TrialResultWriter(database_name, shared=shared) as writer:
+        for index, (params, key) in enumerate(zip(grid, keys)):
+            metrics = cache.get(key) if cache else None
+            if metrics is None:
+                misses.append(index)
+                continue
+            now = time.strftime('%Y-%m-%d %H:%M:%S')
+            writer.submit(exp_id, 'cached', now, now, SEED,
+                          hyperparameters={name: hyperparameter_value(value) for name, value in params.items()},
+                          metrics=metrics)
+            results[index] = (params, metrics)
+
+        if misses:
+            X_train, X_test, y_train, y_test = dataset['loader']()
+            trial_ids = {index: str(uuid.uuid4()) for index in misses}
+            with stage_dataset(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test,
+                               downcast=dataset['downcast']) as staged:
+                tasks = [(estimator['factory'], options, grid[index], staged, exp_id, writer.queue, SEED,
+                          trial_ids[index], cache.artifact_path(keys[index]) if cache else None)
+                         for index in misses]
+                for index, result in zip(misses, run_tasks(run_trial, tasks, backend=backend, n_jobs=n_jobs)):
+                    results[index] = result
+
+    # Index the new trials only once the writer has flushed them
+    if cache:
+        for index in misses:
+            cache.put(keys[index], trial_ids[index])
+    return results
+
+def run_experiment(key, database_name=SQLITE_FILE_PATH, backend="loky", n_jobs=4, scheduler="grid",
+                   eta=3, min_fraction=1 / 9, cache=None):
+    """Run a registered sweep end to end and return (experiment ID, [(params, metrics), ...]).
+
+    The "grid" scheduler trains every configuration to completion; "halving" runs successive halving with
+    reduction factor ``eta`` starting from ``min_fraction`` of the full budget. Passing a TrialCache lets the
+    grid scheduler reuse identical trials from earlier runs.
+    """
+    if scheduler not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler {scheduler!r}; choose from {', '.join(SCHEDULERS)}.")
+    experiment = EXPERIMENTS[key]
+    dataset = DATASETS[experiment['dataset']]
+    estimator = dict(ESTIMATORS[experiment['estimator']], param_names=list(experiment['param_grid']))
+
+    start_time = datetime.now()
+    exp_id = str(uuid.uuid4())
+    dataset_id, model_id = insert_experiment_setup(database_name, dataset, estimator)
+
+    grid = expand_grid(experiment['param_grid'])
+
+    # Stage the split once and let a single writer commit results while the workers keep training
+    # (with halving the parent submits results itself, so the queue never leaves this process)
+    if scheduler == "halving":
+        X_train, X_test, y_train, y_test = dataset['loader']()
+        with stage_dataset(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test,
+                           downcast=dataset['downcast']) as staged, \
+                TrialResultWriter(database_name, shared=False) as writer:
+            results = successive_halving(estimator, experiment['estimator_options'], grid, staged, exp_id, writer,
+                                         backend=backend, n_jobs=n_jobs, eta=eta, min_fraction=min_fraction)
+    else:
+        shared = BACKENDS.get(backend) in ("loky", "multiprocessing")
+        results = run_grid(estimator, experiment['estimator_options'], dataset, grid, exp_id, (database_name, shared),
+                           backend=backend, n_jobs=n_jobs, cache=cache)
+
+    end_time = datetime.now()
+    insert_experiment(database_name, exp_id, experiment, start_time, end_time, model_id, dataset_id)
+    print(f"Completed {len(results)} trials of '{experiment['name']}' in {end_time - start_time}")
+    return exp_id, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a registered hyperparameter sweep and log it to the MLED database.")
+    parser.add_argument("experiment", choices=sorted(EXPERIMENTS))
+    parser.add_argument("--db", default=SQLITE_FILE_PATH, help="SQLite database to log to.")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="loky")
+    parser.add_argument("--n-jobs", type=int, default=4, help="Number of parallel workers (-1 for all cores).")
+    parser.add_argument("--scheduler", choices=SCHEDULERS, default="grid",
+                        help="'grid' trains every configuration fully; 'halving' prunes poor ones early.")
+    parser.add_argument("--eta", type=int, default=3, help="Successive halving reduction factor.")
+    parser.add_argument("--min-fraction", type=float, default=1 / 9,
+                        help="Budget fraction (of iterations or training rows) used by the first halving rung.")
+    parser.add_argument("--cache", action="store_true", help="Reuse identical trials from earlier runs (grid scheduler).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--cache-artifacts", action="store_true", help="Also pickle fitted models into the cache.")
+    args = parser.parse_args(argv)
+
+    cache = TrialCache(args.db, directory=args.cache_dir, store_artifacts=args.cache_artifacts) if args.cache else None
+    try:
+        _, results = run_experiment(args.experiment, database_name=args.db, backend=args.backend, n_jobs=args.n_jobs,
+                                    scheduler=args.scheduler, eta=args.eta, min_fraction=args.min_fraction, cache=cache)
+    finally:
+        if cache:
+            cache.close()
+    for params, metrics in results:
+        print(params, metrics)
+
+if __name__ == "__main__":
+    main()
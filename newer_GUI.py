@@ -1,10 +1,15 @@
+import asyncio
 import justpy as jp
 import database_operations as db_ops
-import csv
-import io
-import base64
+import async_database_operations as async_db
+import query_export
+from query_service import QueryService, QueryTimeout, QueryCancelled
 
-def submit_form(self, msg):
+PREVIEW_ROWS = 100
+
+query_service = QueryService()
+
+async def submit_form(self, msg):
     """Handles form submission and inserts data into the database."""
     table = self.table_name
     fields = self.fields
@@ -13,26 +18,42 @@ def submit_form(self, msg):
     data = {field: inputs[field].value for field in fields}
     
     if table == "User":
-        db_ops.insert_user(data['First_Name'], data['Last_Name'], data['Email'], data['Role'])
+        await async_db.insert_user(data['First_Name'], data['Last_Name'], data['Email'], data['Role'])
     elif table == "Dataset":
-        db_ops.insert_dataset(data['Name'], int(data['Version']), data['Description'], data['Storage_Location'], int(data['Size']))
+        await async_db.insert_dataset(data['Name'], int(data['Version']), data['Description'], data['Storage_Location'], int(data['Size']))
     elif table == "Model":
-        db_ops.insert_model(data['Name'], data['Type'], int(data['Version']), data['Hyperparameters'], data['ArtifactLocation'])
+        await async_db.insert_model(data['Name'], data['Type'], int(data['Version']), data['Hyperparameters'], data['ArtifactLocation'])
     elif table == "Experiment":
-        db_ops.insert_experiment(data['Name'], data['Author_ID'], data['Description'], data['Status'], data['Model_ID'], data['DataSet_ID'])
+        await async_db.insert_experiment(data['Name'], data['Author_ID'], data['Description'], data['Status'], data['Model_ID'], data['DataSet_ID'])
     elif table == "Trial":
-        db_ops.insert_trial(data['Experiment_ID'], data['Status'], data['Start_Time'], data['End_Time'], int(data['Seed']))
+        await async_db.insert_trial(data['Experiment_ID'], data['Status'], data['Start_Time'], data['End_Time'], int(data['Seed']))
     elif table == "Metric":
-        db_ops.insert_metric(data['Trial_ID'], data['Name'], int(data['Value']), data['TimeStamp'])
+        await async_db.insert_metric(data['Trial_ID'], data['Name'], int(data['Value']), data['TimeStamp'])
     elif table == "Hyperparameter":
-        db_ops.insert_hyperparameter(data['Trial_ID'], data['Type'], int(data['Epochs']), float(data['Value']))
+        await async_db.insert_hyperparameter(data['Trial_ID'], data['Type'], int(data['Epochs']), float(data['Value']))
     elif table == "ErrorLog":
-        db_ops.insert_error_log(data['Experiment_ID'], data['Trial_ID'], data['TimeStamp'], data['ErrorMessage'], data['ErrorDetails'])
+        await async_db.insert_error_log(data['Experiment_ID'], data['Trial_ID'], data['TimeStamp'], data['ErrorMessage'], data['ErrorDetails'])
     
     msg.page.add(jp.Div(text=f"Data added to {table} successfully!"))
 
-def create_form(table_name, fields, dropdown_data=None):
-    """Generates a form for a given table with enforced dropdown selection."""
+def fill_options(select, options):
+    """Replaces the options of a dropdown, keeping the disabled placeholder first."""
+    select.delete_components()
+    jp.Option(value="", text="Select an option", a=select, disabled=True, selected=True)
+    for option in options:
+        jp.Option(value=option[0], text=option[1], a=select)
+    select.value = ""
+
+async def search_dropdown(self, msg):
+    """Refills the dropdown next to a search box with the options matching what was typed."""
+    fill_options(self.select, await async_db.search_options(self.table_name, self.value.strip()))
+
+async def create_form(table_name, fields, search_fields=None):
+    """Generates a form for a given table with enforced dropdown selection.
+
+    ``search_fields`` maps a field to the table it references; such fields get a dropdown of the first
+    matching options and a search box that narrows it as the user types.
+    """
     wp = jp.WebPage()
     container = jp.Div(classes="m-4 p-4 border", a=wp)
     
@@ -41,11 +62,13 @@ def create_form(table_name, fields, dropdown_data=None):
     
     for field in fields:
         jp.Label(text=field, a=container)
-        if dropdown_data and field in dropdown_data:
+        if search_fields and field in search_fields:
+            search_box = jp.Input(placeholder="Type to search", classes="border p-2 m-2", a=container, debounce=300)
             input_box = jp.Select(a=container, classes="border p-2 m-2")
-            jp.Option(value="", text="Select an option", a=input_box, disabled=True, selected=True)
-            for option in dropdown_data[field]:
-                jp.Option(value=option[0], text=option[1], a=input_box)
+            fill_options(input_box, await async_db.search_options(search_fields[field]))
+            search_box.select = input_box
+            search_box.table_name = search_fields[field]
+            search_box.on('input', search_dropdown)
             inputs[field] = input_box
         else:
             input_box = jp.Input(classes="border p-2 m-2", a=container)
@@ -59,30 +82,22 @@ def create_form(table_name, fields, dropdown_data=None):
     
     return wp
 
-def experiment_form():
-    models = db_ops.fetch_table("Model")
-    model_options = [(row[0], row[1]) for row in models]  # (Model_ID, Name)
-    return create_form("Experiment", ["Name", "Author_ID", "Description", "Status", "Model_ID", "DataSet_ID"], dropdown_data={"Model_ID": model_options})
+async def experiment_form():
+    return await create_form("Experiment", ["Name", "Author_ID", "Description", "Status", "Model_ID", "DataSet_ID"],
+                       search_fields={"Author_ID": "User", "Model_ID": "Model", "DataSet_ID": "Dataset"})
 
-def trial_form():
-    experiments = db_ops.fetch_table("Experiment")
-    experiment_options = [(row[0], row[1]) for row in experiments]  # (Experiment_ID, Name)
-    return create_form("Trial", ["Experiment_ID", "Status", "Start_Time", "End_Time", "Seed"], dropdown_data={"Experiment_ID": experiment_options})
+async def trial_form():
+    return await create_form("Trial", ["Experiment_ID", "Status", "Start_Time", "End_Time", "Seed"], search_fields={"Experiment_ID": "Experiment"})
 
-def metric_form():
-    trials = db_ops.fetch_table("Trial")
-    trial_options = [(row[0], row[0]) for row in trials]  # (Trial_ID, Trial_ID)
-    return create_form("Metric", ["Trial_ID", "Name", "Value", "TimeStamp"], dropdown_data={"Trial_ID": trial_options})
+async def metric_form():
+    return await create_form("Metric", ["Trial_ID", "Name", "Value", "TimeStamp"], search_fields={"Trial_ID": "Trial"})
 
-def hyperparameter_form():
-    trials = db_ops.fetch_table("Trial")
-    trial_options = [(row[0], row[0]) for row in trials]  # (Trial_ID, Trial_ID)
-    return create_form("Hyperparameter", ["Trial_ID", "Type", "Epochs", "Value"], dropdown_data={"Trial_ID": trial_options})
+async def hyperparameter_form():
+    return await create_form("Hyperparameter", ["Trial_ID", "Type", "Epochs", "Value"], search_fields={"Trial_ID": "Trial"})
 
-def errorlog_form():
-    trials = db_ops.fetch_table("Trial")
-    trial_options = [(row[0], row[0]) for row in trials]  # (Trial_ID, Trial_ID)
-    return create_form("ErrorLog", ["Experiment_ID", "Trial_ID", "TimeStamp", "ErrorMessage", "ErrorDetails"], dropdown_data={"Trial_ID": trial_options})
+async def errorlog_form():
+    return await create_form("ErrorLog", ["Experiment_ID", "Trial_ID", "TimeStamp", "ErrorMessage", "ErrorDetails"],
+                       search_fields={"Experiment_ID": "Experiment", "Trial_ID": "Trial"})
 
 def homepage():
     """Creates a homepage listing all available routes."""
@@ -112,42 +127,106 @@ def homepage():
     
     return wp
 
-def user_form():
-    return create_form("User", ["First_Name", "Last_Name", "Email", "Role"])
+async def user_form():
+    return await create_form("User", ["First_Name", "Last_Name", "Email", "Role"])
+
+async def dataset_form():
+    return await create_form("Dataset", ["Name", "Version", "Description", "Storage_Location", "Size"])
+
+async def model_form():
+    return await create_form("Model", ["Name", "Type", "Version", "Hyperparameters", "ArtifactLocation"])
+
+TABLES = ["User", "Dataset", "Model", "Experiment", "Trial", "Metric", "Hyperparameter", "ErrorLog"]
+PAGE_SIZES = [25, 50, 100, 200]
+
+async def render_page(view, after=None, before=None):
+    """Fetches one keyset page of the view's table and replaces the rendered rows with it."""
+    rows, keys, more = await async_db.fetch_page(view.table_name, view.sort_column, after=after, before=before, page_size=view.page_size)
+    view.table_div.delete_components()
+    if not rows:
+        if after is None and before is None:
+            view.rows, view.keys = [], []
+            view.prev_button.disabled = view.next_button.disabled = True
+            jp.P(text="No data available.", classes="text-gray-500", a=view.table_div)
+            return
+        # Paged past either end: stay on the current page
+        rows, keys, more = view.rows, view.keys, False
+    if before is not None:
+        view.has_previous, view.has_next = more, True
+    elif after is not None:
+        view.has_previous, view.has_next = True, more
+    else:
+        view.has_previous, view.has_next = False, more
+    view.rows, view.keys = rows, keys
+
+    table_element = jp.Table(classes="border-collapse border border-gray-300 w-full", a=view.table_div)
+    header_row = jp.Tr(classes="bg-gray-200", a=table_element)
+    for col in view.columns:
+        jp.Th(text=col, classes="border border-gray-400 p-2", a=header_row)
+    for row in rows:
+        tr = jp.Tr(a=table_element)
+        for cell in row:
+            jp.Td(text=str(cell), classes="border border-gray-300 p-2", a=tr)
+    view.prev_button.disabled = not view.has_previous
+    view.next_button.disabled = not view.has_next
+
+async def next_page(self, msg):
+    if self.view.keys:
+        await render_page(self.view, after=self.view.keys[-1])
+
+async def previous_page(self, msg):
+    if self.view.keys:
+        await render_page(self.view, before=self.view.keys[0])
+
+async def change_sort(self, msg):
+    self.view.sort_column = self.value or None
+    await render_page(self.view)
 
-def dataset_form():
-    return create_form("Dataset", ["Name", "Version", "Description", "Storage_Location", "Size"])
+async def change_page_size(self, msg):
+    self.view.page_size = int(self.value)
+    await render_page(self.view)
 
-def model_form():
-    return create_form("Model", ["Name", "Type", "Version", "Hyperparameters", "ArtifactLocation"])
+async def table_view(table, container):
+    """Adds a paginated view of one table: a row count estimate, sort and page size controls, and one page of rows."""
+    view = jp.Div(a=container)
+    view.table_name = table
+    view.columns = await async_db.get_table_columns(table)
+    view.sort_column = None
+    view.page_size = db_ops.PAGE_SIZE
+    view.rows, view.keys = [], []
 
-def show_database():
-    """Displays all tables in the database with formatted output."""
+    row_count = await async_db.estimate_row_count(table)
+    jp.H3(text=f"Table: {table} (~{row_count:,} rows)", classes="text-md font-bold mt-4", a=view)
+    controls = jp.Div(classes="flex items-center", a=view)
+    jp.Label(text="Sort by", a=controls)
+    sort_select = jp.Select(classes="border p-2 m-2", a=controls)
+    jp.Option(value="", text="Insertion order", a=sort_select, selected=True)
+    # Only indexed columns are offered: paging by any other column would sort the whole table for every page
+    for col in await async_db.get_sort_columns(table):
+        jp.Option(value=col, text=col, a=sort_select)
+    jp.Label(text="Rows per page", a=controls)
+    size_select = jp.Select(classes="border p-2 m-2", a=controls, value=str(view.page_size))
+    for size in PAGE_SIZES:
+        jp.Option(value=str(size), text=str(size), a=size_select)
+    view.prev_button = jp.Button(text="Previous", classes="bg-blue-500 text-white p-2 m-2", a=controls)
+    view.next_button = jp.Button(text="Next", classes="bg-blue-500 text-white p-2 m-2", a=controls)
+    view.table_div = jp.Div(a=view)
+
+    for component, handler in ((sort_select, change_sort), (size_select, change_page_size),
+                               (view.prev_button, previous_page), (view.next_button, next_page)):
+        component.view = view
+        component.on('change' if isinstance(component, jp.Select) else 'click', handler)
+    await render_page(view)
+    return view
+
+async def show_database():
+    """Displays every table in the database one page at a time."""
     wp = jp.WebPage()
     container = jp.Div(classes="m-4 p-4 border", a=wp)
     jp.H2(text="Database Content", classes="text-lg font-bold", a=container)
     
-    tables = ["User", "Dataset", "Model", "Experiment", "Trial", "Metric", "Hyperparameter", "ErrorLog"]
-    
-    for table in tables:
-        jp.H3(text=f"Table: {table}", classes="text-md font-bold mt-4", a=container)
-        column_info = db_ops.fetch_data(f"PRAGMA table_info({table})")
-        column_names = [col[1] for col in column_info] if column_info else []
-        data = db_ops.fetch_data(f"SELECT * FROM {table}")
-        
-        if data:
-            table_element = jp.Table(classes="border-collapse border border-gray-300 w-full", a=container)
-            header_row = jp.Tr(classes="bg-gray-200", a=table_element)
-            
-            for col in column_names:
-                jp.Th(text=col, classes="border border-gray-400 p-2", a=header_row)
-            
-            for row in data:
-                tr = jp.Tr(a=table_element)
-                for cell in row:
-                    jp.Td(text=str(cell), classes="border border-gray-300 p-2", a=tr)
-        else:
-            jp.P(text="No data available.", classes="text-gray-500", a=container)
+    # Each view adds its Div before its first await, so the tables keep their order while loading concurrently
+    await asyncio.gather(*(table_view(table, container) for table in TABLES))
     
     return wp
 
@@ -179,52 +258,80 @@ def query_database():
     custom_query_input = jp.Textarea(placeholder="Enter your SQL query here", classes="border p-2 m-2 w-full h-24", a=container)
     
     result_div = jp.Div(classes="mt-4", a=container)
-    download_link = jp.A(text="Download Results", href="#", classes="hidden text-blue-500 underline mt-2", a=container)
+    download_div = jp.Div(classes="hidden mt-2", a=container)
     
-    def run_query(self, msg):
+    async def run_query(self, msg):
         result_div.delete_components()
+        download_div.delete_components()
+        download_div.classes = "hidden"
         query = query_select.value or custom_query_input.value.strip()
         
         if not query:
             result_div.add(jp.P(text="Please enter a valid query or select a predefined one."))
             return
         
+        # The query runs on the service's threads; the page stays responsive so it can be cancelled
+        jp.P(text="Running query...", classes="text-gray-500", a=result_div)
+        cancel_button.classes = "bg-red-500 text-white p-2 m-2"
+        await msg.page.update()
         try:
-            data = db_ops.fetch_data(query)
-            if not data:
-                result_div.add(jp.P(text="No results found."))
-                download_link.classes = "hidden"
-            else:
-                table_element = jp.Table(classes="border-collapse border border-gray-300 w-full", a=result_div)
-                for row in data:
-                    tr = jp.Tr(a=table_element)
-                    for cell in row:
-                        jp.Td(text=str(cell), classes="border border-gray-300 p-2", a=tr)
-                
-                # Generate CSV file
-                csv_output = io.StringIO()
-                csv_writer = csv.writer(csv_output)
-                csv_writer.writerows(data)
-                csv_content = csv_output.getvalue().encode('utf-8')
-                csv_base64 = base64.b64encode(csv_content).decode('utf-8')
-                
-                download_link.href = f"data:text/csv;base64,{csv_base64}"
-                download_link.download = "query_results.csv"
-                download_link.classes = "text-blue-500 underline mt-2"
+            result = await query_service.run(query, max_rows=PREVIEW_ROWS,
+                                             on_submit=lambda job_id: setattr(cancel_button, "job_id", job_id))
+        except (QueryTimeout, QueryCancelled) as e:
+            result_div.delete_components()
+            result_div.add(jp.P(text=str(e), classes="text-red-500"))
+            return
         except Exception as e:
+            result_div.delete_components()
             result_div.add(jp.P(text=f"Error: {str(e)}", classes="text-red-500"))
-            download_link.classes = "hidden"
+            return
+        finally:
+            cancel_button.classes = "hidden"
+            cancel_button.job_id = None
+        
+        result_div.delete_components()
+        columns, data = result["columns"], result["rows"]
+        if not data:
+            result_div.add(jp.P(text="No results found."))
+            return
+        
+        shown = f"Showing the first {len(data)} rows." if result["truncated"] else f"{len(data)} rows."
+        jp.P(text=f"{shown} ({result['elapsed']:.2f} seconds)", classes="text-gray-500", a=result_div)
+        table_element = jp.Table(classes="border-collapse border border-gray-300 w-full", a=result_div)
+        header_row = jp.Tr(classes="bg-gray-200", a=table_element)
+        for col in columns:
+            jp.Th(text=col, classes="border border-gray-400 p-2", a=header_row)
+        for row in data:
+            tr = jp.Tr(a=table_element)
+            for cell in row:
+                jp.Td(text=str(cell), classes="border border-gray-300 p-2", a=tr)
+        
+        # Downloads stream the full result from /export
+        token = query_export.register_export(query)
+        jp.Span(text="Download results as", a=download_div)
+        for export_format in query_export.EXPORT_FORMATS:
+            jp.A(text=export_format.upper(), href=query_export.export_url(token, export_format),
+                 download=f"query_results.{query_export.EXPORT_FORMATS[export_format][2]}",
+                 classes="text-blue-500 underline m-2", a=download_div)
+        download_div.classes = "mt-2"
+    
+    def cancel_query(self, msg):
+        if self.job_id:
+            query_service.cancel(self.job_id)
     
     query_button = jp.Button(text="Run Query", classes="bg-blue-500 text-white p-2 m-2", a=container)
     query_button.on('click', run_query)
+    cancel_button = jp.Button(text="Cancel", classes="hidden", a=container)
+    cancel_button.job_id = None
+    cancel_button.on('click', cancel_query)
     
     return wp
 
 def main():
     jp.Route("/", homepage)
-    jp.Route("/user", lambda: create_form("User", ["First_Name", "Last_Name", "Email", "Role"]))
-    jp.Route("/dataset", lambda: create_form("Dataset", ["Name", "Version", "Description", "Storage_Location", "Size"]))
-    jp.Route("/model", lambda: create_form("Model", ["Name", "Type", "Version", "Hyperparameters", "ArtifactLocation"]))
+    jp.Route("/user", user_form)
+    jp.Route("/dataset", dataset_form)
+    jp.Route("/model", model_form)
     jp.Route("/experiment", experiment_form)
     jp.Route("/trial", trial_form)
     jp.Route("/metric", metric_form)
@@ -232,6 +339,7 @@ def main():
     jp.Route("/errorlog", errorlog_form)
     jp.Route("/show_database", show_database)
     jp.Route("/query_database", query_database)
+    jp.app.router.add_route("/export/{name}", query_export.export_endpoint, methods=["GET"])
     jp.justpy()
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+#streamed downloads of Query Database results
+#rows are read from a server-side cursor EXPORT_CHUNK_ROWS at a time and each chunk is encoded and handed to the
+#response before the next one is read, so memory stays flat however large the result is
+#reading a chunk is bounded by the query_service time budget, and a client that disconnects interrupts the query
+#CSV needs only the standard library; Parquet and Arrow need pyarrow
+
+import asyncio
+import csv
+import io
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from query_service import PROGRESS_STEPS, TIME_BUDGET, QueryCancelled, QueryTimeout, connect_read_only
+
+EXPORT_CHUNK_ROWS = 10000
+# Seconds SQLite may spend producing one chunk; an export runs as long as it keeps producing rows
+EXPORT_CHUNK_BUDGET = TIME_BUDGET
+# Queries registered for download, oldest dropped first
+MAX_EXPORTS = 100
+
+_exports = OrderedDict()
+
+
+def iter_chunks(query, params=(), chunk_rows=EXPORT_CHUNK_ROWS, cancelled=None, chunk_budget=None):
+    """Yield the column names, then lists of at most ``chunk_rows`` rows, from one cursor over ``query``.
+
+    As in QueryService, a progress handler interrupts the query once reading a chunk takes longer than
+    ``chunk_budget`` seconds (QueryTimeout) or the ``cancelled`` event is set (QueryCancelled). Closing the
+    generator closes the cursor and its connection.
+    """
+    cancelled = cancelled or threading.Event()
+    chunk_budget = EXPORT_CHUNK_BUDGET if chunk_budget is None else chunk_budget
+    deadline = time.monotonic() + chunk_budget
+    conn = connect_read_only()
+    # A non-zero return aborts the statement with "interrupted"
+    conn.set_progress_handler(lambda: cancelled.is_set() or time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        try:
+            cursor = conn.execute(query, params)
+            yield [column[0] for column in cursor.description or ()]
+            while True:
+                deadline = time.monotonic() + chunk_budget
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.OperationalError as e:
+            if cancelled.is_set():
+                raise QueryCancelled("Export was cancelled.") from e
+            if time.monotonic() > deadline:
+                raise QueryTimeout(f"Export spent more than {chunk_budget} seconds on one chunk of rows.") from e
+            raise
+    finally:
+        conn.close()
+
+
+def iter_csv(query, params=(), chunk_rows=EXPORT_CHUNK_ROWS, cancelled=None):
+    """Yield the result of ``query`` as UTF-8 CSV: the header line, then one piece per chunk of rows."""
+    chunks = iter_chunks(query, params, chunk_rows, cancelled)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(chunks))
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Drain:
+    """Write-only file object whose contents are taken away as they are streamed."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _record_batches(query, params, chunk_rows, cancelled):
+    """The result's Arrow schema and a generator of one record batch per chunk, typed from the first chunk."""
+    import pyarrow as pa
+
+    chunks = iter_chunks(query, params, chunk_rows, cancelled)
+    names = next(chunks)
+    first = next(chunks, [])
+    inferred = [pa.array(values).type for values in zip(*first)] or [pa.null() for _ in names]
+    # SQLite columns are dynamically typed: text columns, and columns all NULL in the first chunk, take any value as text
+    types = [pa.string() if pa.types.is_null(column_type) or pa.types.is_string(column_type) else column_type
+             for column_type in inferred]
+    schema = pa.schema(list(zip(names, types)))
+
+    def batch(rows):
+        arrays = []
+        for values, column_type in zip(zip(*rows), types):
+            if pa.types.is_string(column_type):
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=column_type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def batches():
+        if first:
+            yield batch(first)
+        for rows in chunks:
+            yield batch(rows)
+
+    return schema, batches()
+
+
+def _iter_arrow_writer(query, params, chunk_rows, cancelled, open_writer):
+    schema, batches = _record_batches(query, params, chunk_rows, cancelled)
+    drain = _Drain()
+    writer = open_writer(drain, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield drain.take()
+    writer.close()
+    yield drain.take()
+
+
+def iter_parquet(query, params=(), chunk_rows=EXPORT_CHUNK_ROWS, cancelled=None):
+    """Yield the result of ``query`` as a Parquet file with one row group per chunk of rows."""
+    import pyarrow.parquet as pq
+
+    return _iter_arrow_writer(query, params, chunk_rows, cancelled,
+                              lambda sink, schema: pq.ParquetWriter(sink, schema, compression="zstd"))
+
+
+def iter_arrow(query, params=(), chunk_rows=EXPORT_CHUNK_ROWS, cancelled=None):
+    """Yield the result of ``query`` in the Arrow IPC stream format, one record batch per chunk of rows."""
+    import pyarrow as pa
+
+    return _iter_arrow_writer(query, params, chunk_rows, cancelled, pa.ipc.new_stream)
+
+
+# format: (writer, media type, file extension)
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+    "arrow": (iter_arrow, "application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def register_export(query, params=()):
+    """Remember ``query`` for download and return the token its export URL is built from."""
+    token = uuid.uuid4().hex
+    _exports[token] = (query, tuple(params))
+    while len(_exports) > MAX_EXPORTS:
+        _exports.popitem(last=False)
+    return token
+
+
+def export_url(token, export_format):
+    return f"/export/{token}.{export_format}"
+
+
+async def export_endpoint(request):
+    """Starlette endpoint streaming a registered query as /export/<token>.<format>."""
+    from starlette.responses import PlainTextResponse, StreamingResponse
+
+    token, _, export_format = request.path_params["name"].partition(".")
+    if token not in _exports or export_format not in EXPORT_FORMATS:
+        return PlainTextResponse("Unknown export.", status_code=404)
+    query, params = _exports[token]
+    writer, media_type, extension = EXPORT_FORMATS[export_format]
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    # Serializes reading a chunk and closing the generator, which may happen on different threads
+    lock = threading.Lock()
+
+    def read_next():
+        with lock:
+            return next(chunks, None)
+
+    def close():
+        with lock:
+            chunks.close()
+
+    try:
+        # Run the query before the response starts, so a bad query is an error page rather than a broken download;
+        # every chunk is read on the default executor, off the event loop
+        chunks = writer(query, params, cancelled=cancelled)
+        first = await loop.run_in_executor(None, read_next)
+    except (sqlite3.Error, QueryTimeout, ImportError) as e:
+        return PlainTextResponse(f"Export failed: {e}", status_code=400)
+
+    async def body():
+        try:
+            piece = first
+            while piece is not None:
+                yield piece
+                piece = await loop.run_in_executor(None, read_next)
+        finally:
+            # Also reached when the client disconnects: stop the query and close the cursor, without awaiting
+            # here since the task is being cancelled
+            cancelled.set()
+            loop.run_in_executor(None, close)
+
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="query_results.{extension}"'})
@@ -0,0 +1,117 @@
+#guarded execution of ad-hoc SQL from the GUI
+#queries run on a small thread pool, each on its own read-only connection, so a heavy query neither blocks the
+#event loop nor holds the write lock; a progress handler stops it once its time budget is spent or it is
+#cancelled, and at most max_rows rows are returned
+
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import database_operations as db_ops
+
+MAX_WORKERS = 4
+TIME_BUDGET = 10.0  # seconds
+MAX_ROWS = 1000
+# SQLite virtual machine instructions between budget checks
+PROGRESS_STEPS = 10000
+
+
+class QueryTimeout(Exception):
+    """Raised when a query runs past its time budget."""
+
+
+class QueryCancelled(Exception):
+    """Raised when a query is cancelled before it finishes."""
+
+
+def connect_read_only(database_name=None):
+    """A read-only connection that may be used from whichever thread runs the query or streams its rows."""
+    return sqlite3.connect(f"file:{database_name or db_ops.DATABASE_PATH}?mode=ro", uri=True, check_same_thread=False)
+
+
+class QueryService:
+    """Runs ad-hoc queries off the caller's thread with a time budget, a row cap and cancellation.
+
+    ``submit`` returns a job id and a future resolving to ``{"columns", "rows", "truncated", "elapsed"}``;
+    ``run`` awaits the same from an asyncio event loop. Jobs queue once ``max_workers`` queries are running.
+    """
+
+    def __init__(self, database_name=None, max_workers=MAX_WORKERS, time_budget=TIME_BUDGET, max_rows=MAX_ROWS):
+        self.database_name = database_name
+        self.time_budget = time_budget
+        self.max_rows = max_rows
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self._lock = threading.Lock()
+        self._jobs = {}  # job id: (cancel event, connection once running)
+
+    def submit(self, query, params=(), time_budget=None, max_rows=None):
+        """Queue ``query`` and return (job id, future)."""
+        job_id = uuid.uuid4().hex
+        cancelled = threading.Event()
+        with self._lock:
+            self._jobs[job_id] = (cancelled, None)
+        future = self._executor.submit(self._execute, job_id, cancelled, query, tuple(params),
+                                       self.time_budget if time_budget is None else time_budget,
+                                       self.max_rows if max_rows is None else max_rows)
+        return job_id, future
+
+    async def run(self, query, params=(), time_budget=None, max_rows=None, on_submit=None):
+        """Await the result of ``query`` without blocking the event loop; ``on_submit`` receives the job id."""
+        job_id, future = self.submit(query, params, time_budget, max_rows)
+        if on_submit is not None:
+            on_submit(job_id)
+        return await asyncio.wrap_future(future)
+
+    def cancel(self, job_id):
+        """Stop a queued or running job; returns False if it already finished."""
+        # Under the lock, so the worker cannot close the connection while it is being interrupted
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            cancelled, conn = job
+            cancelled.set()
+            if conn is not None:
+                conn.interrupt()
+        return True
+
+    def shutdown(self):
+        """Cancel every job and stop the worker threads."""
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=True)
+
+    def _execute(self, job_id, cancelled, query, params, time_budget, max_rows):
+        start_time = time.monotonic()
+        deadline = start_time + time_budget
+        conn = None
+        try:
+            if cancelled.is_set():
+                raise QueryCancelled("Query was cancelled.")
+            conn = connect_read_only(self.database_name)
+            # A non-zero return aborts the statement with "interrupted"
+            conn.set_progress_handler(lambda: cancelled.is_set() or time.monotonic() > deadline, PROGRESS_STEPS)
+            with self._lock:
+                self._jobs[job_id] = (cancelled, conn)
+            try:
+                cursor = conn.execute(query, params)
+                columns = [column[0] for column in cursor.description or ()]
+                rows = cursor.fetchmany(max_rows + 1)
+            except sqlite3.OperationalError as e:
+                if cancelled.is_set():
+                    raise QueryCancelled("Query was cancelled.") from e
+                if time.monotonic() > deadline:
+                    raise QueryTimeout(f"Query exceeded its time budget of {time_budget} seconds.") from e
+                raise
+            return {"columns": columns, "rows": rows[:max_rows], "truncated": len(rows) > max_rows,
+                    "elapsed": time.monotonic() - start_time}
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            if conn is not None:
+                conn.close()
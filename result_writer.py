@@ -0,0 +1,149 @@
+#write-behind queue for trial results
+#workers enqueue (trial, hyperparameters, metrics) and return straight away;
+#a single writer thread in the parent commits them in grouped transactions
+
+import atexit
+import logging
+import multiprocessing
+import queue
+import sqlite3
+import threading
+import time
+
+import database_operations as db_ops
+from create_database2 import apply_connection_pragmas
+
+_STOP = "__stop__"
+
+
+def enqueue_trial(result_queue, experiment_id, status, start_time, end_time, seed, hyperparameters=None, metrics=None,
+                  trial_id=None):
+    """Hand a finished trial to the writer; arguments mirror database_operations.insert_trial_bundle."""
+    result_queue.put((experiment_id, status, start_time, end_time, seed, hyperparameters, metrics, trial_id))
+
+
+class TrialResultWriter:
+    """Single writer that drains trial results from a queue into SQLite.
+
+    ``queue`` can be passed to joblib/multiprocessing workers (it is a manager queue when ``shared`` is True,
+    a plain in-process queue otherwise). Results are committed in groups of up to ``batch_size`` trials, or
+    whatever has arrived after ``flush_interval`` seconds. ``close()`` (also called on leaving the ``with``
+    block and at interpreter exit) drains every queued result before returning, and raises RuntimeError if
+    the writer thread died so results could not be written.
+    """
+
+    def __init__(self, database_name, batch_size=64, flush_interval=0.5, shared=True):
+        self.database_name = database_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.error = None
+
+        self._manager = multiprocessing.Manager() if shared else None
+        self.queue = self._manager.Queue() if shared else queue.Queue()
+        self._thread = None
+        self._closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="TrialResultWriter", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def submit(self, *trial, **kwargs):
+        """Enqueue a trial from the parent process (same arguments as enqueue_trial without the queue)."""
+        enqueue_trial(self.queue, *trial, **kwargs)
+
+    def close(self):
+        """Flush every queued result, then stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        unwritten = 0
+        try:
+            if self._thread is not None:
+                self.queue.put(_STOP)
+                self._thread.join()
+                atexit.unregister(self.close)
+                if self.error is not None:
+                    # The stop marker is still queued behind whatever the dead thread never took
+                    unwritten = max(self.queue.qsize() - 1, 0)
+        finally:
+            if self._manager is not None:
+                self._manager.shutdown()
+        if self.error is not None:
+            raise RuntimeError(f"Trial result writer stopped early ({unwritten} queued results not written): "
+                               f"{self.error!r}") from self.error
+
+    def _next_batch(self):
+        """Block for the first result, then gather more until the batch is full or the interval passes."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] != _STOP and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, conn, batch):
+        """Commit a group of trials in one transaction; each trial is atomic on its own."""
+        conn.execute("BEGIN")
+        try:
+            for trial in batch:
+                try:
+                    trial_id, _ = db_ops.insert_trial_bundle(*trial, conn=conn)
+                except sqlite3.Error:
+                    raise
+                except Exception as e:
+                    # A malformed result (e.g. a hyperparameter that is not a tuple) fails on its own
+                    logging.error(f"Rejected malformed trial result: {e!r}")
+                    trial_id = None
+                if trial_id is None:
+                    self.failed += 1
+                else:
+                    self.written += 1
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            self.failed += len(batch)
+            logging.error(f"Database error while writing {len(batch)} trial results: {e}")
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.database_name)
+            try:
+                apply_connection_pragmas(conn)
+                stopping = False
+                while not stopping:
+                    batch = self._next_batch()
+                    if batch[-1] == _STOP:
+                        stopping = True
+                        batch.pop()
+                        # Drain anything that raced in behind the stop marker
+                        while True:
+                            try:
+                                batch.append(self.queue.get_nowait())
+                            except queue.Empty:
+                                break
+                    if batch:
+                        self._write_batch(conn, batch)
+            finally:
+                conn.close()
+        except BaseException as e:
+            # Recorded so close() reports the lost results instead of returning as if they were written
+            self.error = e
+            logging.error(f"Trial result writer stopped: {e!r}")
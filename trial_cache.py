@@ -0,0 +1,133 @@
+#content-addressed cache of finished trials
+#a trial spec (dataset version, estimator, hyperparameters, seed) hashes to a key that points at the
+#Trial whose metrics are already in the MLED database, plus an optional pickled model on disk
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+
+CACHE_DIR = ".trial_cache"
+MAX_ENTRIES = 10000
+MAX_BYTES = 1024 ** 3  # artifacts on disk
+
+
+def trial_key(dataset, estimator, estimator_options, params, seed):
+    """Hash the full trial spec into a stable hex key.
+
+    ``dataset`` and ``estimator`` are the registry entries from experiment_runner; only their identifying
+    fields (not the loader/factory callables) go into the hash.
+    """
+    spec = {
+        "dataset": [dataset["name"], dataset["version"], dataset.get("downcast", False)],
+        "estimator": [estimator["name"], estimator["version"]],
+        "options": estimator_options,
+        "params": params,
+        "seed": seed,
+    }
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class TrialCache:
+    """LRU index from trial keys to stored trials, with size-based eviction of model artifacts.
+
+    The index lives in ``<directory>/index.db``; metrics are read from the MLED database itself, so an
+    entry whose trial has been deleted there is treated as a miss and dropped.
+    """
+
+    def __init__(self, database_name, directory=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES,
+                 store_artifacts=False):
+        self.database_name = database_name
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store_artifacts = store_artifacts
+        os.makedirs(os.path.join(directory, "artifacts"), exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"))
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS TrialCache (
+            Cache_Key TEXT PRIMARY KEY,
+            Trial_ID TEXT NOT NULL,
+            Artifact_Path TEXT,
+            Size INTEGER NOT NULL DEFAULT 0,
+            Last_Used REAL NOT NULL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_trialcache_last_used ON TrialCache (Last_Used)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def artifact_path(self, key):
+        """Where a worker should pickle the model for ``key`` (None when artifacts are disabled)."""
+        return os.path.join(self.directory, "artifacts", f"{key}.pkl") if self.store_artifacts else None
+
+    def get(self, key):
+        """Return {metric name: value} for a cached trial, or None on a miss."""
+        row = self.conn.execute("SELECT Trial_ID FROM TrialCache WHERE Cache_Key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        source = sqlite3.connect(self.database_name)
+        try:
+            # Rung scores from successive halving are partial results, not the trial's final metrics
+            metrics = dict(source.execute(
+                "SELECT Name, Value FROM Metric WHERE Trial_ID = ? AND Name NOT LIKE '%\\_rung%' ESCAPE '\\'",
+                (row[0],)).fetchall())
+        finally:
+            source.close()
+
+        if not metrics:
+            self.discard(key)
+            return None
+        self.conn.execute("UPDATE TrialCache SET Last_Used = ? WHERE Cache_Key = ?", (time.time(), key))
+        self.conn.commit()
+        return metrics
+
+    def load_artifact(self, key):
+        """Unpickle the model stored for ``key``, or return None if there is none."""
+        row = self.conn.execute("SELECT Artifact_Path FROM TrialCache WHERE Cache_Key = ?", (key,)).fetchone()
+        if row is None or not row[0] or not os.path.exists(row[0]):
+            return None
+        with open(row[0], "rb") as artifact:
+            return pickle.load(artifact)
+
+    def put(self, key, trial_id):
+        """Record that ``key`` was computed by ``trial_id`` (picking up its artifact if one was written)."""
+        path = self.artifact_path(key)
+        size = os.path.getsize(path) if path and os.path.exists(path) else 0
+        self.conn.execute("INSERT OR REPLACE INTO TrialCache (Cache_Key, Trial_ID, Artifact_Path, Size, Last_Used) VALUES (?, ?, ?, ?, ?)",
+                          (key, trial_id, path if size else None, size, time.time()))
+        self.conn.commit()
+        self.evict()
+
+    def discard(self, key):
+        """Drop one entry and its artifact."""
+        row = self.conn.execute("SELECT Artifact_Path FROM TrialCache WHERE Cache_Key = ?", (key,)).fetchone()
+        self.conn.execute("DELETE FROM TrialCache WHERE Cache_Key = ?", (key,))
+        self.conn.commit()
+        if row and row[0]:
+            try:
+                os.remove(row[0])
+            except OSError as e:
+                logging.error(f"Could not remove cached artifact {row[0]}: {e}")
+
+    def evict(self):
+        """Drop least recently used entries until both the entry and byte limits are met."""
+        while True:
+            count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(Size), 0) FROM TrialCache").fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+            oldest = self.conn.execute("SELECT Cache_Key FROM TrialCache ORDER BY Last_Used LIMIT 1").fetchone()
+            self.discard(oldest[0])
@@ -0,0 +1,77 @@
+import unittest
+import asyncio
+import os
+import sqlite3
+import tempfile
+import database_operations as db_ops
+import async_database_operations as async_db
+
+# Counts 3M generated rows in SQLite, keeping a worker thread busy for a moment
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) SELECT COUNT(*) FROM n"
+
+
+class TestAsyncDatabaseOperations(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, "async.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE User (User_ID TEXT PRIMARY KEY, First_Name TEXT NOT NULL, Last_Name TEXT, "
+                     "Email TEXT UNIQUE NOT NULL, Role TEXT NOT NULL)")
+        conn.commit()
+        conn.close()
+        cls.previous_path = db_ops.DATABASE_PATH
+        db_ops.configure_database(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        async_db.shutdown()
+        db_ops.configure_database(cls.previous_path)
+        cls.directory.cleanup()
+
+    def test_helpers_match_synchronous_versions(self):
+        async def main():
+            await async_db.insert_user("Ada", "Async", "ada_async@example.com", "User")
+            await async_db.update_value("User", "Role", "Admin", "Email", "ada_async@example.com")
+            rows = await async_db.fetch_data("SELECT First_Name, Role FROM User WHERE Email = ?", ("ada_async@example.com",))
+            count = await async_db.count_records("User")
+            options = await async_db.search_options("User", "ada_async")
+            return rows, count, options
+
+        rows, count, options = asyncio.run(main())
+        self.assertEqual(rows, [("Ada", "Admin")])
+        self.assertEqual(count, db_ops.count_records("User"))
+        self.assertEqual(options, db_ops.search_options("User", "ada_async"))
+        self.assertEqual(async_db.fetch_page.__doc__, db_ops.fetch_page.__doc__)
+
+    def test_errors_are_logged_as_before(self):
+        async def main():
+            await async_db.insert_user("", "Doe", "", "Admin")
+
+        with self.assertLogs(level='ERROR') as log:
+            asyncio.run(main())
+        self.assertIn("Error: First name, email, and role are required.", log.output[-1])
+
+    def test_event_loop_serves_others_during_queries(self):
+        """Other coroutines keep running while several database calls are in flight."""
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            results = await asyncio.gather(*(async_db.fetch_data(SLOW_QUERY) for _ in range(4)))
+            task.cancel()
+            return results, ticks
+
+        results, ticks = asyncio.run(main())
+        self.assertEqual(results, [[(3000000,)]] * 4)
+        self.assertGreater(ticks, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import tempfile
+import threading
+from connection_pool import ConnectionPool, PoolTimeout
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        """Create a small pool over a temporary database file."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.directory.name, "pool.db"), size=2, timeout=0.2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def test_connection_is_reused(self):
+        """A connection returned to the pool is handed out again."""
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_nested_checkout_reuses_thread_connection(self):
+        """Nested checkouts on one thread share the same connection."""
+        with self.pool.connection() as outer:
+            with self.pool.connection() as inner:
+                self.assertIs(outer, inner)
+
+    def test_threads_get_distinct_connections(self):
+        """Concurrent threads never share a checked-out connection."""
+        seen = []
+        barrier = threading.Barrier(2)
+
+        def worker():
+            with self.pool.connection() as conn:
+                barrier.wait()
+                seen.append(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(seen[0], seen[1])
+
+    def test_pool_size_is_enforced(self):
+        """Checking out more connections than the pool size times out."""
+        release = threading.Event()
+        holding = threading.Barrier(3)
+
+        def holder():
+            with self.pool.connection():
+                holding.wait()
+                release.wait()
+
+        threads = [threading.Thread(target=holder) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        holding.wait()
+        try:
+            with self.assertRaises(PoolTimeout):
+                with self.pool.connection():
+                    pass
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+
+    def test_broken_connection_is_replaced(self):
+        """An idle connection that fails its health check is swapped for a new one."""
+        self.pool.health_check_interval = 0
+        with self.pool.connection() as first:
+            pass
+        first.close()
+        with self.pool.connection() as second:
+            self.assertIsNot(first, second)
+            self.assertEqual(second.execute("SELECT 1").fetchone()[0], 1)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        """Uncommitted work does not leak to the next borrower."""
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS Items (id INTEGER)")
+            conn.commit()
+            conn.execute("INSERT INTO Items VALUES (1)")
+        with self.pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM Items").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 import sqlite3
-from create_database2 import create_database2
+from create_database2 import create_database2, migrate_database, INDEXES, CHANGE_TRACKED_TABLES
+from database_operations import EXPERIMENTS_BY_AUTHOR_QUERY, LATEST_EXPERIMENT_QUERY, ACTIVE_EXPERIMENTS_QUERY
+import os
+import tempfile
 
 class TestCreateDatabase(unittest.TestCase):
 
@@ -251,6 +254,91 @@ class TestCreateDatabase(unittest.TestCase):
         result = self.cursor.fetchall()
         self.assertEqual(len(result), 0, "Cascade delete failed: Metrics were not deleted when Trial was removed.")
 
+    def query_plan(self, query, params=()):
+        """Return the EXPLAIN QUERY PLAN detail lines for a query."""
+        self.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in self.cursor.fetchall()]
+
+    def assert_uses_index(self, query, index_name, params=()):
+        plan = self.query_plan(query, params)
+        self.assertTrue(any(index_name in detail for detail in plan),
+                        f"Expected {index_name} in query plan: {plan}")
+
+    def test_indexes_exist(self):
+        """Check that every secondary index was created."""
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='index';")
+        existing_indexes = {row[0] for row in self.cursor.fetchall()}
+        self.assertTrue(set(INDEXES).issubset(existing_indexes), f"Missing indexes: {set(INDEXES) - existing_indexes}")
+
+    def test_experiments_by_author_uses_index(self):
+        """fetch_experiments_by_author should search the Author_ID index."""
+        self.assert_uses_index(EXPERIMENTS_BY_AUTHOR_QUERY, "idx_experiment_author", ("author",))
+
+    def test_latest_experiment_uses_index(self):
+        """get_latest_experiment should walk the StartTimeStamp index instead of sorting."""
+        self.assert_uses_index(LATEST_EXPERIMENT_QUERY, "idx_experiment_start")
+        self.assertFalse(any("TEMP B-TREE" in detail for detail in self.query_plan(LATEST_EXPERIMENT_QUERY)))
+
+    def test_active_experiments_uses_index(self):
+        """get_active_experiments should search the Status index."""
+        self.assert_uses_index(ACTIVE_EXPERIMENTS_QUERY, "idx_experiment_status")
+
+    def test_etl_joins_use_indexes(self):
+        """The ETL joins from Experiment down to trial children should search the foreign key indexes."""
+        query = """
+        SELECT * FROM Experiment e
+        LEFT JOIN Trial t ON e.Experiment_ID = t.Experiment_ID
+        LEFT JOIN Hyperparameter hp ON t.Trial_ID = hp.Trial_ID
+        LEFT JOIN Metric mt ON t.Trial_ID = mt.Trial_ID
+        LEFT JOIN ErrorLog el ON t.Trial_ID = el.Trial_ID
+        """
+        for index_name in ("idx_trial_experiment", "idx_hyperparameter_trial", "idx_metric_trial", "idx_errorlog_trial"):
+            self.assert_uses_index(query, index_name)
+
+    def test_changes_are_recorded_in_change_log(self):
+        """Updates to tracked tables, and inserts and deletes of experiment rows, append to ChangeLog."""
+        self.cursor.execute("INSERT INTO User VALUES ('u1', 'Ada', 'Lovelace', 'ada@example.com', 'admin')")
+        self.cursor.execute("INSERT INTO Dataset VALUES ('d1', 'Iris', 1, 'iris', '/data/iris', 150)")
+        self.cursor.execute("INSERT INTO Model VALUES ('m1', 'MLP', 'NN', 1, '{}', NULL)")
+        self.assertEqual(self.cursor.execute("SELECT COUNT(*) FROM ChangeLog").fetchone()[0], 0)
+        self.cursor.execute("INSERT INTO Experiment VALUES ('e1', 'exp', 'u1', 'desc', '2020-01-01', '2020-01-02', 'running', 'm1', 'd1')")
+        self.cursor.execute("INSERT INTO Trial VALUES ('t1', 'e1', 'completed', '2020-01-01', '2020-01-01', 42)")
+        self.cursor.execute("UPDATE Experiment SET Status = 'completed' WHERE Experiment_ID = 'e1'")
+        self.cursor.execute("DELETE FROM Trial WHERE Trial_ID = 't1'")
+        self.assertEqual(self.cursor.execute("SELECT Table_Name, Row_ID, Operation, Experiment_ID FROM ChangeLog").fetchall(),
+                         [("Experiment", 1, "INSERT", None), ("Trial", 1, "INSERT", None),
+                          ("Experiment", 1, "UPDATE", None), ("Trial", 1, "DELETE", "e1")])
+
+    def test_migrate_existing_database(self):
+        """Migrating a database created without indexes adds them and enables WAL."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "legacy.db")
+            legacy = sqlite3.connect(path)
+            legacy.execute("CREATE TABLE Experiment (Experiment_ID TEXT PRIMARY KEY, Author_ID TEXT, Model_ID TEXT, DataSet_ID TEXT, Status TEXT, StartTimeStamp DATETIME)")
+            for table in ("Trial", "Metric", "Hyperparameter", "ErrorLog"):
+                legacy.execute(f"CREATE TABLE {table} (Trial_ID TEXT, Experiment_ID TEXT)")
+            for table in ("User", "Dataset", "Model"):
+                legacy.execute(f"CREATE TABLE {table} ({table}_ID TEXT PRIMARY KEY, Name TEXT)")
+            # A change log from before inserts and deletes were tracked
+            legacy.execute("CREATE TABLE ChangeLog (Change_Seq INTEGER PRIMARY KEY AUTOINCREMENT, Table_Name TEXT NOT NULL, "
+                           "Row_ID INTEGER NOT NULL, ChangedAt DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            legacy.commit()
+            legacy.close()
+
+            migrate_database(path)
+
+            conn = sqlite3.connect(path)
+            try:
+                indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+                self.assertTrue(set(INDEXES).issubset(indexes))
+                triggers = {row[0] for row in conn.execute("SELECT tbl_name FROM sqlite_master WHERE type='trigger'")}
+                self.assertEqual(triggers, set(CHANGE_TRACKED_TABLES))
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(ChangeLog)")]
+                self.assertEqual(columns[-2:], ["Operation", "Experiment_ID"])
+                self.assertEqual(conn.execute("PRAGMA journal_mode;").fetchone()[0], "wal")
+            finally:
+                conn.close()
+
 
 if __name__ == "__main__":
     unittest.main()
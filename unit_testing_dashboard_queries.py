@@ -0,0 +1,122 @@
+import unittest
+import duckdb
+import pandas as pd
+import dashboard_queries as queries
+from etl_aggregates import AGGREGATE_QUERIES
+
+METRIC_NAMES = ["accuracy", "loss", "f1", "precision", "recall"]
+
+
+def create_synthetic_flat_table(conn, count, rows_per_experiment=100000):
+    """A flat table of ``count`` rows: 10 rows per trial, each metric point repeated for 2 hyperparameters."""
+    conn.execute(f"""
+        CREATE TABLE experiment_flat AS
+        SELECT 'e' || (i // {rows_per_experiment}) AS Experiment_ID,
+               'experiment ' || (i // {rows_per_experiment} % 50) AS Experiment_Name,
+               'm' || (i // {rows_per_experiment} % 7) AS Model_ID,
+               'dataset ' || (i // {rows_per_experiment} % 3) AS Dataset_Name, 1 AS Dataset_Version, 1000 AS Dataset_Size,
+               't' || (i // 10) AS Trial_ID,
+               ['alpha', 'max_iter'][i % 2 + 1] AS Hyperparameter_Type, (i // 10 % 5)::VARCHAR AS Hyperparameter_Value,
+               'mt' || (i // 2) AS Metric_ID, {METRIC_NAMES}[i // 2 % 5 + 1] AS Metric_Name,
+               (i // 2 % 97) / 97 AS Metric_Value,
+               (TIMESTAMP '2025-01-01' + to_seconds(i // 2))::VARCHAR AS Metric_Timestamp
+        FROM range({count}) t(i)
+    """)
+
+
+def materialize_aggregates(conn):
+    for table in ("agg_experiment", "agg_metric_series", "agg_hyperparameter_metric"):
+        conn.execute(f"CREATE TABLE {table} AS {AGGREGATE_QUERIES[table].format(flat_table='experiment_flat')}")
+
+
+class TestDashboardQueries(unittest.TestCase):
+
+    def setUp(self):
+        """A 20,000-row flat table with 4 experiments, two of them named 'experiment 1'."""
+        self.conn = duckdb.connect(":memory:")
+        create_synthetic_flat_table(self.conn, 20000, rows_per_experiment=5000)
+        self.conn.execute("UPDATE experiment_flat SET Experiment_Name = 'experiment 1' WHERE Experiment_ID = 'e3'")
+        self.df = self.conn.execute("SELECT * FROM experiment_flat").fetchdf()
+        self.selected = ["e1", "e3"]
+
+    def tearDown(self):
+        self.conn.close()
+
+    def check_against_pandas(self):
+        df = self.df[self.df["Experiment_ID"].isin(self.selected)]
+        self.assertEqual(queries.experiment_counts(self.conn, self.selected),
+                         (df["Trial_ID"].nunique(), df["Model_ID"].nunique()))
+        self.assertEqual(queries.metric_names(self.conn, self.selected), sorted(df["Metric_Name"].unique()))
+        means = queries.hyperparameter_means(self.conn, "alpha", self.selected)
+        expected = df[df["Hyperparameter_Type"] == "alpha"].groupby("Hyperparameter_Value")["Metric_Value"].mean()
+        self.assertEqual(means["Hyperparameter_Value"].tolist(), expected.index.tolist())
+        for value, mean in zip(means["Metric_Value"], expected):
+            self.assertAlmostEqual(value, mean)
+        series = queries.metric_series(self.conn, "loss", 4, self.selected)
+        points = df[df["Metric_Name"] == "loss"].drop_duplicates("Metric_ID")
+        minutes = pd.to_datetime(points["Metric_Timestamp"]).dt.floor("min")
+        seconds = (minutes - minutes.min()).dt.total_seconds()
+        expected = points.groupby((seconds // (seconds.max() / 4)).clip(upper=3))["Metric_Value"].mean()
+        self.assertEqual(len(series), len(expected))
+        for value, mean in zip(series["Metric_Value"], expected):
+            self.assertAlmostEqual(value, mean)
+
+    def test_queries_over_flat_table(self):
+        """Without the summary tables the same results are computed from experiment_flat."""
+        self.check_against_pandas()
+
+    def test_queries_over_summary_tables(self):
+        """The summary tables give the same results as the flat table."""
+        materialize_aggregates(self.conn)
+        self.check_against_pandas()
+
+    def test_mean_series_is_bounded(self):
+        """The mean series has at most ``buckets`` rows however many minutes the selection spans."""
+        minutes = pd.to_datetime(self.df["Metric_Timestamp"]).dt.floor("min").nunique()
+        for buckets in (1, 10, 50):
+            series = queries.metric_series(self.conn, "loss", buckets)
+            self.assertLess(buckets, minutes)
+            self.assertLessEqual(len(series), buckets)
+            self.assertTrue(series["Metric_Timestamp"].is_monotonic_increasing)
+
+    def test_trial_series_is_downsampled_per_trial(self):
+        """Each trial's points are reduced to min/max/mean per bucket of the selection's time range."""
+        series = queries.trial_metric_series(self.conn, "loss", 4, ["e1"], max_trials=3)
+        points = self.df[(self.df["Experiment_ID"] == "e1") & (self.df["Metric_Name"] == "loss")].drop_duplicates("Metric_ID")
+        seconds = pd.to_datetime(points["Metric_Timestamp"]).astype("int64") // 10**9
+        width = (seconds.max() - seconds.min()) / 4
+        points = points.assign(bucket=((seconds - seconds.min()) // width).clip(upper=3))
+        trials = points.groupby("Trial_ID").size().sort_index(kind="stable").sort_values(ascending=False, kind="stable").index[:3]
+        expected = points[points["Trial_ID"].isin(trials)].groupby(["Trial_ID", "bucket"])["Metric_Value"].agg(["min", "max", "mean"])
+        self.assertEqual(series["Trial_ID"].nunique(), 3)
+        self.assertEqual(len(series), len(expected))
+        for (_, row), (_, values) in zip(series.iterrows(), expected.iterrows()):
+            self.assertAlmostEqual(row["Min_Value"], values["min"])
+            self.assertAlmostEqual(row["Max_Value"], values["max"])
+            self.assertAlmostEqual(row["Mean_Value"], values["mean"])
+
+    def test_downsampled_series_is_bounded(self):
+        """20,000 per-step points of 10 trials reduce to at most buckets x trials rows."""
+        self.conn.execute("""
+            CREATE TABLE fact_metric AS
+            SELECT 'mt' || i AS Metric_ID, 't' || (i // 2000) AS Trial_ID, 'e0' AS Experiment_ID, 'loss' AS Metric_Name,
+                   1 / (1 + i % 2000) AS Metric_Value, (TIMESTAMP '2025-01-01' + to_seconds(i % 2000))::VARCHAR AS Metric_Timestamp
+            FROM range(20000) t(i)
+        """)
+        series = queries.trial_metric_series(self.conn, "loss", 50, ["e0"], max_trials=5)
+        self.assertEqual(len(series), 50 * 5)
+        self.assertEqual(series["Points"].sum(), 5 * 2000)
+        self.assertEqual(series["Max_Value"].max(), 1)
+
+    def test_all_experiments_and_datasets(self):
+        """experiment_ids of None selects everything; only the dataset columns present are returned."""
+        self.assertEqual(queries.experiment_counts(self.conn), (2000, 4))
+        self.assertEqual(len(queries.list_experiments(self.conn)), 4)
+        datasets = queries.datasets(self.conn, ["Dataset_Name", "Dataset_Version", "Missing"], ["e1"])
+        self.assertEqual(datasets.values.tolist(), [["dataset 1", 1]])
+        self.assertIsNone(queries.datasets(self.conn, ["Missing"]))
+        self.assertIsNone(queries.trials(self.conn))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 import unittest
+import os
+import sqlite3
+import tempfile
 from database_operations import *
+from database_operations import _page_queries
 import time
 
 class TestDatabaseOperations(unittest.TestCase):
@@ -175,6 +179,223 @@ class TestDatabaseOperations(unittest.TestCase):
         result = get_active_experiments()
         self.assertIsInstance(result, list)
 
+    def test_insert_metrics_many_success(self):
+        """Test inserting a batch of metrics in one call."""
+        rows = [("bulk-trial-uuid", "loss", epoch / 10, "2024-02-12 15:00:00") for epoch in range(50)]
+        ids, failures = insert_metrics_many(rows)
+        self.assertEqual(len(ids), 50)
+        self.assertEqual(failures, [])
+        result = fetch_data("SELECT COUNT(*) FROM Metric WHERE Metric_ID IN (?, ?)", (ids[0], ids[-1]))
+        self.assertEqual(result[0][0], 2)
+
+    def test_insert_metrics_many_reports_invalid_rows(self):
+        """Test that invalid rows are reported without aborting the rest of the batch."""
+        rows = [
+            ("bulk-trial-uuid", "accuracy", 0.9, "2024-02-12 15:00:00"),
+            ("", "accuracy", 0.8, "2024-02-12 15:00:00"),
+            ("bulk-trial-uuid", "accuracy", None, "2024-02-12 15:00:00"),
+            ("bulk-trial-uuid", "accuracy", 0.0, "2024-02-12 15:00:00"),
+            ("bulk-trial-uuid", "accuracy"),
+        ]
+        with self.assertLogs(level='ERROR'):
+            ids, failures = insert_metrics_many(rows)
+        self.assertEqual(len(ids), 2)
+        self.assertEqual([index for index, _ in failures], [1, 2, 4])
+        self.assertIn("Error: Trial ID, name, value, and timestamp are required.", failures[0][1])
+
+    def test_insert_metrics_many_keeps_rows_around_a_duplicate(self):
+        """A row the database rejects is reported by its index while the rest of the batch is inserted."""
+        previous_path = DATABASE_PATH
+        with tempfile.TemporaryDirectory() as directory:
+            conn = sqlite3.connect(os.path.join(directory, "duplicates.db"))
+            conn.execute("CREATE TABLE Metric (Metric_ID TEXT PRIMARY KEY, Trial_ID TEXT NOT NULL, Name TEXT NOT NULL, "
+                         "Value INTEGER NOT NULL, TimeStamp DATETIME NOT NULL, UNIQUE (Trial_ID, Name, TimeStamp))")
+            conn.close()
+            configure_database(os.path.join(directory, "duplicates.db"))
+            try:
+                rows = [("trial", "loss", epoch / 10, f"2024-02-12 15:00:0{epoch}") for epoch in range(5)]
+                rows.insert(3, ("trial", "loss", 0.9, "2024-02-12 15:00:01"))
+                rows.insert(1, ("", "loss", 0.9, "2024-02-12 15:00:09"))
+                with self.assertLogs(level='ERROR') as log:
+                    ids, failures = insert_metrics_many(rows)
+                self.assertEqual(len(ids), 5)
+                self.assertEqual([index for index, _ in failures], [1, 4])
+                self.assertIn("UNIQUE constraint failed", failures[1][1])
+                self.assertIn("Row 4 rejected", log.output[-1])
+                self.assertEqual(fetch_data("SELECT COUNT(*) FROM Metric")[0][0], 5)
+            finally:
+                configure_database(previous_path)
+
+    def test_insert_trial_bundle_success(self):
+        """Test inserting a trial with its hyperparameters and metrics in one transaction."""
+        trial_id, failures = insert_trial_bundle("experiment-uuid", "completed", "2024-02-12 12:00:00",
+                                                 "2024-02-12 14:00:00", 42,
+                                                 hyperparameters={"C": 1.0, "kernel": "rbf"},
+                                                 metrics={"accuracy": 0.9, "f1": 0.85})
+        self.assertIsNotNone(trial_id)
+        self.assertEqual(failures, {"Trial": [], "Hyperparameter": [], "Metric": []})
+        self.assertEqual(fetch_data("SELECT COUNT(*) FROM Hyperparameter WHERE Trial_ID = ?", (trial_id,))[0][0], 2)
+        self.assertEqual(fetch_data("SELECT COUNT(*) FROM Metric WHERE Trial_ID = ?", (trial_id,))[0][0], 2)
+
+    def test_insert_trial_bundle_invalid_trial(self):
+        """Test that a bundle with an invalid trial inserts nothing."""
+        with self.assertLogs(level='ERROR'):
+            trial_id, failures = insert_trial_bundle("", "completed", "2024-02-12 12:00:00", "2024-02-12 14:00:00", 42,
+                                                     metrics={"accuracy": 0.9})
+        self.assertIsNone(trial_id)
+        self.assertEqual(len(failures["Trial"]), 1)
+
+    def test_search_options(self):
+        """Test that dropdown options are searched by label or id prefix and refreshed after a write."""
+        insert_model("search_model_50%", "cnn", 1, "{}", "s3://models")
+        options = search_options("Model", "model_50%")
+        self.assertEqual([label for _, label in options], ["search_model_50%"])
+        self.assertEqual(search_options("Model", options[0][0][:8])[0], options[0])
+        self.assertEqual(search_options("Model", "model_5_%"), [])
+        self.assertLessEqual(len(search_options("Model", "", limit=1)), 1)
+
+        self.assertEqual(search_options("Model", "search_model_51"), [])
+        insert_model("search_model_51", "cnn", 1, "{}", "s3://models")
+        self.assertEqual(len(search_options("Model", "search_model_51")), 1)
+
+    def test_update_and_delete_report_affected_rows(self):
+        """Test that single-row updates and deletes return how many rows the statement changed."""
+        insert_user("Rowcount", "Test", "rowcount@example.com", "User")
+        self.assertEqual(update_value("User", "Role", "Admin", "Email", "rowcount@example.com"), 1)
+        self.assertEqual(delete_row("User", "Email", "rowcount@example.com"), 1)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(delete_row("User", "Email", "rowcount@example.com"), 0)
+
+    def test_update_many_and_delete_many(self):
+        """Test bulk updates and deletes by key, reporting the keys no record was found for."""
+        ids, _ = insert_trials_many([("bulk-experiment-uuid", "running", "2024-02-12 12:00:00",
+                                      "2024-02-12 14:00:00", seed) for seed in range(5)])
+        with self.assertLogs(level='ERROR') as log:
+            missing = update_many("Trial", "Status", "completed", "Trial_ID", ids[:3] + ["missing-trial"])
+        self.assertEqual(missing, ["missing-trial"])
+        self.assertIn("Update failed: No record found in Trial for 1 Trial_ID values: missing-trial", log.output[-1])
+        statuses = fetch_data(f"SELECT Status FROM Trial WHERE Trial_ID IN ({', '.join('?' for _ in ids)}) ORDER BY Seed", ids)
+        self.assertEqual([row[0] for row in statuses], ["completed"] * 3 + ["running"] * 2)
+
+        with self.assertLogs(level='ERROR'):
+            self.assertIsNone(update_many("Trial", "Status", None, "Trial_ID", ids))
+        self.assertEqual(fetch_data("SELECT COUNT(*) FROM Trial WHERE Status IS NULL")[0][0], 0)
+
+        self.assertEqual(delete_many("Trial", "Trial_ID", ids), [])
+        self.assertEqual(fetch_data(f"SELECT COUNT(*) FROM Trial WHERE Trial_ID IN ({', '.join('?' for _ in ids)})", ids)[0][0], 0)
+
+    def test_update_many_on_condition_column(self):
+        """Test that updating the condition column itself does not report the updated keys as missing."""
+        insert_user("BulkFink", "Test", "bulkfink@example.com", "User")
+        insert_user("BulkBob", "Test", "bulkbob@example.com", "User")
+        missing = update_many("User", "First_Name", "BulkZed", "First_Name", ["BulkFink", "BulkBob"])
+        self.assertEqual(missing, [])
+        result = fetch_data("SELECT First_Name FROM User WHERE Email IN (?, ?)", ("bulkfink@example.com", "bulkbob@example.com"))
+        self.assertEqual([row[0] for row in result], ["BulkZed", "BulkZed"])
+
+    def test_bulk_keys_follow_column_affinity(self):
+        """Test that keys match as they would in a single WHERE column = ?, e.g. '123457' against an INTEGER column."""
+        insert_dataset("affinity_dataset", 1, "Description", "Storage/Path", 123457)
+        self.assertEqual(update_many("Dataset", "Version", 2, "Size", ["123457", 987654321]), [987654321])
+        self.assertEqual(fetch_data("SELECT Version FROM Dataset WHERE Name = 'affinity_dataset'"), [(2,)])
+        self.assertEqual(delete_many("Dataset", "Size", ["123457"]), [])
+        self.assertEqual(fetch_data("SELECT COUNT(*) FROM Dataset WHERE Name = 'affinity_dataset'")[0][0], 0)
+
+    def test_delete_many_by_id(self):
+        """Deleting 10,000 trials by id in one call, more ids than SQLite binds in one statement."""
+        ids, _ = insert_trials_many([("bulk-delete-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 14:00:00", seed)
+                                     for seed in range(10000)])
+        self.assertEqual(delete_many("Trial", "Trial_ID", ids), [])
+        self.assertEqual(fetch_data("SELECT COUNT(*) FROM Trial WHERE Experiment_ID = 'bulk-delete-uuid'")[0][0], 0)
+
+
+class TestPagination(unittest.TestCase):
+    """Keyset pages over a 1M-row Metric table in a separate database."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, "pages.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE Metric (Metric_ID TEXT PRIMARY KEY, Trial_ID TEXT NOT NULL, Name TEXT NOT NULL, "
+                     "Value INTEGER NOT NULL, TimeStamp DATETIME NOT NULL, Note TEXT)")
+        conn.executemany("INSERT INTO Metric VALUES (?, ?, ?, ?, ?, ?)",
+                         ((f"m{i:07}", f"t{i // 100}", "loss", i % 97, "2024-02-12 15:00:00", None if i % 3 else "x")
+                          for i in range(1000000)))
+        conn.execute("CREATE INDEX idx_metric_value ON Metric (Value)")
+        conn.execute("CREATE INDEX idx_metric_note ON Metric (Note)")
+        conn.execute("CREATE INDEX idx_metric_partial ON Metric (Trial_ID) WHERE Note IS NOT NULL")
+        conn.commit()
+        conn.close()
+        cls.previous_path = DATABASE_PATH
+        configure_database(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        configure_database(cls.previous_path)
+        cls.directory.cleanup()
+
+    def walk(self, sort_column, pages):
+        rows, keys, more = fetch_page("Metric", sort_column, page_size=10)
+        walked = [rows]
+        for _ in range(pages - 1):
+            rows, keys, more = fetch_page("Metric", sort_column, after=keys[-1], page_size=10)
+            walked.append(rows)
+        return walked, keys, more
+
+    def test_pages_follow_sort_order(self):
+        """Next pages continue the sort order, including NULL sort values, and previous pages return to them."""
+        for sort_column in (None, "Metric_ID", "Value", "Note"):
+            walked, keys, more = self.walk(sort_column, 3)
+            self.assertTrue(more)
+            expected = fetch_data(f"SELECT * FROM Metric ORDER BY {sort_column or 'rowid'}, rowid LIMIT 30")
+            self.assertEqual(sum(walked, []), expected, sort_column)
+            rows, _, more = fetch_page("Metric", sort_column, before=fetch_page("Metric", sort_column, after=keys[-1], page_size=10)[1][0], page_size=10)
+            self.assertEqual(rows, walked[-1])
+            self.assertTrue(more)
+
+    def test_invalid_names_are_rejected(self):
+        """Table and column names are checked against the schema before they reach the SQL."""
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(fetch_page("Metric", "Value; DROP TABLE Metric"), ([], [], False))
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(fetch_page("Metric\" --", None), ([], [], False))
+        self.assertEqual(estimate_row_count("Missing"), 0)
+
+    def test_only_indexed_columns_sort(self):
+        """Columns without a full index would sort the whole table for every page, so they are refused."""
+        self.assertEqual(get_sort_columns("Metric"), ["Metric_ID", "Value", "Note"])
+        self.assertEqual(get_sort_columns("Missing"), [])
+        for sort_column in ("Name", "Trial_ID"):
+            with self.assertLogs(level='ERROR') as log:
+                self.assertEqual(fetch_page("Metric", sort_column), ([], [], False))
+            self.assertIn(f"Column {sort_column} of table Metric has no index to sort by", log.output[-1])
+
+    def test_pages_search_the_index(self):
+        """Every next and previous page query, on either side of the NULL sort values, is an index range search."""
+        keys = {None: [("m0000500", 501)], "Metric_ID": [("m0000500", 501)], "Value": [(50, 501)],
+                "Note": [(None, 501), ("x", 501)]}
+        for sort_column, column_keys in keys.items():
+            nullable = sort_column == "Note"
+            for key in column_keys:
+                for direction in ("after", "before"):
+                    for query, params in _page_queries("Metric", sort_column, **{direction: key}, nullable=nullable):
+                        plan = [row[3] for row in fetch_data(f"EXPLAIN QUERY PLAN {query}", params + (10,))]
+                        self.assertEqual(len(plan), 1, (sort_column, key, direction, plan))
+                        self.assertTrue(plan[0].startswith("SEARCH Metric USING"), (sort_column, key, direction, plan))
+
+    def test_page_and_count_plans(self):
+        """Row count estimate and pages deep into 1M rows in both directions, planned as index searches."""
+        self.assertEqual(estimate_row_count("Metric"), 1000000)
+        for direction in ("after", "before"):
+            rows, keys, more = fetch_page("Metric", "Metric_ID", **{direction: ("m0900000", 900001)}, page_size=100)
+            self.assertEqual(rows[0][0], "m0900001" if direction == "after" else "m0899900")
+            self.assertTrue(more)
+            for query, params in _page_queries("Metric", "Metric_ID", **{direction: ("m0900000", 900001)}):
+                plan = " ".join(row[3] for row in fetch_data(f"EXPLAIN QUERY PLAN {query}", params + (100,)))
+                self.assertIn("USING INDEX", plan)
+                self.assertNotIn("SCAN", plan)
+
     import time
 
 def test_bulk_insert_performance(self):
@@ -0,0 +1,65 @@
+import unittest
+import os
+import pickle
+import tempfile
+from unittest import mock
+import numpy as np
+import dataset_staging
+from dataset_staging import stage_dataset
+
+class TestDatasetStaging(unittest.TestCase):
+
+    def test_arrays_round_trip_as_read_only_maps(self):
+        """Staged arrays load back unchanged as read-only memory maps."""
+        X = np.random.rand(100, 5)
+        y = np.arange(100)
+        with stage_dataset(X=X, y=y) as staged:
+            X_loaded, y_loaded = staged.load()
+            self.assertIsInstance(X_loaded, np.memmap)
+            self.assertFalse(X_loaded.flags.writeable)
+            np.testing.assert_array_equal(X_loaded, X)
+            np.testing.assert_array_equal(y_loaded, y)
+
+    def test_handle_pickles_small(self):
+        """Only paths are pickled when the handle is sent to a worker."""
+        X = np.random.rand(20000, 50)
+        with stage_dataset(X=X) as staged:
+            self.assertLess(len(pickle.dumps(staged)), 1000)
+            self.assertGreaterEqual(staged.nbytes(), X.nbytes)
+
+    def test_downcast_and_object_labels(self):
+        """float64 data is downcast on request and object labels become strings."""
+        X = np.random.rand(10, 3)
+        y = np.array(["0", "1"] * 5, dtype=object)
+        with stage_dataset(downcast=True, X=X, y=y) as staged:
+            X_loaded, y_loaded = staged.load()
+            self.assertEqual(X_loaded.dtype, np.float32)
+            self.assertEqual(list(y_loaded), list(y))
+
+    def test_files_removed_after_block(self):
+        """The staging directory is deleted when the block exits."""
+        with stage_dataset(X=np.zeros(3)) as staged:
+            directory = staged.directory
+            self.assertTrue(os.path.isdir(directory))
+        self.assertFalse(os.path.exists(directory))
+
+    def test_falls_back_when_shared_memory_is_full(self):
+        """Arrays larger than the free shared memory are staged in the system temporary directory."""
+        full = mock.Mock(return_value=mock.Mock(free=100))
+        with mock.patch.object(dataset_staging, "SHARED_MEMORY_DIR", tempfile.gettempdir() + os.sep + "shm"), \
+                mock.patch.object(dataset_staging.shutil, "disk_usage", full):
+            with stage_dataset(X=np.zeros(1000)) as staged:
+                self.assertEqual(os.path.dirname(staged.directory), tempfile.gettempdir())
+
+    def test_maps_of_earlier_stagings_are_dropped(self):
+        """A process (such as a reused worker) keeps the memory maps of the last staging it opened only."""
+        with stage_dataset(X=np.zeros(3)) as first:
+            first.load()
+            with stage_dataset(X=np.ones(3)) as second:
+                second.load()
+                self.assertEqual(list(dataset_staging._opened), [second.directory])
+        self.assertEqual(dataset_staging._opened, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,528 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+import duckdb
+import pandas as pd
+from create_database2 import create_database2
+from etl_common import (extract_all, extract_changes, read_watermarks, write_watermarks, ensure_flat_table, upsert_flat_rows,
+                        add_composite_key, CompositeKeyCollision, stream_extraction, stage_chunk, load_staged,
+                        SOURCE_TABLES, extraction_shards, extract_table, join_in_duckdb, bump_load_version,
+                        read_load_version, prune_change_log, deleted_experiments, load_batch)
+from etl_star_schema import load_star_schema
+from etl_aggregates import AGGREGATE_TABLES, AGGREGATE_QUERIES, drop_aggregate_tables
+from etl_parquet_export import export_experiments, parquet_source, read_lake_version
+import ETL_pipeline_hourly_extraction as hourly
+
+class TestIncrementalExtraction(unittest.TestCase):
+
+    def setUp(self):
+        """Create a small MLED schema in memory with one experiment and one trial."""
+        self.conn = sqlite3.connect(":memory:")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            create_database2(conn=self.conn)
+        self.conn.execute("INSERT INTO User VALUES ('u1', 'Ada', 'Lovelace', 'ada@example.com', 'admin')")
+        self.conn.execute("INSERT INTO Dataset VALUES ('d1', 'Iris', 1, 'iris', '/data/iris', 150)")
+        self.conn.execute("INSERT INTO Model VALUES ('m1', 'MLP', 'NN', 1, '{}', NULL)")
+        self.add_experiment("e1")
+        self.add_trial("t1", "e1")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def add_experiment(self, experiment_id):
+        self.conn.execute("INSERT INTO Experiment VALUES (?, 'exp', 'u1', 'desc', '2020-01-01', '2020-01-02', 'completed', 'm1', 'd1')",
+                          (experiment_id,))
+
+    def add_trial(self, trial_id, experiment_id):
+        self.conn.execute("INSERT INTO Trial VALUES (?, ?, 'completed', '2020-01-01', '2020-01-01', 42)", (trial_id, experiment_id))
+
+    def add_metric(self, metric_id, trial_id, value):
+        self.conn.execute("INSERT INTO Metric VALUES (?, ?, 'accuracy', ?, '2020-01-01')", (metric_id, trial_id, value))
+
+    def test_first_run_extracts_everything(self):
+        """With no stored watermarks every row is new."""
+        df, high_marks = extract_changes(self.conn, {})
+        full, full_marks = extract_all(self.conn)
+        self.assertEqual(len(df), len(full))
+        self.assertEqual(high_marks, full_marks)
+        self.assertEqual(high_marks["Trial"], 1)
+
+    def test_only_new_rows_since_watermark(self):
+        """A metric appended to an old experiment's trial is picked up; untouched experiments are not."""
+        _, marks = extract_changes(self.conn, {})
+        self.add_experiment("e2")
+        self.add_trial("t2", "e2")
+        self.conn.commit()
+        _, marks = extract_changes(self.conn, {})
+        self.add_metric("mt1", "t1", 0.9)
+        self.conn.commit()
+
+        df, new_marks = extract_changes(self.conn, marks)
+        self.assertEqual(df["Metric_ID"].tolist(), ["mt1"])
+        self.assertEqual(new_marks["Metric"], marks["Metric"] + 1)
+
+        df, _ = extract_changes(self.conn, new_marks)
+        self.assertTrue(df.empty)
+
+    def test_updates_are_extracted_through_change_log(self):
+        """Updating a row re-extracts the flat rows that depend on it."""
+        _, marks = extract_changes(self.conn, {})
+        self.conn.execute("UPDATE Experiment SET Status = 'archived' WHERE Experiment_ID = 'e1'")
+        self.conn.commit()
+
+        df, new_marks = extract_changes(self.conn, marks)
+        self.assertEqual(df["Experiment_Status"].tolist(), ["archived"])
+        self.assertEqual(new_marks["ChangeLog"], marks["ChangeLog"] + 1)
+
+    def test_dimension_updates_reextract_their_experiments(self):
+        """Renaming a user, dataset or model re-extracts the experiments that reference it, and no others."""
+        self.conn.execute("INSERT INTO Model VALUES ('m2', 'CNN', 'NN', 1, '{}', NULL)")
+        self.conn.execute("INSERT INTO Experiment VALUES ('e2', 'exp', 'u1', 'desc', '2020-01-01', '2020-01-02', 'completed', 'm2', 'd1')")
+        self.conn.commit()
+        _, marks = extract_changes(self.conn, {})
+        for statement, column, expected in (
+                ("UPDATE User SET Last_Name = 'Byron' WHERE User_ID = 'u1'", "Author_Name", ["Ada Byron", "Ada Byron"]),
+                ("UPDATE Dataset SET Name = 'Iris v2' WHERE DataSet_ID = 'd1'", "Dataset_Name", ["Iris v2", "Iris v2"]),
+                ("UPDATE Model SET Name = 'ResNet' WHERE Model_ID = 'm2'", "Model_Name", ["ResNet"])):
+            self.conn.execute(statement)
+            self.conn.commit()
+            df, marks = extract_changes(self.conn, marks)
+            self.assertEqual(df[column].tolist(), expected)
+
+    def test_prune_change_log_keeps_unloaded_changes(self):
+        """Pruning drops the loaded change records only, and the ChangeLog mark keeps counting afterwards."""
+        _, marks = extract_changes(self.conn, {})
+        self.conn.execute("UPDATE Experiment SET Status = 'archived' WHERE Experiment_ID = 'e1'")
+        self.conn.commit()
+        _, loaded = extract_changes(self.conn, marks)
+        self.conn.execute("UPDATE Trial SET Seed = 7 WHERE Trial_ID = 't1'")
+        self.conn.commit()
+
+        self.assertEqual(prune_change_log(self.conn, loaded), loaded["ChangeLog"])
+        self.assertEqual(self.conn.execute("SELECT Table_Name FROM ChangeLog").fetchall(), [("Trial",)])
+        df, _ = extract_changes(self.conn, loaded)
+        self.assertEqual(df["Trial_Seed"].tolist(), [7])
+
+        _, marks = extract_changes(self.conn, loaded)
+        prune_change_log(self.conn, marks)
+        _, after = extract_changes(self.conn, marks)
+        self.assertEqual(after["ChangeLog"], loaded["ChangeLog"] + 1)
+
+    def test_insert_reusing_deleted_rowid(self):
+        """A row inserted under the rowid of a deleted one is still extracted, and its experiment replaced."""
+        self.add_trial("t2", "e1")
+        self.conn.commit()
+        _, marks = extract_changes(self.conn, {})
+        self.conn.execute("DELETE FROM Trial WHERE Trial_ID = 't2'")
+        self.add_trial("t3", "e1")
+        self.conn.commit()
+        self.assertEqual(self.conn.execute("SELECT rowid FROM Trial WHERE Trial_ID = 't3'").fetchone()[0], 2)
+
+        df, new_marks = extract_changes(self.conn, marks)
+        self.assertEqual(sorted(df["Trial_ID"]), ["t1", "t3"])
+        self.assertEqual(deleted_experiments(self.conn, marks, new_marks), ["e1"])
+
+    def test_deleted_rows_leave_the_load(self):
+        """Deleted source rows disappear from the flat table, its summaries and the star schema."""
+        self.add_trial("t2", "e1")
+        for metric_id, trial_id in (("mt0", "t1"), ("mt1", "t1"), ("mt2", "t2")):
+            self.add_metric(metric_id, trial_id, 0.5)
+        self.add_experiment("e2")
+        self.conn.commit()
+        duck = duckdb.connect(":memory:")
+        df, marks = extract_changes(self.conn, {})
+        load_batch(duck, add_composite_key(df), "both")
+
+        self.conn.execute("DELETE FROM Metric WHERE Metric_ID = 'mt1'")
+        self.conn.execute("DELETE FROM Trial WHERE Trial_ID = 't2'")
+        self.conn.execute("DELETE FROM Experiment WHERE Experiment_ID = 'e2'")
+        self.conn.commit()
+        df, new_marks = extract_changes(self.conn, marks)
+        replaced = deleted_experiments(self.conn, marks, new_marks)
+        self.assertEqual(replaced, ["e1", "e2"])
+        load_batch(duck, add_composite_key(df), "both", replaced_experiments=replaced)
+
+        self.assertEqual(duck.execute("SELECT Experiment_ID, Trial_ID, Metric_ID FROM experiment_flat").fetchall(),
+                         [("e1", "t1", "mt0")])
+        self.assertEqual(duck.execute("SELECT Metric_ID FROM fact_metric").fetchall(), [("mt0",)])
+        self.assertEqual(duck.execute("SELECT Trial_ID FROM dim_trial").fetchall(), [("t1",)])
+        self.assertEqual(duck.execute("SELECT Experiment_ID FROM dim_experiment").fetchall(), [("e1",)])
+        for table in ("agg_experiment", "agg_metric_series"):
+            stored = duck.execute(f"SELECT * FROM {table} ORDER BY ALL").fetchall()
+            expected = duck.execute(f"SELECT * FROM ({AGGREGATE_QUERIES[table].format(flat_table='experiment_flat')}) ORDER BY ALL").fetchall()
+            self.assertEqual(stored, expected, table)
+        duck.close()
+
+    def test_streamed_chunks_match_single_extraction(self):
+        """Streaming in chunks of one row stages the same keyed rows the in-memory extraction produces."""
+        for index in range(3):
+            self.add_metric(f"mt{index}", "t1", index / 10)
+        self.conn.commit()
+        full, full_marks = extract_all(self.conn)
+
+        duck = duckdb.connect(":memory:")
+        chunks = []
+        rows, high_marks = stream_extraction(self.conn, lambda chunk: (chunks.append(len(chunk)), stage_chunk(duck, chunk)), 1)
+        duck.execute("BEGIN TRANSACTION")
+        load_staged(duck)
+        duck.execute("COMMIT")
+        self.assertEqual((rows, high_marks, chunks), (len(full), full_marks, [1, 1, 1]))
+        self.assertEqual(duck.execute("SELECT COUNT(*) FROM experiment_flat").fetchone()[0], 3)
+        self.assertEqual(duck.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'experiment_flat_staging'").fetchone()[0], 0)
+        duck.close()
+
+    def test_sharded_extraction_matches_single_extraction(self):
+        """Per-table shards joined in DuckDB give the same rows, and stop at the high marks read first."""
+        self.add_trial("t2", "e1")
+        for index in range(5):
+            self.add_metric(f"mt{index}", "t1" if index % 2 else "t2", index / 10)
+        self.conn.commit()
+        full, full_marks = extract_all(self.conn)
+        reads = extraction_shards(full_marks, 2)
+        self.assertEqual([(low, high) for table, low, high in reads if table == "Metric"], [(0, 3), (3, 5)])
+
+        self.add_metric("mt_late", "t1", 1.0)
+        self.conn.commit()
+        frames = {table: [] for table in SOURCE_TABLES}
+        for table, low, high in reads:
+            frames[table].append(extract_table(self.conn, table, low, high))
+        sharded = join_in_duckdb(frames)
+
+        key = ["Trial_ID", "Metric_ID"]
+        self.assertEqual(sorted(sharded["Metric_ID"].tolist()), sorted(full["Metric_ID"].tolist()))
+        pd.testing.assert_frame_equal(sharded.sort_values(key).reset_index(drop=True),
+                                      full.sort_values(key).reset_index(drop=True), check_dtype=False)
+
+    def test_unmigrated_database_without_change_log(self):
+        """Databases created before the ChangeLog existed still extract new rows."""
+        self.conn.execute("DROP TABLE ChangeLog")
+        self.conn.commit()
+        df, high_marks = extract_changes(self.conn, {})
+        self.assertEqual(len(df), 1)
+        self.assertEqual(high_marks["ChangeLog"], 0)
+
+
+class TestWatermarkLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_path = hourly.DUCKDB_PATH
+        hourly.DUCKDB_PATH = os.path.join(self.directory.name, "analytics.duckdb")
+
+    def tearDown(self):
+        hourly.DUCKDB_PATH = self.previous_path
+        self.directory.cleanup()
+
+    def watermarks(self):
+        conn = duckdb.connect(hourly.DUCKDB_PATH)
+        try:
+            return read_watermarks(conn)
+        finally:
+            conn.close()
+
+    def test_watermarks_round_trip(self):
+        """Stored watermarks are returned, and tables never loaded read as 0."""
+        conn = duckdb.connect(hourly.DUCKDB_PATH)
+        write_watermarks(conn, {"Trial": 5})
+        write_watermarks(conn, {"Trial": 8})
+        self.assertEqual(read_watermarks(conn)["Trial"], 8)
+        self.assertEqual(read_watermarks(conn)["Metric"], 0)
+        conn.close()
+
+    def test_load_advances_watermarks_with_rows(self):
+        """Loaded rows replace earlier versions and the watermarks move in the same commit."""
+        first = pd.DataFrame({"Composite_ID": [b"a", b"b"], "Metric_Value": [1, 2]})
+        second = pd.DataFrame({"Composite_ID": [b"b"], "Metric_Value": [3]})
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            hourly.load_to_duckdb.fn(first, {"Metric": 2})
+            hourly.load_to_duckdb.fn(second, {"Metric": 3})
+
+        conn = duckdb.connect(hourly.DUCKDB_PATH)
+        rows = conn.execute("SELECT Composite_ID, Metric_Value FROM experiment_flat ORDER BY Composite_ID").fetchall()
+        conn.close()
+        self.assertEqual(rows, [(b"a", 1), (b"b", 3)])
+        self.assertEqual(self.watermarks()["Metric"], 3)
+
+    def test_load_version_moves_only_when_rows_land(self):
+        """An hourly run with an empty batch keeps the load version, so dashboard caches stay valid."""
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            hourly.load_to_duckdb.fn(pd.DataFrame({"Composite_ID": [b"a"], "Metric_Value": [1]}), {"Metric": 1})
+            hourly.load_to_duckdb.fn(pd.DataFrame({"Composite_ID": pd.Series([], dtype=object)}), {"Metric": 1})
+        conn = duckdb.connect(hourly.DUCKDB_PATH)
+        self.assertEqual(read_load_version(conn), 1)
+        conn.close()
+
+    def test_failed_load_keeps_watermarks(self):
+        """A load that fails leaves both the table and the watermarks untouched."""
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            hourly.load_to_duckdb.fn(pd.DataFrame({"Composite_ID": [b"a"], "Metric_Value": [1]}), {"Metric": 1})
+            with self.assertRaises(duckdb.Error):
+                hourly.load_to_duckdb.fn(pd.DataFrame({"Composite_ID": [b"b"], "Metric_Value": [2], "Extra": [0]}), {"Metric": 2})
+        self.assertEqual(self.watermarks()["Metric"], 1)
+
+
+class TestFlatUpsert(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = duckdb.connect(":memory:")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_duplicate_keys_in_one_batch(self):
+        """A batch repeating a key loads once instead of violating the primary key."""
+        upsert_flat_rows(self.conn, pd.DataFrame({"Composite_ID": [b"a", b"a", b"b"], "Metric_Value": [1.0, 1.0, 2.0]}))
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM experiment_flat").fetchone()[0], 2)
+
+    def test_keyless_table_is_migrated(self):
+        """A table from the old append-then-dedup loads is rebuilt with one hashed row per key and a primary key."""
+        self.conn.execute("CREATE TABLE experiment_flat AS SELECT * FROM (VALUES ('a', 't1'), ('a', 't1'), ('b', 't2')) v(Composite_ID, Trial_ID)")
+        ensure_flat_table(self.conn)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM experiment_flat").fetchone()[0], 2)
+        self.assertEqual(self.conn.execute("SELECT octet_length(Composite_ID) FROM experiment_flat LIMIT 1").fetchone()[0], 16)
+        with self.assertRaises(duckdb.ConstraintException):
+            self.conn.execute("INSERT INTO experiment_flat (Composite_ID) SELECT unhex(md5('a'))")
+
+    def key_frame(self, **ids):
+        row = {"Experiment_ID": "e1", "Trial_ID": "t1", "Model_ID": "m1", "DataSet_ID": "d1", "Metric_ID": None, "Hyperparameter_ID": None}
+        row.update(ids)
+        return pd.DataFrame([row])
+
+    def test_composite_key_is_fixed_width_hash(self):
+        """Keys are 16 bytes, differ when any ID differs and hash the same string the old key used."""
+        keys = add_composite_key(pd.concat([self.key_frame(), self.key_frame(Metric_ID="mt1"), self.key_frame(Trial_ID=None)]))
+        self.assertEqual([len(key) for key in keys["Composite_ID"]], [16, 16, 16])
+        self.assertEqual(keys["Composite_ID"].nunique(), 3)
+        expected = self.conn.execute("SELECT unhex(md5('e1_t1_m1_d1_NULL_NULL'))").fetchone()[0]
+        self.assertEqual(keys["Composite_ID"].iloc[0], expected)
+
+    def test_collision_with_stored_row_is_rejected(self):
+        """A batch row whose hash matches a stored row with different IDs raises instead of overwriting it."""
+        upsert_flat_rows(self.conn, add_composite_key(self.key_frame()))
+        forged = add_composite_key(self.key_frame(Metric_ID="mt1"))
+        forged["Composite_ID"] = add_composite_key(self.key_frame())["Composite_ID"]
+        with self.assertRaises(CompositeKeyCollision):
+            upsert_flat_rows(self.conn, forged)
+
+
+def one_trial_batch():
+    """Extract a flat batch of one trial with 2 hyperparameters and 3 metrics (6 flat rows)."""
+    source = sqlite3.connect(":memory:")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        create_database2(conn=source)
+    source.execute("INSERT INTO User VALUES ('u1', 'Ada', 'Lovelace', 'ada@example.com', 'admin')")
+    source.execute("INSERT INTO Dataset VALUES ('d1', 'Iris', 1, 'iris', '/data/iris', 150)")
+    source.execute("INSERT INTO Model VALUES ('m1', 'MLP', 'NN', 1, '{}', NULL)")
+    source.execute("INSERT INTO Experiment VALUES ('e1', 'exp', 'u1', 'desc', '2020-01-01', '2020-01-02', 'completed', 'm1', 'd1')")
+    source.execute("INSERT INTO Trial VALUES ('t1', 'e1', 'completed', '2020-01-01', '2020-01-01', 42)")
+    source.execute("INSERT INTO Hyperparameter VALUES ('h1', 't1', 'alpha', 0, 1), ('h2', 't1', 'max_iter', 0, 200)")
+    source.execute("""INSERT INTO Metric VALUES ('mt1', 't1', 'accuracy', 0.5, '2020-01-01 00:00'),
+                      ('mt2', 't1', 'accuracy', 0.9, '2020-01-01 00:05'), ('mt3', 't1', 'loss', 0.1, '2020-01-01 00:05')""")
+    source.commit()
+    batch, _ = extract_all(source)
+    source.close()
+    return batch
+
+
+class TestStarSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = one_trial_batch()
+        self.conn = duckdb.connect(":memory:")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def count(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_one_row_per_entity(self):
+        """The 6 exploded rows load as 1 trial, 2 hyperparameters and 3 metrics."""
+        self.assertEqual(len(self.batch), 6)
+        load_star_schema(self.conn, self.batch)
+        self.assertEqual([self.count(table) for table in ("dim_trial", "fact_hyperparameter", "fact_metric")], [1, 2, 3])
+        self.assertEqual([self.count(table) for table in ("dim_experiment", "dim_model", "dim_dataset")], [1, 1, 1])
+
+    def test_reload_is_idempotent(self):
+        """Loading the same batch twice upserts instead of duplicating."""
+        load_star_schema(self.conn, self.batch)
+        load_star_schema(self.conn, self.batch)
+        self.assertEqual(self.count("fact_metric"), 3)
+
+    def test_trial_wide_pivot(self):
+        """trial_wide has one row per trial with hp_/metric_ columns holding the latest metric value."""
+        load_star_schema(self.conn, self.batch)
+        row = self.conn.execute('SELECT Experiment_Name, "hp_max_iter", metric_accuracy, metric_loss FROM trial_wide').fetchall()
+        self.assertEqual(row, [("exp", "200", 0.9, 0.1)])
+
+    def test_trial_wide_refreshes_batch_trials(self):
+        """A batch replaces only its experiments' trial_wide rows; a new metric name adds its column."""
+        load_star_schema(self.conn, self.batch)
+        self.conn.execute("UPDATE trial_wide SET Trial_Status = 'untouched'")
+        other = self.batch.copy()
+        for column in ("Experiment_ID", "Trial_ID", "Hyperparameter_ID", "Metric_ID"):
+            other[column] = other[column] + "b"
+        other["Metric_Value"] = other["Metric_Value"] + 1
+        load_star_schema(self.conn, other)
+        rows = self.conn.execute("SELECT Trial_ID, Trial_Status, metric_loss FROM trial_wide ORDER BY Trial_ID").fetchall()
+        self.assertEqual(rows, [("t1", "untouched", 0.1), ("t1b", "completed", 1.1)])
+        other["Metric_Name"] = other["Metric_Name"].replace("loss", "f1")
+        other["Metric_ID"] = other["Metric_ID"] + "c"
+        load_star_schema(self.conn, other)
+        rows = self.conn.execute("SELECT Trial_ID, Trial_Status, metric_f1 FROM trial_wide ORDER BY Trial_ID").fetchall()
+        self.assertEqual(rows, [("t1", "completed", None), ("t1b", "completed", 1.1)])
+
+
+class TestAggregates(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = add_composite_key(one_trial_batch())
+        self.conn = duckdb.connect(":memory:")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def rows(self, table):
+        """The maintained summary and the same summary recomputed from experiment_flat."""
+        keys = ", ".join(name for name, _ in AGGREGATE_TABLES[table][0])
+        maintained = self.conn.execute(f"SELECT * FROM {table} ORDER BY {keys}").fetchall()
+        recomputed = self.conn.execute(
+            f"SELECT * FROM ({AGGREGATE_QUERIES[table].format(flat_table='experiment_flat')}) ORDER BY {keys}").fetchall()
+        rounded = lambda rows: [tuple(round(value, 9) if isinstance(value, float) else value for value in row) for row in rows]
+        return rounded(maintained), rounded(recomputed)
+
+    def test_batches_are_folded_in(self):
+        """Metric points count once per Metric_ID, and hyperparameter sums once per flat row."""
+        upsert_flat_rows(self.conn, self.batch)
+        series, recomputed = self.rows("agg_metric_series")
+        self.assertEqual(series, recomputed)
+        self.assertEqual([(row[1], row[4]) for row in series], [("accuracy", 1), ("accuracy", 1), ("loss", 1)])
+        experiment = self.conn.execute("SELECT Experiment_Name, Trial_Count FROM agg_experiment").fetchall()
+        self.assertEqual(experiment, [("exp", 1)])
+        sums = self.conn.execute("""SELECT Value_Sum, Value_Count FROM agg_hyperparameter_metric
+                                    WHERE Hyperparameter_Type = 'alpha' AND Metric_Name = 'accuracy'""").fetchall()
+        self.assertEqual(sums, [(1.4, 2)])
+
+    def test_replaced_rows_are_subtracted(self):
+        """Reloading rows, some with new values, leaves the summaries equal to a recomputation."""
+        upsert_flat_rows(self.conn, self.batch)
+        # An updated metric is re-extracted on every flat row that repeats it
+        changed = self.batch[self.batch["Metric_ID"] == "mt1"].copy()
+        changed["Metric_Value"] = 0.7
+        upsert_flat_rows(self.conn, changed)
+        upsert_flat_rows(self.conn, self.batch[self.batch["Metric_ID"] != "mt1"].copy())
+        for table in ("agg_metric_series", "agg_hyperparameter_metric", "agg_experiment"):
+            maintained, recomputed = self.rows(table)
+            self.assertEqual(maintained, recomputed, table)
+
+    def test_existing_flat_table_is_backfilled(self):
+        """A flat table loaded before the summaries existed is summarized on the next load."""
+        upsert_flat_rows(self.conn, self.batch)
+        drop_aggregate_tables(self.conn)
+        upsert_flat_rows(self.conn, self.batch.iloc[:0])
+        maintained, recomputed = self.rows("agg_hyperparameter_metric")
+        self.assertEqual(len(maintained), 4)
+        self.assertEqual(maintained, recomputed)
+
+
+class TestParquetExport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.lake = os.path.join(self.directory.name, "lake")
+        self.conn = duckdb.connect(":memory:")
+        upsert_flat_rows(self.conn, add_composite_key(pd.DataFrame({
+            "Experiment_ID": ["e1", "e1", "e2"], "Trial_ID": ["t1", "t2", "t3"], "Model_ID": "m1", "DataSet_ID": "d1",
+            "Metric_ID": ["mt1", "mt2", "mt3"], "Hyperparameter_ID": None, "Metric_Value": [0.1, 0.2, 0.3],
+            "StartTimeStamp": ["2024-01-01 10:00:00", "2024-01-01 10:00:00", "2024-02-01 09:00:00"],
+        })))
+
+    def tearDown(self):
+        self.conn.close()
+        self.directory.cleanup()
+
+    def lake_rows(self, where=""):
+        return self.conn.execute(f"SELECT Experiment_ID, experiment_date::VARCHAR, Metric_Value FROM {parquet_source(self.lake)} {where} ORDER BY Metric_Value").fetchall()
+
+    def test_full_export_is_partitioned(self):
+        """Rows land under experiment_date=/Experiment_ID= directories and read back with the partition columns."""
+        self.assertEqual(export_experiments(self.conn, self.lake), 2)
+        self.assertTrue(os.path.isdir(os.path.join(self.lake, "experiment_date=2024-01-01", "Experiment_ID=e1")))
+        self.assertEqual(self.lake_rows("WHERE Experiment_ID = 'e2'"), [("e2", "2024-02-01", 0.3)])
+        codecs = self.conn.execute(f"SELECT DISTINCT compression FROM parquet_metadata('{self.lake}/**/*.parquet')").fetchall()
+        self.assertEqual(codecs, [("ZSTD",)])
+
+    def test_incremental_export_rewrites_touched_experiments(self):
+        """Only the touched experiment's partitions are replaced, including when its date moved."""
+        export_experiments(self.conn, self.lake)
+        self.conn.execute("UPDATE experiment_flat SET StartTimeStamp = '2024-03-01 08:00:00', Metric_Value = Metric_Value + 1 WHERE Experiment_ID = 'e1'")
+        self.conn.execute("UPDATE experiment_flat SET Metric_Value = 9 WHERE Experiment_ID = 'e2'")
+        self.assertEqual(export_experiments(self.conn, self.lake, ["e1"]), 1)
+        self.assertEqual(self.lake_rows(), [("e2", "2024-02-01", 0.3), ("e1", "2024-03-01", 1.1), ("e1", "2024-03-01", 1.2)])
+        self.assertFalse(os.path.exists(os.path.join(self.lake, "experiment_date=2024-01-01", "Experiment_ID=e1")))
+
+    def test_incremental_export_never_shows_both_copies(self):
+        """After every rename of an incremental export the lake holds the old or the new rows of e1, never both."""
+        export_experiments(self.conn, self.lake)
+        self.conn.execute("UPDATE experiment_flat SET StartTimeStamp = '2024-03-01 08:00:00', Metric_Value = Metric_Value + 1 WHERE Experiment_ID = 'e1'")
+        seen = []
+        rename = os.replace
+
+        def watched_rename(source, target):
+            rename(source, target)
+            seen.append([value for experiment_id, _, value in self.lake_rows() if experiment_id == "e1"])
+
+        with mock.patch("etl_parquet_export.os.replace", watched_rename):
+            export_experiments(self.conn, self.lake, ["e1"])
+        self.assertEqual(seen[-1], [1.1, 1.2])
+        for values in seen:
+            self.assertIn(values, ([], [0.1, 0.2], [1.1, 1.2]))
+
+    def test_failed_export_leaves_lake_intact(self):
+        """An export that fails while writing keeps the previous lake and leaves no staging directory behind."""
+        export_experiments(self.conn, self.lake)
+        before = self.lake_rows()
+        self.conn.execute("ALTER TABLE experiment_flat RENAME TO experiment_flat_moved")
+        for experiment_ids in (None, ["e1"]):
+            with self.assertRaises(duckdb.Error):
+                export_experiments(self.conn, self.lake, experiment_ids)
+        self.conn.execute("ALTER TABLE experiment_flat_moved RENAME TO experiment_flat")
+        self.assertEqual(self.lake_rows(), before)
+        self.assertEqual(os.listdir(self.directory.name), ["lake"])
+
+    def test_full_export_replaces_lake(self):
+        """A second full export swaps in a lake without the rows deleted since, and cleans up the old copy."""
+        export_experiments(self.conn, self.lake)
+        self.conn.execute("DELETE FROM experiment_flat WHERE Experiment_ID = 'e2'")
+        self.assertEqual(export_experiments(self.conn, self.lake), 1)
+        self.assertEqual(self.lake_rows(), [("e1", "2024-01-01", 0.1), ("e1", "2024-01-01", 0.2)])
+        self.assertEqual(os.listdir(self.directory.name), ["lake"])
+
+    def test_lake_records_load_version(self):
+        """The export stamps the lake with the load version it was written from."""
+        export_experiments(self.conn, self.lake)
+        self.assertEqual(read_lake_version(self.lake), 0)
+        bump_load_version(self.conn, 3)
+        export_experiments(self.conn, self.lake, ["e2"])
+        self.assertEqual(read_lake_version(self.lake), 1)
+        self.assertIsNone(read_lake_version(os.path.join(self.directory.name, "missing")))
+
+    def test_incremental_export_needs_current_lake(self):
+        """Rewriting some experiments of a lake that is missing or more than one load behind exports it in full."""
+        self.assertEqual(export_experiments(self.conn, self.lake, ["e1"]), 2)
+        self.assertEqual(len(self.lake_rows()), 3)
+        self.assertEqual(read_lake_version(self.lake), 0)
+        self.conn.execute("UPDATE experiment_flat SET Metric_Value = 9 WHERE Experiment_ID = 'e2'")
+        bump_load_version(self.conn, 1)
+        bump_load_version(self.conn, 1)
+        self.assertEqual(export_experiments(self.conn, self.lake, ["e1"]), 2)
+        self.assertEqual(self.lake_rows("WHERE Experiment_ID = 'e2'"), [("e2", "2024-02-01", 9.0)])
+        self.assertEqual(read_lake_version(self.lake), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
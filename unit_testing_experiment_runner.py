@@ -0,0 +1,78 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from contextlib import redirect_stdout
+from create_database2 import create_database2
+import experiment_runner as runner
+
+class TestExperimentRunner(unittest.TestCase):
+
+    def setUp(self):
+        """Create a fresh schema in a temporary database file."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "runner.db")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            create_database2(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expand_grid(self):
+        """Every combination of the grid is produced once."""
+        grid = runner.expand_grid({"C": [1, 10], "kernel": ["linear", "rbf", "poly"]})
+        self.assertEqual(len(grid), 6)
+        self.assertIn({"C": 10, "kernel": "poly"}, grid)
+
+    def test_unknown_backend(self):
+        """An unknown backend name is rejected."""
+        with self.assertRaises(ValueError):
+            runner.run_tasks(print, [], backend="gpu")
+
+    def test_run_experiment_logs_every_trial(self):
+        """A registered sweep logs its trials, hyperparameters, metrics and experiment row."""
+        runner.register_experiment("test_svm", "iris", "svc", {"C": [0.1, 1], "kernel": ["linear", "rbf"]},
+                                   "Test SVM", "tester", "Unit test sweep")
+        for backend in ("sequential", "threads"):
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                exp_id, results = runner.run_experiment("test_svm", database_name=self.path, backend=backend, n_jobs=2)
+            self.assertEqual(len(results), 4)
+
+            conn = sqlite3.connect(self.path)
+            try:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM Trial WHERE Experiment_ID = ?", (exp_id,)).fetchone()[0], 4)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM Metric m JOIN Trial t ON m.Trial_ID = t.Trial_ID WHERE t.Experiment_ID = ?", (exp_id,)).fetchone()[0], 16)
+                self.assertEqual(conn.execute("SELECT Name FROM Experiment WHERE Experiment_ID = ?", (exp_id,)).fetchone()[0], "Test SVM")
+            finally:
+                conn.close()
+
+    def test_halving_fractions(self):
+        """Rung budgets grow by eta and end at the full budget."""
+        fractions = runner.halving_fractions(eta=3, min_fraction=1 / 9)
+        self.assertEqual(len(fractions), 3)
+        self.assertAlmostEqual(fractions[1], 1 / 3)
+        self.assertEqual(fractions[-1], 1.0)
+
+    def test_successive_halving_prunes_and_records_rungs(self):
+        """Halving prunes configurations and stores every rung's scores on its trial."""
+        runner.register_experiment("test_halving", "iris", "svc",
+                                   {"C": [0.01, 0.1, 1, 10], "kernel": ["linear", "rbf"]},
+                                   "Test Halving", "tester", "Unit test sweep")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            exp_id, results = runner.run_experiment("test_halving", database_name=self.path, backend="sequential",
+                                                    scheduler="halving", eta=2, min_fraction=0.5)
+        self.assertEqual(len(results), 8)
+
+        conn = sqlite3.connect(self.path)
+        try:
+            statuses = dict(conn.execute("SELECT Status, COUNT(*) FROM Trial WHERE Experiment_ID = ? GROUP BY Status", (exp_id,)).fetchall())
+            self.assertEqual(statuses, {"pruned": 4, "completed": 4})
+            rung_rows = conn.execute("""SELECT m.Name, COUNT(*) FROM Metric m JOIN Trial t ON m.Trial_ID = t.Trial_ID
+                                        WHERE t.Experiment_ID = ? AND m.Name LIKE 'accuracy%' GROUP BY m.Name""", (exp_id,)).fetchall()
+            self.assertEqual(dict(rung_rows), {"accuracy_rung0": 8, "accuracy_rung1": 4, "accuracy": 4})
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import csv
+import asyncio
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+import database_operations as db_ops
+import query_export
+from query_service import QueryCancelled, QueryTimeout
+
+# Cross join of the 1M-row Metric table with itself, returning no rows for a long time
+RUNAWAY_QUERY = "SELECT COUNT(*) FROM Metric a, Metric b WHERE a.Value + b.Value < 0"
+
+
+class TestQueryExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """A 1M-row Metric table in a separate database."""
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, "export.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE Metric (Metric_ID TEXT PRIMARY KEY, Trial_ID TEXT NOT NULL, Name TEXT NOT NULL, "
+                     "Value INTEGER NOT NULL, TimeStamp DATETIME NOT NULL, Note TEXT)")
+        conn.executemany("INSERT INTO Metric VALUES (?, ?, ?, ?, ?, ?)",
+                         ((f"m{i:07}", f"t{i // 100}", "loss", i % 97 / 97, "2024-02-12 15:00:00",
+                           None if i < 20000 else i % 3) for i in range(1000000)))
+        conn.commit()
+        conn.close()
+        cls.previous_path = db_ops.DATABASE_PATH
+        db_ops.configure_database(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        db_ops.configure_database(cls.previous_path)
+        cls.directory.cleanup()
+
+    def test_csv_matches_query(self):
+        query = "SELECT * FROM Metric WHERE Trial_ID IN ('t0', 't250') ORDER BY Metric_ID"
+        data = b"".join(query_export.iter_csv(query, chunk_rows=30)).decode("utf-8")
+        rows = list(csv.reader(io.StringIO(data)))
+        self.assertEqual(rows[0], ["Metric_ID", "Trial_ID", "Name", "Value", "TimeStamp", "Note"])
+        expected = db_ops.fetch_data(query)
+        self.assertEqual(rows[1:], [["" if cell is None else str(cell) for cell in row] for row in expected])
+
+    def test_parquet_and_arrow_match_query(self):
+        """Columns NULL in the first chunk are exported as text; one row group or batch per chunk."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        query = "SELECT Metric_ID, Value, Note FROM Metric WHERE Metric_ID < 'm0025000'"
+        expected = db_ops.fetch_data(query)
+        parquet = pa.BufferReader(b"".join(query_export.iter_parquet(query, chunk_rows=10000)))
+        self.assertEqual(pq.ParquetFile(parquet).num_row_groups, 3)
+        for table in (pq.read_table(parquet),
+                      pa.ipc.open_stream(b"".join(query_export.iter_arrow(query, chunk_rows=10000))).read_all()):
+            self.assertEqual(table.schema.types, [pa.string(), pa.float64(), pa.string()])
+            self.assertEqual(table.num_rows, len(expected))
+            self.assertEqual(table.column("Value").to_pylist(), [row[1] for row in expected])
+            self.assertEqual(table.column("Note").to_pylist()[19999:20001], [None, str(expected[20000][2])])
+
+    def test_export_endpoint(self):
+        from starlette.applications import Starlette
+        from starlette.routing import Route
+        from starlette.testclient import TestClient
+
+        client = TestClient(Starlette(routes=[Route("/export/{name}", query_export.export_endpoint)]))
+        token = query_export.register_export("SELECT Metric_ID FROM Metric WHERE Trial_ID = ?", ("t3",))
+        response = client.get(query_export.export_url(token, "csv"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("query_results.csv", response.headers["content-disposition"])
+        self.assertEqual(len(response.text.splitlines()), 101)
+        self.assertEqual(client.get(query_export.export_url(token, "xlsx")).status_code, 404)
+        bad = query_export.register_export("SELECT * FROM Missing")
+        self.assertEqual(client.get(query_export.export_url(bad, "csv")).status_code, 400)
+
+    def test_runaway_export_is_stopped(self):
+        """A chunk that takes longer than its budget, or a cancelled export, interrupts the query."""
+        start_time = time.monotonic()
+        with self.assertRaises(QueryTimeout):
+            list(query_export.iter_chunks(RUNAWAY_QUERY, chunk_budget=0.5))
+        self.assertLess(time.monotonic() - start_time, 5)
+
+        cancelled = threading.Event()
+        threading.Timer(0.2, cancelled.set).start()
+        with self.assertRaises(QueryCancelled):
+            list(query_export.iter_csv(RUNAWAY_QUERY, cancelled=cancelled))
+
+    def test_disconnect_stops_query(self):
+        """A client going away mid-chunk interrupts the query and closes its cursor, releasing the read lock."""
+        from starlette.requests import Request
+
+        # The first chunk comes straight away, every row after the first 15000 scans the table and is filtered out
+        token = query_export.register_export(
+            "SELECT Metric_ID FROM Metric m WHERE CASE WHEN rowid <= 15000 THEN 1 "
+            "ELSE EXISTS (SELECT 1 FROM Metric b WHERE b.Value < m.Value - 2) END")
+
+        async def main():
+            response = await query_export.export_endpoint(
+                Request({"type": "http", "path_params": {"name": f"{token}.csv"}}))
+            await response.body_iterator.__anext__()
+            # Starlette cancels the task streaming the body when the client disconnects
+            reading = asyncio.ensure_future(response.body_iterator.__anext__())
+            await asyncio.sleep(0.5)
+            reading.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await reading
+
+        asyncio.run(main())
+        conn = sqlite3.connect(db_ops.DATABASE_PATH, timeout=5)
+        try:
+            conn.execute("CREATE TABLE Disconnect (x)")
+            conn.execute("DROP TABLE Disconnect")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_export_memory_is_flat(self):
+        """Streaming 1M rows as CSV holds one chunk at a time, not the whole result."""
+        tracemalloc.start()
+        start_time = time.time()
+        size = 0
+        try:
+            for piece in query_export.iter_csv("SELECT * FROM Metric"):
+                size += len(piece)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        execution_time = time.time() - start_time
+        print(f"Exporting 1M rows ({size / 1e6:.0f} MB of CSV) took {execution_time:.2f} seconds, "
+              f"peak memory {peak / 1e6:.1f} MB.")
+        self.assertGreater(size, 50e6)
+        self.assertLess(peak, 20e6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from query_service import QueryService, QueryTimeout, QueryCancelled
+
+# Counts every row of a 10^12-row cross join: runs far longer than any budget below
+RUNAWAY_QUERY = "SELECT COUNT(*) FROM Metric a, Metric b, Metric c, Metric d"
+
+
+class TestQueryService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "queries.db")
+        conn = sqlite3.connect(cls.path)
+        conn.execute("CREATE TABLE Metric (Metric_ID TEXT PRIMARY KEY, Value REAL)")
+        conn.executemany("INSERT INTO Metric VALUES (?, ?)", ((f"m{i:04}", i / 1000) for i in range(1000)))
+        conn.commit()
+        conn.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.service = QueryService(self.path, max_workers=2, time_budget=5, max_rows=100)
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def test_rows_are_capped(self):
+        _, future = self.service.submit("SELECT * FROM Metric ORDER BY Metric_ID")
+        result = future.result()
+        self.assertEqual(result["columns"], ["Metric_ID", "Value"])
+        self.assertEqual(len(result["rows"]), 100)
+        self.assertTrue(result["truncated"])
+        result = self.service.submit("SELECT * FROM Metric WHERE Value < ?", (0.01,), max_rows=10)[1].result()
+        self.assertEqual(len(result["rows"]), 10)
+        self.assertFalse(result["truncated"])
+
+    def test_time_budget_stops_runaway_query(self):
+        start_time = time.time()
+        _, future = self.service.submit(RUNAWAY_QUERY, time_budget=0.5)
+        with self.assertRaises(QueryTimeout):
+            future.result()
+        execution_time = time.time() - start_time
+        print(f"A runaway cross join was stopped after {execution_time:.2f} seconds.")
+        self.assertLess(execution_time, 1.5)
+
+    def test_cancel_running_and_queued_queries(self):
+        """Cancelling interrupts running queries and drops queued ones; other queries still complete."""
+        jobs = [self.service.submit(RUNAWAY_QUERY) for _ in range(3)]
+        time.sleep(0.2)
+        start_time = time.time()
+        for job_id, _ in jobs:
+            self.assertTrue(self.service.cancel(job_id))
+        for _, future in jobs:
+            with self.assertRaises(QueryCancelled):
+                future.result()
+        self.assertLess(time.time() - start_time, 1)
+        self.assertFalse(self.service.cancel(jobs[0][0]))
+        self.assertEqual(self.service.submit("SELECT COUNT(*) FROM Metric")[1].result()["rows"], [(1000,)])
+
+    def test_event_loop_stays_responsive(self):
+        """While a heavy query runs, the awaiting event loop keeps serving other tasks."""
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            with self.assertRaises(QueryTimeout):
+                await self.service.run(RUNAWAY_QUERY, time_budget=0.5)
+            task.cancel()
+            return ticks
+
+        self.assertGreater(asyncio.run(main()), 20)
+
+    def test_queries_cannot_write(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.service.submit("DELETE FROM Metric")[1].result()
+
+if __name__ == '__main__':
+    unittest.main()
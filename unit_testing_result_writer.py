@@ -0,0 +1,100 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from create_database2 import create_database2
+from result_writer import TrialResultWriter, enqueue_trial
+
+class TestTrialResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        """Create a fresh schema in a temporary database file."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "writer.db")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            create_database2(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def count(self, table):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_close_flushes_all_results(self):
+        """Every queued trial is written once the writer is closed."""
+        with TrialResultWriter(self.path, batch_size=8, shared=False) as writer:
+            for seed in range(50):
+                enqueue_trial(writer.queue, "experiment-uuid", "completed", "2024-02-12 12:00:00",
+                              "2024-02-12 12:00:00", seed,
+                              hyperparameters={"C": 1.0, "kernel": "rbf"},
+                              metrics={"accuracy": 0.9, "f1": 0.8})
+        self.assertEqual(writer.written, 50)
+        self.assertEqual(self.count("Trial"), 50)
+        self.assertEqual(self.count("Hyperparameter"), 100)
+        self.assertEqual(self.count("Metric"), 100)
+
+    def test_concurrent_producers(self):
+        """Results from many producer threads all land in the database."""
+        with TrialResultWriter(self.path, shared=False) as writer:
+            def produce(offset):
+                for seed in range(offset, offset + 20):
+                    writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", seed,
+                                  metrics={"accuracy": 0.5})
+
+            threads = [threading.Thread(target=produce, args=(i * 20,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.count("Trial"), 80)
+
+    def test_invalid_trial_does_not_break_batch(self):
+        """A rejected trial is counted as failed while the rest of its batch commits."""
+        with self.assertLogs(level='ERROR'):
+            with TrialResultWriter(self.path, shared=False) as writer:
+                writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 1)
+                writer.submit("", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 2)
+                writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 3)
+        self.assertEqual((writer.written, writer.failed), (2, 1))
+        self.assertEqual(self.count("Trial"), 2)
+
+    def test_malformed_trial_does_not_stop_writer(self):
+        """A trial that makes insert_trial_bundle raise is counted as failed and later trials are still written."""
+        with self.assertLogs(level='ERROR'):
+            with TrialResultWriter(self.path, batch_size=1, shared=False) as writer:
+                writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 1,
+                              hyperparameters=[5], metrics=[("accuracy",)])
+                writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 2,
+                              metrics={"accuracy": 0.9})
+        self.assertEqual((writer.written, writer.failed), (1, 1))
+        self.assertEqual(self.count("Trial"), 1)
+        self.assertEqual(self.count("Metric"), 1)
+
+    def test_close_reports_dead_writer(self):
+        """If the writer thread dies, close() raises instead of silently dropping the queued results."""
+        writer = TrialResultWriter(self.path, shared=False)
+        writer._next_batch = lambda: (_ for _ in ()).throw(MemoryError("simulated"))
+        with self.assertLogs(level='ERROR'):
+            writer.start()
+            writer._thread.join()
+        writer.submit("experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 1)
+        with self.assertRaises(RuntimeError) as context:
+            writer.close()
+        self.assertIn("1 queued results not written", str(context.exception))
+
+    def test_shared_queue(self):
+        """The manager-backed queue used by process pools is drained as well."""
+        with TrialResultWriter(self.path) as writer:
+            enqueue_trial(writer.queue, "experiment-uuid", "completed", "2024-02-12 12:00:00", "2024-02-12 12:00:00", 42,
+                          metrics={"accuracy": 0.9})
+        self.assertEqual(self.count("Metric"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import redirect_stdout
+from create_database2 import create_database2
+import experiment_runner as runner
+from trial_cache import TrialCache, trial_key
+
+DATASET = {"name": "Iris", "version": "1.0", "downcast": False}
+ESTIMATOR = {"name": "SVC", "version": "1.0"}
+
+class TestTrialCache(unittest.TestCase):
+
+    def setUp(self):
+        """Create a fresh schema and cache directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            create_database2(self.path)
+        self.cache = TrialCache(self.path, directory=os.path.join(self.directory.name, "cache"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def add_trial(self, trial_id, metrics):
+        conn = sqlite3.connect(self.path)
+        for name, value in metrics.items():
+            conn.execute("INSERT INTO Metric (Metric_ID, Trial_ID, Name, Value, TimeStamp) VALUES (?, ?, ?, ?, '2024-01-01')",
+                         (f"{trial_id}-{name}", trial_id, name, value))
+        conn.commit()
+        conn.close()
+
+    def test_key_depends_on_full_spec(self):
+        """Keys are stable for equal specs and change with any part of the spec."""
+        key = trial_key(DATASET, ESTIMATOR, {}, {"C": 1, "kernel": "rbf"}, 42)
+        self.assertEqual(key, trial_key(DATASET, ESTIMATOR, {}, {"kernel": "rbf", "C": 1}, 42))
+        self.assertNotEqual(key, trial_key(DATASET, ESTIMATOR, {}, {"C": 1, "kernel": "rbf"}, 7))
+        self.assertNotEqual(key, trial_key(dict(DATASET, version="2.0"), ESTIMATOR, {}, {"C": 1, "kernel": "rbf"}, 42))
+
+    def test_hit_returns_stored_metrics(self):
+        """A cached key returns the metrics of its trial, without halving rung scores."""
+        self.add_trial("trial-1", {"accuracy": 0.9, "accuracy_rung0": 0.5})
+        self.cache.put("key-1", "trial-1")
+        self.assertEqual(self.cache.get("key-1"), {"accuracy": 0.9})
+        self.assertIsNone(self.cache.get("key-2"))
+
+    def test_deleted_trial_is_a_miss(self):
+        """An entry whose trial no longer has metrics is dropped."""
+        self.cache.put("key-1", "missing-trial")
+        self.assertIsNone(self.cache.get("key-1"))
+        self.assertEqual(self.cache.conn.execute("SELECT COUNT(*) FROM TrialCache").fetchone()[0], 0)
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted once the entry limit is exceeded."""
+        self.cache.max_entries = 2
+        for index in range(3):
+            self.add_trial(f"trial-{index}", {"accuracy": index})
+        self.cache.put("key-0", "trial-0")
+        self.cache.put("key-1", "trial-1")
+        time.sleep(0.01)
+        self.cache.get("key-0")
+        self.cache.put("key-2", "trial-2")
+        self.assertIsNotNone(self.cache.get("key-0"))
+        self.assertIsNone(self.cache.get("key-1"))
+
+    def test_rerun_reuses_trials(self):
+        """A second identical sweep is served from the cache and stores its models once."""
+        self.cache.store_artifacts = True
+        runner.register_experiment("test_cache", "iris", "svc", {"C": [0.1, 1], "kernel": ["linear"]},
+                                   "Test Cache", "tester", "Unit test sweep")
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            _, first = runner.run_experiment("test_cache", database_name=self.path, backend="sequential", cache=self.cache)
+            exp_id, second = runner.run_experiment("test_cache", database_name=self.path, backend="sequential", cache=self.cache)
+        self.assertEqual([metrics["accuracy"] for _, metrics in first], [metrics["accuracy"] for _, metrics in second])
+
+        conn = sqlite3.connect(self.path)
+        statuses = conn.execute("SELECT DISTINCT Status FROM Trial WHERE Experiment_ID = ?", (exp_id,)).fetchall()
+        conn.close()
+        self.assertEqual(statuses, [("cached",)])
+        key = trial_key(runner.DATASETS["iris"], runner.ESTIMATORS["svc"], {}, {"C": 1, "kernel": "linear"}, runner.SEED)
+        self.assertIsNotNone(self.cache.load_artifact(key))
+
+
+if __name__ == "__main__":
+    unittest.main()